@@ -16,6 +16,10 @@ Interaction with Other Files:
 - **AudioRecorder.py**: The AIWordsAssistantApp class uses the AudioRecorder to capture 
 audio input from the user. The recorded audio is then transcribed and used to generate 
 word predictions.
+- **Transcription.py**: Transcribes the audio chunks with the OpenAI speech-to-text API.
+- **TranscriptStitcher.py**: Removes the words of the overlap between two chunks from the second transcript.
+- **Tracing.py**: When `tracing` is set (it is off by default), the time each chunk spends in every stage,
+from the recorder to the redrawn grid, is written to `traces/traces.jsonl` and summarised on exit.
 
 Classes and Methods:
 - **AIWordsAssistantApp**: This class encapsulates the main application logic.
@@ -43,6 +47,7 @@ may arise when using the AI Words Assistant application.
 import customtkinter as ctk
 import tkinter as tk
 import asyncio
+import contextvars
 import uuid
 from pathlib import Path
 from openai import OpenAI
@@ -51,13 +56,19 @@ from threading import Thread
 from PIL import Image
 import os
 import logging
-import re
-import string
 
 from React import React
 from AudioRecorder import AudioRecorder
+from ImageCache import ImageCache
+from ImageAtlas import ImageAtlas
+from ResizeScheduler import ResizeScheduler
+from Pipeline import Pipeline
+from ConversationSession import ConversationSession
+from Tracing import tracer
+from Transcription import transcribe_audio
+from TranscriptStitcher import TranscriptStitcher
 
-from strings import words, description, transcription_error_msg
+from strings import words, description, grid_words
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logging.getLogger('PIL').setLevel(logging.WARNING)
@@ -72,23 +83,46 @@ class AIWordsAssistantApp:
         self.app = None
         self.start_button = None
         self.grid_frame = None
+        self.image_labels = []
+        self.grid_words = [None] * 24
+        self.grid_layout = None
+        self.grid_image_size = None
+        self.grid_layout_width = None
         self.word_list_changed = False
         self.words = words
         self.loop = asyncio.new_event_loop()
-        self.parsing_audio = False
         self.audio_recorder = None  
         self.exiting = False
-        self.current_words = [
-            'hospital', 'fire', 'officer', 'emergency', 'doctor', 'nurse', 'help', 'heart', 'breath', 'medicine', 
-            'child', 'dog', 'cat', 'food', 'money', 'bank', 'computer', 'phone', 'car', 'word',
-            'key', 'newspaper', 'people', 'time'
-        ]
-        self.react = React() 
+        self.resize_quiet_period_ms = 200
+        self.resize_preview = False
+        self.resize_scheduler = None
+        self.save_recordings = False  # audio chunks are transcribed from memory unless this is set
+        self.upload_fs = 16000
+        self.audio_format = 'wav'  # 'flac' or 'ogg' shrink the upload further if soundfile is installed
+        self.chunk_seconds = 30  # the longest speech segment; shorter chunks reach the agent sooner
+        self.chunk_overlap_seconds = 1.5  # audio sent again after a cut in the middle of speech, then stitched out
+        self.transcript_stitcher = None
+        self.pipeline = None
+        self.pipeline_queue_size = 4
+        self.pipeline_policy = 'drop-oldest'  # backpressure for audio chunks waiting to be transcribed
+        self.conversation = None
+        self.conversation_max_tokens = 800  # most recent whole sentences sent to the agent
+        self.conversation_summary_tokens = 0  # > 0 keeps an extractive summary of older sentences
+        self.current_words = list(grid_words)  # the words in the grid; only the Tk thread changes them
+        self.predicted_words = list(grid_words)  # the words of the last prediction, owned by the predict stage
+        self.prediction_mode = 'auto'  # 'react', 'direct', 'parallel', 'local' (offline), or 'auto' (ReAct agent only for news-related conversations)
+        # The 'parallel' mode runs its concurrent tool calls on self.loop
+        self.stream_partial_words = True  # update the grid with interim words while the agent is still running
+        self.tracing = False  # True writes per-chunk stage latencies to traces/traces.jsonl, with a summary on exit
+        self.react = self.create_react() 
 
         self.setup_directories()
         self.check_images()
         self.initialize_app()
         
+    def create_react(self):
+        return React(mode=self.prediction_mode, loop=self.loop)
+
     def check_images(self):
         images_found = True
         for word in self.words:
@@ -103,15 +137,21 @@ class AIWordsAssistantApp:
         self.recordings_dir = Path("recordings")
         self.conversations_dir = Path("conversations")
         self.conversation_words_dir = Path("conversation_words")
+        self.traces_dir = Path("traces")
 
         self.recordings_dir.mkdir(exist_ok=True)
         self.conversations_dir.mkdir(exist_ok=True)
         self.conversation_words_dir.mkdir(exist_ok=True)
+        tracer.configure(self.traces_dir / 'traces.jsonl', enabled=self.tracing)
         
         if not os.path.exists("images"):
             raise Exception("The 'images' directory does not exist.")
         
         self.images_dir = Path('images')
+        # Built offline with build_image_atlas.py; the PNG files are used when there is no atlas,
+        # or when the images changed since it was built
+        self.image_atlas = ImageAtlas.load(Path('image_atlas'), images_dir=self.images_dir, words=self.words)
+        self.image_cache = ImageCache(self.images_dir, atlas=self.image_atlas)
 
     def initialize_app(self):
         load_dotenv()
@@ -123,6 +163,7 @@ class AIWordsAssistantApp:
         self.create_widgets()
         self.bind_events()
         self.create_image_grid()
+        self.create_pipeline()
         self.start_event_loop()
 
     def setup_main_window(self):
@@ -167,6 +208,12 @@ class AIWordsAssistantApp:
         self.description_label.pack(pady=10, padx=10, fill=ctk.X)
 
     def bind_events(self):
+        self.resize_scheduler = ResizeScheduler(
+            self.app,
+            self.create_image_grid,
+            quiet_period_ms=self.resize_quiet_period_ms,
+            preview=self.preview_image_grid if self.resize_preview else None
+        )
         self.app.bind("<Configure>", lambda event: self.on_resize(event))
 
     def start_event_loop(self):
@@ -186,17 +233,36 @@ class AIWordsAssistantApp:
         self.recording = True
         uuid_full = str(uuid.uuid4())
         self.session_id = uuid_full[:6]
+        self.conversation = ConversationSession(self.session_id, max_tokens=self.conversation_max_tokens,
+                                                summary_tokens=self.conversation_summary_tokens,
+                                                conversations_dir=self.conversations_dir,
+                                                conversation_words_dir=self.conversation_words_dir)
+        self.transcript_stitcher = TranscriptStitcher()
         self.update_button("Stop", "red", "darkred")
         
         # Create an AudioRecorder instance with callback
-        self.audio_recorder = AudioRecorder(self.session_id, self.audio_recorder_callback)
+        self.audio_recorder = self.create_audio_recorder()
         
         # Start the recording in a new thread
         Thread(target=self.audio_recorder.start_recording, daemon=True).start()
 
+    def create_audio_recorder(self):
+        return AudioRecorder(self.session_id, self.audio_recorder_callback, 
+                             save_recordings=self.save_recordings,
+                             upload_fs=self.upload_fs,
+                             audio_format=self.audio_format,
+                             chunk_seconds=self.chunk_seconds,
+                             overlap_seconds=self.chunk_overlap_seconds)
+
     def stop_recording(self, exiting=False):
         if self.audio_recorder:
             self.audio_recorder.stop_recording() 
+        if self.pipeline is not None:
+            self.pipeline.clear()
+        if self.conversation is not None:
+            logging.info(f"Conversation stats: {self.conversation.stats()}")
+        if self.transcript_stitcher is not None:
+            logging.info(f"Transcript stitching stats: {self.transcript_stitcher.stats()}")
         self.delete_history()
         self.recording = False
         if not exiting:
@@ -208,9 +274,17 @@ class AIWordsAssistantApp:
     def on_closing(self):
         self.exiting = True
         self.stop_recording(exiting=True)
+        if self.resize_scheduler is not None:
+            self.resize_scheduler.cancel()
+            logging.info(f"Resize stats: {self.resize_scheduler.stats()}")
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            logging.info(f"Pipeline stats: {self.pipeline.stats()}")
         if self.react is not None:
+            logging.info(f"Search cache stats: {self.react.tavily_cache.stats()}")
             self.react.agent_executor.max_iterations = 0
             self.react.agent_executor.max_execution_time = 0
+        tracer.close()
             
         try:
             self.app.destroy()
@@ -224,24 +298,57 @@ class AIWordsAssistantApp:
 
     def on_resize(self, event):
         if event.widget == self.app and (self.last_width != event.width or self.last_height != event.height):
-            self.create_image_grid()
             self.last_width = event.width
             self.last_height = event.height
             self.aspect_ratio = self.last_width / self.last_height          
+            self.resize_scheduler.schedule(event.width, event.height)
+
+    def get_resize_stats(self):
+        return self.resize_scheduler.stats()
+
+    def preview_image_grid(self, width, height):
+        # Cheap nearest-neighbour rescale of the images already on screen while a resize is pending
+        if not self.image_labels or self.grid_layout_width is None:
+            return
+        preview_size = max(1, round(self.image_size * width / self.grid_layout_width))
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.grid_frame)
+        pixel_size = max(1, round(preview_size * scaling))
+        for i, word in enumerate(self.grid_words):
+            if word is None:
+                continue
+            pil_image = self.image_cache.get_resized_image(word, self.get_image_pixel_size())
+            if pil_image is None:
+                continue
+            preview_image = pil_image.resize((pixel_size, pixel_size), Image.NEAREST)
+            self.image_labels[i].configure(image=ctk.CTkImage(preview_image, size=(preview_size, preview_size)))
+        # Make the next relayout replace every preview image
+        self.grid_image_size = None
 
     def create_image_grid(self):
-        self.clear_grid()
+        with tracer.span('grid.redraw'):
+            self._create_image_grid()
+
+    def _create_image_grid(self):
         self.app.update()
         width, height = self.grid_frame.winfo_width(), self.grid_frame.winfo_height()
         columns, rows = self.calculate_grid_dimensions(width, height)
         self.calculate_image_and_font_size(width, height, columns, rows)
         
+        if not self.image_labels:
+            self.create_image_labels()
+        
+        size_changed = self.grid_image_size != self.image_size
+        layout_changed = self.grid_layout != (columns, rows)
+        
         for i, word in enumerate(self.current_words):
-            self.add_image_to_grid(i,
-                                   word,
-                                #    self.image_size,
-                                #    self.image_labels_font_size,
-                                   columns) 
+            if size_changed or self.grid_words[i] != word:
+                self.add_image_to_grid(i, word)
+            if layout_changed:
+                self.image_labels[i].grid(row=i // columns, column=i % columns, padx=5, pady=5)
+
+        self.grid_image_size = self.image_size
+        self.grid_layout = (columns, rows)
+        self.grid_layout_width = self.app.winfo_width()
 
         self.description_label.config(wraplength=int(width*0.9))     
         self.words_label.config(wraplength=int(width*0.9)) 
@@ -250,10 +357,18 @@ class AIWordsAssistantApp:
 
         self.grid_frame.tk_images = self.previous_images
         self.word_list_changed = False    
-
-    def clear_grid(self):
-        for widget in self.grid_frame.winfo_children():
-            widget.destroy()
+        
+        logging.debug(f"Image cache stats: {self.image_cache.stats()}")
+
+    def create_image_labels(self):
+        # The 24 grid labels are created once and then updated in place
+        for index in range(len(self.current_words)):
+            img_label = ctk.CTkLabel(self.grid_frame, text="", compound="top")
+            img_label.bind("<Button-1>", lambda event, img_index=index: self.on_image_click(img_index))
+            self.image_labels.append(img_label)
+        self.grid_words = [None] * len(self.image_labels)
+        self.grid_layout = None
+        self.grid_image_size = None
 
     def calculate_grid_dimensions(self, width, height):
         aspect_ratio = width / height * 1.16339869 * 1.5
@@ -287,62 +402,44 @@ class AIWordsAssistantApp:
     def set_words_text(self, text):
         self.word_label_text.set(text)
 
-    def add_image_to_grid(self, index, word, columns):
-        image_path = Path.cwd() / f"images/{word}.png"
-        if not image_path.exists():
-            logging.warning(f"Image not found: {image_path}")
-            return
-        
-        img = ctk.CTkImage(Image.open(image_path), 
-                           size=(self.image_size, self.image_size))
+    def get_image_pixel_size(self):
+        # CTkImage scales its size by the widget scaling, so cache the image at the size it is drawn
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.grid_frame)
+        return max(1, round(self.image_size * scaling))
+
+    def get_image_cache_stats(self):
+        return self.image_cache.stats()
+
+    def add_image_to_grid(self, index, word):
+        img = None
+        pil_image = self.image_cache.get_resized_image(word, self.get_image_pixel_size())
+        if pil_image is not None:
+            img = ctk.CTkImage(pil_image, 
+                               size=(self.image_size, self.image_size))
         self.previous_images[index] = img
 
-        img_label = ctk.CTkLabel(
-            self.grid_frame,
+        self.image_labels[index].configure(
             image=img,
             text=word,
-            compound="top",
             font=("Arial", self.image_labels_font_size)
         )
-        img_label.grid(row=index // columns, column=index % columns, padx=5, pady=5)
-        img_label.bind("<Button-1>", lambda event, img_index=index: self.on_image_click(img_index))
+        self.grid_words[index] = word
 
     def on_image_click(self, index):
         logging.info(f"Image {index + 1} clicked")
 
-    def transcribe(self, fname):
-        transcription_error = False
+    def transcribe(self, fname, audio_file=None):
+        if audio_file is not None:
+            # In-memory WAV from the AudioRecorder; no round trip through the recordings directory
+            return transcribe_audio(self.OpenAI_client, fname, audio_file)
         
         file_path = self.recordings_dir / fname
         if not file_path.exists():
-            transcription_error = True
             logging.error(f"File {file_path} does not exist.")
-            return None, transcription_error
-
-        try:
-            with file_path.open("rb") as audio_file:
-                transcription = self.OpenAI_client.audio.transcriptions.create(
-                    model="whisper-1", 
-                    file=audio_file
-                )     
-        except Exception as e:
-              transcription_error = True
-              logging.error(f'Error transcribing audio: {e}')
-              logging.error(transcription_error_msg)
-              return None, transcription_error
-                      
-        text = transcription.text
+            return None, True
         
-        text = ''.join(filter(lambda x: x in string.printable, text))      
-        
-        if len(text)<1:
-            transcription_error = True
-            logging.info(transcription_error_msg)
-            return None, transcription_error
-        
-        logging.info(f"Transcription for {fname}: {text}")
-
-        return text, transcription_error
+        with file_path.open("rb") as audio_file:
+            return transcribe_audio(self.OpenAI_client, fname, audio_file)
 
     def delete_history(self):
         for directory in [self.recordings_dir,
@@ -355,94 +452,153 @@ class AIWordsAssistantApp:
                         logging.info(f"Deleted {file_path}")
                     except PermissionError as e:
                         logging.error(f"Failed to delete {file_path}: {e}")
+        if self.react is not None:
+            self.react.clear_cache()
+            logging.info("Cleared the word prediction cache")
 
 
     def update_conversation(self, text):
-        conversation_file = self.conversations_dir / f"{self.session_id}.txt"
-        old_text = conversation_file.read_text() if conversation_file.exists() else ""
-        new_text = (old_text + text)[-4000:]
-        
-        with open(conversation_file, 'w') as f:
-            f.write(new_text)        
-        
-        # Split the string on commas, whitespace, and any punctuation characters
-        conversation_words = re.split(r"[, .?!:;]", new_text)
-        
-        # # syntax warning as of Python 3.12
-        # conversation_words = re.split("[,\s\.\?!]", new_text)
-
-        # Remove any whitespace characters
-        conversation_words = [word.strip() for word in conversation_words]
-
-        # Find the unique string values
-        conversation_words = set(conversation_words)
-
-        # Save the unique string values to the file
-        conversation_words_file = os.path.join('conversation_words',
-                                               f'{self.session_id}.txt')
-        with open(conversation_words_file, 'w') as f:
-            f.write(','.join(conversation_words))        
-
-        logging.info(f"Updated conversation for session {self.session_id}")
+        # Only the new text is split into words; the files are appended to, not rewritten
+        return self.conversation.append(text)
         
-        return new_text
-        
-    def audio_recorder_callback(self, session_id, fname):
+    def create_pipeline(self):
+        self.pipeline = Pipeline()
+        self.pipeline.add_stage('transcribe', self.transcribe_stage, 
+                                maxsize=self.pipeline_queue_size, policy=self.pipeline_policy)
+        # A newer transcript is appended to a pending one, so no speech is lost while the agent is busy
+        self.pipeline.add_stage('conversation', self.conversation_stage, 
+                                maxsize=self.pipeline_queue_size, policy='merge-pending',
+                                merge=lambda old, new: (new[0], f"{old[1]} {new[1]}"))
+        # The newest conversation window already contains the older ones; the mode is chosen from the
+        # transcripts that are new since the last prediction
+        self.pipeline.add_stage('predict', self.prediction_stage, 
+                                maxsize=1, policy='merge-pending',
+                                merge=lambda old, new: (*new[:3], f"{old[3]} {new[3]}"))
+        self.pipeline.add_stage('ui', self.ui_stage, 
+                                maxsize=1, policy='merge-pending', merge=lambda old, new: new)
+        self.pipeline.start()
+
+    def get_pipeline_stats(self):
+        return self.pipeline.stats()
+
+    def audio_recorder_callback(self, session_id, fname, audio_file=None, overlap_seconds=0.0):
         if self.exiting:
             return
         
-        if self.parsing_audio:
-            return
-        
-        self.parsing_audio = True
-        self.session_id = session_id
+        # Runs on the recorder thread, so only hand the chunk over to the pipeline
+        self.pipeline.put((session_id, fname, audio_file, overlap_seconds))
+        logging.debug(f"Pipeline queue depths: {self.pipeline.stats()}")
+
+    def transcribe_stage(self, chunk):
+        session_id, fname, audio_file, overlap_seconds = chunk
         
-        text, transcription_error = self.transcribe(fname)
+        text, transcription_error = self.transcribe(fname, audio_file)
         
         if transcription_error or text is None:
-            self.parsing_audio = False
-            return
+            return None
+        
+        # In chunk order: this stage has one worker, and the conversation stage may merge its transcripts
+        if session_id == self.session_id and self.transcript_stitcher is not None:
+            text = self.transcript_stitcher.stitch(text, overlap_seconds)
+            if not text:
+                return None
+        
+        return session_id, text
+
+    def conversation_stage(self, transcript):
+        session_id, text = transcript
+        if self.exiting or not self.recording or session_id != self.session_id:
+            return None
         
         try:
             conversation_text = self.update_conversation(text)
         except Exception as e:
             logging.error(f'Could not update conversation files: {e}')
-            self.parsing_audio = False
-            return
+            return None
+        
+        # A snapshot, because the next transcript may update the conversation while the agent runs
+        return session_id, conversation_text, self.conversation.words(), text
+
+    def prediction_stage(self, conversation):
+        session_id, conversation_text, conversation_words, newest_text = conversation
+        if self.exiting or not self.recording or session_id != self.session_id:
+            return None
+        
+        on_partial_words = self.partial_words_handler(session_id) if self.stream_partial_words else None
         
         try:            
             current_words_new, word_candidates_ex_images = self.react.run_agent_for_app(session_id, 
-                                                                                        self.current_words, 
-                                                                                        conversation_text)
+                                                                                        self.predicted_words, 
+                                                                                        conversation_text,
+                                                                                        on_partial_words,
+                                                                                        conversation_words,
+                                                                                        newest_text)
         except Exception as e:
             logging.error(f'React agent failed: {e}')
-            self.parsing_audio = False
-            return   
+            return None
         
         if current_words_new is None or word_candidates_ex_images is None:
-            self.parsing_audio = False
-            return                  
+            return None
         
-        self.word_list_changed = False
+        if current_words_new == self.predicted_words:
+            # The grid already shows (or is about to show) these words, so the chunk is done
+            tracer.mark('chunk.total')
+            return None
+        
+        self.predicted_words[:] = current_words_new
+        # The Tk thread gets its own copy of the words, so the next prediction can't change them under it
+        return list(current_words_new), word_candidates_ex_images
+
+    def partial_words_handler(self, session_id):
+        def on_partial_words(current_words_new, word_candidates_ex_images):
+            if self.exiting or not self.recording or session_id != self.session_id:
+                return
+            if current_words_new == self.predicted_words:
+                return
+            # Interim words go straight into self.predicted_words, so the final result of the agent 
+            # is parsed against (and reconciles) what the grid shows
+            self.predicted_words[:] = current_words_new
+            self.call_in_ui_thread(self.show_words, list(current_words_new), word_candidates_ex_images, 
+                                   'chunk.partial')
+        
+        return on_partial_words
+
+    def ui_stage(self, prediction):
+        current_words_new, word_candidates_ex_images = prediction
+        if self.exiting:
+            return None
         
-        for i in range(24):
-            if self.current_words[i] != current_words_new[i]:
-                self.word_list_changed = True
-            self.current_words[i] = current_words_new[i]
+        self.call_in_ui_thread(self.show_words, current_words_new, word_candidates_ex_images, 'chunk.total')
+        return None
+
+    def call_in_ui_thread(self, func, *args):
+        # Tk may only be used from the thread that runs its main loop; the trace of the chunk goes along
+        context = contextvars.copy_context()
+        try:
+            self.app.after(0, context.run, func, *args)
+        except (RuntimeError, tk.TclError) as e:
+            logging.debug(f'Could not schedule a grid update: {e}')
+
+    def show_words(self, current_words_new, word_candidates_ex_images, trace_mark):
+        if self.exiting:
+            return
         
+        # On the Tk thread, so create_image_grid never sees the list change while it draws
+        self.current_words[:] = current_words_new
+        self.update_grid(word_candidates_ex_images)
+        # From the audio chunk to the updated grid
+        tracer.mark(trace_mark)
+
+    def update_grid(self, word_candidates_ex_images):
         try:            
-            if self.word_list_changed:
-                self.create_image_grid()
-                if len (word_candidates_ex_images) < 16:
-                    self.set_words_text(', '.join(word_candidates_ex_images))
-                else:
-                    self.set_words_text(', '.join(word_candidates_ex_images[:16]))
+            self.word_list_changed = True
+            self.create_image_grid()
+            if len (word_candidates_ex_images) < 16:
+                self.set_words_text(', '.join(word_candidates_ex_images))
+            else:
+                self.set_words_text(', '.join(word_candidates_ex_images[:16]))
         except Exception as e:
             logging.error(f'Could not update image grid: {e}')
-            self.parsing_audio = False
-            return                 
- 
-        self.parsing_audio = False             
 
 if __name__ == "__main__":
     try:
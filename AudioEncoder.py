@@ -0,0 +1,99 @@
+"""
+AudioEncoder.py
+
+This file prepares recorded audio for upload to the speech-to-text service.
+
+Functionality:
+- Resamples the recorded audio from the capture rate (44.1 kHz) to the rate that speech-to-text
+models work at (16 kHz) with polyphase filtering from scipy. The chunk is filtered one block at a
+time into a preallocated int16 array, so that only one block is ever held as floats; the blocks
+overlap by the length of the filter, and the result is the same as filtering the chunk at once.
+- Encodes the audio as an in-memory WAV, FLAC or OGG (Vorbis) file. WAV needs only scipy; FLAC and
+OGG need the optional `soundfile` package and fall back to WAV when it is not installed.
+
+Interaction with Other Files:
+- **AudioRecorder.py**: The AudioRecorder resamples and encodes every chunk with these functions
+before passing it to the app for transcription.
+
+Functions:
+- `resample_audio(samples, fs_in, fs_out)`: Returns int16 samples at the new sample rate. `samples` may also be
+  a RingView of the ring buffer.
+- `encode_audio(samples, fs, audio_format, fname)`: Returns the encoded audio as a named BytesIO.
+- `available_formats()`: Returns the audio formats that can be encoded with the installed packages.
+
+© Matthew J. Hergott
+"""
+
+from math import ceil, gcd
+from typing import List
+import io
+import logging
+
+import numpy as np
+import scipy.io.wavfile as wav
+from scipy.signal import resample_poly
+
+try:
+    import soundfile as sf
+except (ImportError, OSError):
+    sf = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RESAMPLE_BLOCK_SECONDS = 1.0
+# Half the length of the filter of resample_poly, in multiples of the larger resampling factor
+RESAMPLE_HALF_FILTER = 10
+
+# format name -> (soundfile format, soundfile subtype)
+SOUNDFILE_FORMATS = {
+    'flac': ('FLAC', 'PCM_16'),
+    'ogg': ('OGG', 'VORBIS'),
+}
+
+
+def available_formats() -> List[str]:
+    return ['wav'] + (list(SOUNDFILE_FORMATS) if sf is not None else [])
+
+
+def resample_audio(samples: np.ndarray, fs_in: int, fs_out: int) -> np.ndarray:
+    if fs_in == fs_out:
+        return np.asarray(samples)
+    divisor = gcd(fs_in, fs_out)
+    up, down = fs_out // divisor, fs_in // divisor
+    n = len(samples)
+    # Blocks start at multiples of `down` input samples, which map to whole output samples;
+    # the context on both sides of a block covers the filter
+    block = down * max(1, int(fs_in * RESAMPLE_BLOCK_SECONDS) // down)
+    context = down * (ceil(RESAMPLE_HALF_FILTER * max(up, down) / (up * down)) + 1)
+    n_out = ceil(n * up / down)
+    resampled = np.empty(n_out, dtype=np.int16)
+    for start in range(0, n, block):
+        end = min(start + block, n)
+        lo, hi = max(0, start - context), min(n, end + context)
+        filtered = resample_poly(samples[lo:hi].astype(np.float32), up, down)
+        out_start = start * up // down
+        out_end = n_out if end == n else end * up // down
+        first = (start - lo) * up // down
+        resampled[out_start:out_end] = np.clip(np.round(filtered[first:first + out_end - out_start]), -32768, 32767)
+    return resampled
+
+
+def encode_audio(samples: np.ndarray, fs: int, audio_format: str = 'wav', fname: str = 'audio.wav') -> io.BytesIO:
+    audio_file = io.BytesIO()
+
+    if audio_format in SOUNDFILE_FORMATS and sf is None:
+        logging.warning(f"The soundfile package is needed for {audio_format} encoding; using wav instead.")
+        audio_format = 'wav'
+
+    if audio_format == 'wav':
+        wav.write(audio_file, fs, samples)
+    elif audio_format in SOUNDFILE_FORMATS:
+        file_format, subtype = SOUNDFILE_FORMATS[audio_format]
+        sf.write(audio_file, samples, fs, format=file_format, subtype=subtype)
+    else:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+
+    # The transcription service detects the format from the file extension
+    audio_file.name = f"{fname.rsplit('.', 1)[0]}.{audio_format}"
+    audio_file.seek(0)
+    return audio_file
@@ -7,13 +7,24 @@ Functionality:
 - Initializes the audio recording settings, such as sample rate and chunk size.
 - Provides methods to start and stop recording audio.
 - Saves the recorded audio to a specified file format.
+- Writes incoming audio in place into a preallocated ring buffer (RingBuffer.py), so that each chunk is held in memory only once.
+- Cuts the audio into segments at natural pauses with a voice activity detector (VoiceActivityDetector.py) and drops silent segments.
+  Fixed chunks of `chunk_seconds` are still available with `use_vad=False`.
+- With `overlap_seconds`, a chunk that starts where the previous one was cut, in the middle of speech, begins
+  that many seconds earlier, so that the words around the cut are whole in one of the two chunks. The overlap
+  is part of the same view into the ring buffer; the transcripts are merged by TranscriptStitcher.py.
+- Resamples each chunk to 16 kHz and optionally compresses it as FLAC or OGG (AudioEncoder.py) before upload.
+- Encodes each chunk as an in-memory audio file and passes it to the callback. Writing the chunks to the
+  `recordings` directory is optional (`save_recordings=True`).
 
 Interaction with Other Files:
 - **AIWordsAssistantApp.py**: The AIWordsAssistantApp class may use the AudioRecorder to capture audio input from the user. The recorded audio is then transcribed and used to generate word predictions.
+- **Tracing.py**: Every emitted chunk starts a trace, which follows the chunk through the app's pipeline.
+- **TranscriptStitcher.py**: The callback receives the seconds of overlap with the previous chunk, for stitching.
 
 Classes and Methods:
 - **AudioRecorder**: This class encapsulates all the functionality required to record audio.
-  - `__init__(self, filename, sample_rate=44100, chunk_size=1024)`: Initializes the audio recording settings, including the filename, sample rate, and chunk size.
+  - `__init__(self, session_id, callback, use_vad=True, save_recordings=False, upload_fs=16000, audio_format='wav', chunk_seconds=30, overlap_seconds=0.0)`: Initializes the audio recording settings. The callback is called with the session id, file name, in-memory audio file and seconds of overlap of every chunk.
   - `start_recording(self)`: Starts the audio recording process.
   - `stop_recording(self)`: Stops the audio recording process and saves the recorded audio to the specified file.
   - `save_audio(self)`: Saves the recorded audio data to a file in WAV format.
@@ -42,71 +53,150 @@ By following these troubleshooting steps, you can identify and resolve common is
 
 import sounddevice as sd
 import numpy as np
-import scipy.io.wavfile as wav
 import threading
 import time
 from datetime import datetime
-from typing import Callable, List
+from typing import Callable
+import io
 import logging
 from pathlib import Path
-import copy
+
+from RingBuffer import RingBuffer
+from VoiceActivityDetector import VoiceActivityDetector
+from AudioEncoder import encode_audio, resample_audio
+from Tracing import tracer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class AudioRecorder:
-    def __init__(self, session_id: str, callback: Callable[[str, str], None]):
+    def __init__(self, session_id: str, 
+                 callback: Callable[..., None], 
+                 use_vad: bool = True,
+                 save_recordings: bool = False,
+                 upload_fs: int = 16000,
+                 audio_format: str = 'wav',
+                 chunk_seconds: float = 30,
+                 overlap_seconds: float = 0.0):
         self.session_id = session_id
         self.callback = callback
+        self.save_recordings = save_recordings
+        self.upload_fs = upload_fs  # Speech-to-text models work at 16 kHz
+        self.audio_format = audio_format
         self.recording = False
         self.stream = None
         self.fname = None
         self.path = None
         self.dtype=np.int16
         self.fs = 44100  # Sample rate
-        self.buffer: List[np.ndarray] = []
+        self.chunk_seconds = chunk_seconds  # Fixed chunk length, and the longest segment when using voice activity detection
+        self.overlap_seconds = overlap_seconds  # Audio before a cut in the middle of speech that is sent again
+        self.overlap = int(self.fs * overlap_seconds)
+        # Extra room so the callback can keep writing while a finished chunk is being saved
+        self.buffer_headroom_seconds = 5
+        self.buffer = RingBuffer(int(self.fs * (self.chunk_seconds + self.overlap_seconds + self.buffer_headroom_seconds)), 
+                                 dtype=self.dtype)
         self.lock = threading.Lock()
         self.thread = None
+        self.vad = VoiceActivityDetector(self.fs, max_segment_seconds=self.chunk_seconds) if use_vad else None
 
     def _get_filename(self) -> str:
         now = datetime.now()
         return f"{self.session_id}_{now.year}_{now.month:02d}_{now.day:02d}_{now.hour:02d}_{now.minute:02d}_{now.second:02d}.wav"
 
-    def _save_buffer_to_file(self, buffer: List[np.ndarray], fname: str) -> None:
+    def _encode_buffer(self, buffer, fname: str) -> io.BytesIO:
+        # The chunk is a view into the ring buffer; the resampler copies one block of it at a time
+        fs = self.upload_fs or self.fs
+        return encode_audio(resample_audio(buffer, self.fs, fs), fs, self.audio_format, fname)
+
+    def _save_buffer_to_file(self, audio_file: io.BytesIO, fname: str) -> None:
         with self.lock:
             self.fname = fname
             self.path = Path.cwd() / f"recordings/{self.fname}"
             logging.debug(f"Saving buffer to file {self.path}")
-           
-            # Copy buffer to a new buffer (deep copy)
-            new_buffer = copy.deepcopy(buffer)     
-            buffer = []     
-
-            # Save the new buffer to the file
-            wav.write(self.path, self.fs, np.concatenate(new_buffer).astype(np.int16))
+            self.path.write_bytes(audio_file.getbuffer())
             logging.debug(f"Finished saving file {self.fname}")
 
+    def _read_chunk(self, start: int, end: int, previous_end: int):
+        # A chunk that continues the previous one without a gap starts `overlap` samples earlier
+        if self.overlap and start <= previous_end:
+            start = max(start - self.overlap, self.buffer.oldest)
+            overlap_seconds = (previous_end - start) / self.fs
+        else:
+            overlap_seconds = 0.0
+        # A view into the ring buffer, also when the chunk wraps around its end
+        return self.buffer.view(start, end), overlap_seconds
+
+    def _emit_chunk(self, buffer, fname: str, overlap_seconds: float = 0.0) -> None:
+        # One trace per chunk; the pipeline carries it on to the transcription, agent and grid update
+        with tracer.trace('emit', session=self.session_id, seconds=round(len(buffer) / self.fs, 2),
+                          overlap=round(overlap_seconds, 2)):
+            with tracer.span('encode') as span:
+                audio_file = self._encode_buffer(buffer, fname)
+                span['bytes'] = len(audio_file.getbuffer())
+            fname = audio_file.name
+            if self.save_recordings:
+                self._save_buffer_to_file(audio_file, fname)
+
+            if self.recording:
+                self.callback(self.session_id, fname, audio_file, overlap_seconds)
+
     def _recording_thread(self) -> None:
+        if self.vad is None:
+            self._fixed_chunk_loop()
+        else:
+            self._vad_loop()
+
+    def _fixed_chunk_loop(self) -> None:
+        # Every chunk starts where the previous one ended, so no audio is lost while a chunk is being emitted
+        chunk_start = self.buffer.total_written
+        previous_end = -1
         while self.recording:
             self.fname = self._get_filename()
-            self.buffer = []
             start_time = time.time()
             logging.debug(f"Started recording to file {self.fname}")
 
-            while time.time() - start_time < 30 and self.recording:
+            while time.time() - start_time < self.chunk_seconds and self.recording:
                 time.sleep(0.1)  # Sleep briefly to avoid busy-waiting
 
-            if self.buffer and self.recording:
-                self._save_buffer_to_file(self.buffer, self.fname)
-                
-                if self.recording:
-                    self.callback(self.session_id, self.fname)
+            chunk_end = self.buffer.total_written
+            chunk, overlap_seconds = self._read_chunk(chunk_start, chunk_end, previous_end)
+            chunk_start = previous_end = chunk_end
+
+            if len(chunk) and self.recording:
+                self._emit_chunk(chunk, self.fname, overlap_seconds)
+
+    def _vad_loop(self) -> None:
+        processed = self.buffer.total_written
+        self.vad.reset(processed)
+        previous_end = -1
+
+        while self.recording:
+            time.sleep(0.1)  # Sleep briefly to avoid busy-waiting
+
+            if processed < self.buffer.oldest:
+                logging.warning(f"Voice activity detection fell behind; skipped {self.buffer.oldest - processed} samples.")
+                processed = self.buffer.oldest
+                self.vad.reset(processed)
+
+            end = self.buffer.total_written
+            segments = self.vad.process(self.buffer.read(processed, end))
+            processed = end
+
+            for start, segment_end in segments:
+                if not self.recording:
+                    break
+                self.fname = self._get_filename()
+                logging.debug(f"Speech segment of {(segment_end - start) / self.fs:.1f} s for file {self.fname}")
+                chunk, overlap_seconds = self._read_chunk(start, segment_end, previous_end)
+                previous_end = segment_end
+                self._emit_chunk(chunk, self.fname, overlap_seconds)
 
     def _audio_callback(self, indata: np.ndarray, frames: int, time, status) -> None:
         if status:
             logging.warning(f"Audio callback status: {status}")
-        with self.lock:
-            self.buffer.append(indata[:, 0].copy())
+        # Written in place into the preallocated ring buffer; no per-block allocation
+        self.buffer.write(indata[:, 0])
 
     def _list_recording_devices(self) -> None:
         logging.info(f"default [input, output] device: {sd.default.device}")
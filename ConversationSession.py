@@ -0,0 +1,246 @@
+"""
+ConversationSession.py
+
+This file keeps the conversation of one recording session in memory.
+
+Functionality:
+- Keeps a rolling window of the most recent sentences of the transcribed conversation, as many as fit
+in `max_tokens` tokens. Tokens are counted per sentence with the TokenCounter, so only the sentence in
+progress is counted again when a transcript is appended. Older sentences leave the window whole; a
+single sentence longer than the window is cut at a word boundary.
+- Optionally keeps an extractive summary of the sentences that have left the window: the sentences with
+the most content words, in their original order, within `summary_tokens` tokens. The summary is put in
+front of the window in the text for the agent.
+- Maintains a multiset (Counter) of the words in the window incrementally: only the newly appended text
+is split into words, and the words of text that falls out of the window are counted down again.
+Transcripts are joined with a space, so that the last word of one never runs into the first word of
+the next. The words are split exactly as the whole window would be split, also where a word is cut by
+the start of the window.
+- Counts the tokens of the text for the agent after every transcript, for `stats`.
+- Persists the conversation append-only: each transcript is appended to `conversations/<session>.txt`,
+and each word heard for the first time in the session to `conversation_words/<session>.txt`.
+Neither file is read back or rewritten while the session runs.
+
+Interaction with Other Files:
+- **AIWordsAssistantApp.py**: The app creates a ConversationSession when recording starts and appends
+every transcript to it.
+- **React.py**: The app passes a snapshot of the words in the window to `React.run_agent_for_app`,
+which then does not read the `conversation_words` file.
+- **TokenCounter.py**: Estimates the tokens of each sentence.
+
+Classes and Methods:
+- **ConversationSession**: This class encapsulates the window, the summary, the word counts and the files.
+  - `append(self, text)`: Appends a transcript and returns the text for the agent (summary and window).
+  - `words(self)`: Returns a snapshot of the set of words in the window.
+  - `stats(self)`: Returns the token counts of the window, the summary and the text sent to the agent.
+  - `text`: The current window.
+
+© Matthew J. Hergott
+"""
+
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional
+import logging
+import re
+import threading
+
+from TokenCounter import TokenCounter
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# The characters update_conversation has always split the conversation on
+WORD_SEPARATORS = ', .?!:;'
+# Between two transcripts, unless one of them already has a space there
+TRANSCRIPT_SEPARATOR = ' '
+SEPARATOR_PATTERN = re.compile(f"[{re.escape(WORD_SEPARATORS)}]")
+# A sentence ends with its punctuation and the whitespace after it, or at a line break
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+CONTENT_WORD = re.compile(r"[A-Za-z]{4,}")
+FUNCTION_WORDS = frozenset(
+    'that this with have from they will would there their what when your which about were been just '
+    'like then than them these those into more some could should very really also only other being '
+    'here know think going yeah okay well want said does didn'.split()
+)
+
+
+def split_words(text: str):
+    return [word.strip() for word in SEPARATOR_PATTERN.split(text)]
+
+
+def split_sentences(text: str) -> List[str]:
+    # The last piece is the sentence in progress, possibly empty
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    sentences.append(text[start:])
+    return sentences
+
+
+def content_score(sentence: str) -> int:
+    return len({word.lower() for word in CONTENT_WORD.findall(sentence)} - FUNCTION_WORDS)
+
+
+class ConversationSession:
+    def __init__(self, session_id: str,
+                 max_tokens: int = 800,
+                 summary_tokens: int = 0,
+                 conversations_dir: Path = Path('conversations'),
+                 conversation_words_dir: Path = Path('conversation_words'),
+                 persist: bool = True,
+                 token_counter: Optional[TokenCounter] = None):
+        self.session_id = session_id
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.persist = persist
+        self.token_counter = token_counter or TokenCounter()
+        self.conversation_file = Path(conversations_dir) / f"{session_id}.txt"
+        self.words_file = Path(conversation_words_dir) / f"{session_id}.txt"
+        self.lock = threading.Lock()
+        self.text = ''
+        # [text, tokens] of every sentence in the window; the last one is the sentence in progress
+        self.sentences: deque = deque([['', 0]])
+        self.window_tokens = 0
+        # (position, score, text, tokens) of the sentences kept from outside the window
+        self.summary: List[tuple] = []
+        self.evicted_sentences = 0
+        self.counts = Counter(split_words(self.text))
+        self.session_words = set(self.counts)
+        self.appends = 0
+        self.prompt_tokens = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+
+    def _add(self, text: str):
+        words = split_words(text)
+        self.counts.update(words)
+        return words
+
+    def _remove(self, text: str) -> None:
+        for word in split_words(text):
+            self.counts[word] -= 1
+            if self.counts[word] <= 0:
+                del self.counts[word]
+
+    def _append_sentences(self, text: str) -> None:
+        # Only the sentence in progress and the new text are split and counted
+        last_text, last_tokens = self.sentences.pop()
+        self.window_tokens -= last_tokens
+        for sentence in split_sentences(last_text + text):
+            tokens = self.token_counter.count(sentence)
+            self.sentences.append([sentence, tokens])
+            self.window_tokens += tokens
+
+    def _evict_sentences(self) -> int:
+        # Returns the number of characters that left the window
+        cut = 0
+        while self.window_tokens > self.max_tokens and len(self.sentences) > 1:
+            sentence, tokens = self.sentences.popleft()
+            self.window_tokens -= tokens
+            cut += len(sentence)
+            self._summarize(sentence, tokens)
+
+        while self.window_tokens > self.max_tokens:
+            # One sentence longer than the whole window: keep its end, from a word boundary. The share of
+            # characters to keep is a guess, so cut again until the remainder fits.
+            sentence, tokens = self.sentences[0]
+            keep = min(len(sentence) - 1, int(len(sentence) * self.max_tokens / tokens))
+            start = sentence.find(' ', len(sentence) - keep)
+            start = len(sentence) - keep if start < 0 else start + 1
+            remainder = sentence[start:]
+            self.sentences[0] = [remainder, self.token_counter.count(remainder)]
+            self.window_tokens += self.sentences[0][1] - tokens
+            cut += start
+        return cut
+
+    def _summarize(self, sentence: str, tokens: int) -> None:
+        self.evicted_sentences += 1
+        if self.summary_tokens <= 0 or tokens > self.summary_tokens:
+            return
+        score = content_score(sentence)
+        if score == 0:
+            return
+        self.summary.append((self.evicted_sentences, score, sentence, tokens))
+        # Keep the highest scoring sentences (the newest of equal ones) that fit, in conversation order
+        kept, total = [], 0
+        for item in sorted(self.summary, key=lambda item: (item[1], item[0]), reverse=True):
+            if total + item[3] <= self.summary_tokens:
+                kept.append(item)
+                total += item[3]
+        self.summary = sorted(kept)
+
+    def _prompt_text(self) -> str:
+        if not self.summary:
+            return self.text
+        summary = ' '.join(item[2].strip() for item in self.summary)
+        return f"Earlier: {summary}\n{self.text}"
+
+    def append(self, text: str) -> str:
+        with self.lock:
+            old_text = self.text
+            if old_text and not old_text.endswith(TRANSCRIPT_SEPARATOR) and not text.startswith(TRANSCRIPT_SEPARATOR):
+                text = TRANSCRIPT_SEPARATOR + text
+            new_text = old_text + text
+
+            # No word runs across the separator; only the empty word on one side of it is already counted
+            added_words = split_words(text)
+            if added_words[0] == '':
+                added_words = added_words[1:]
+            else:
+                self._remove('')
+            self.counts.update(added_words)
+
+            self._append_sentences(text)
+            cut = self._evict_sentences()
+            if cut > 0:
+                # The words up to the first separator after the cut leave the window; a word cut in two stays in part
+                match = SEPARATOR_PATTERN.search(new_text, cut)
+                end = match.start() if match else len(new_text)
+                self._remove(new_text[:end])
+                self._add(new_text[cut:end])
+                new_text = new_text[cut:]
+
+            self.text = new_text
+            new_words = [word for word in dict.fromkeys(added_words) if word not in self.session_words]
+            self.session_words.update(new_words)
+
+            prompt_text = self._prompt_text()
+            self.prompt_tokens = self.window_tokens + sum(item[3] for item in self.summary)
+            self.appends += 1
+            self.prompt_tokens_total += self.prompt_tokens
+            self.prompt_tokens_max = max(self.prompt_tokens_max, self.prompt_tokens)
+
+        if self.persist:
+            self._persist(text, new_words)
+
+        logging.info(f"Updated conversation for session {self.session_id}: {self.prompt_tokens} tokens "
+                     f"({self.token_counter.backend}).")
+        return prompt_text
+
+    def _persist(self, text: str, new_words) -> None:
+        # Append-only: the files grow by the new text and the new words, and are never rewritten
+        with open(self.conversation_file, 'a') as f:
+            f.write(text)
+        if new_words:
+            with open(self.words_file, 'a') as f:
+                f.write(','.join(new_words) + ',')
+
+    def words(self) -> FrozenSet[str]:
+        with self.lock:
+            return frozenset(self.counts)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'tokenizer': self.token_counter.backend,
+                'window_tokens': self.window_tokens,
+                'window_sentences': len(self.sentences),
+                'summary_tokens': sum(item[3] for item in self.summary),
+                'summary_sentences': len(self.summary),
+                'evicted_sentences': self.evicted_sentences,
+                'prompt_tokens': self.prompt_tokens,
+                'prompt_tokens_mean': self.prompt_tokens_total / self.appends if self.appends else 0.0,
+                'prompt_tokens_max': self.prompt_tokens_max,
+            }
@@ -0,0 +1,137 @@
+"""
+ImageAtlas.py
+
+This file reads the word image atlases written by `build_image_atlas.py`.
+
+Functionality:
+- Maps each atlas file into memory with NumPy, so that only the tiles that are actually used are read from disk.
+- Slices a word's tile out of the mapped atlas and wraps it in a PIL image without copying the pixel data.
+- Picks the smallest atlas that is at least as large as the requested image size. Sizes above the largest
+atlas are left to the PNG files, because an upsampled tile looks worse than the resized original.
+- Records a SHA-1 digest (with the modification time and size) of every source PNG, so that an atlas that
+no longer matches the `images` directory is detected and not used. Only files whose modification time or
+size differ from the recorded ones are read and hashed again, so touching or copying a PNG does not make
+the atlas stale, and checking an unchanged directory reads no image data.
+
+Interaction with Other Files:
+- **build_image_atlas.py**: Builds the atlas files and the `index.json` file of tile offsets.
+- **ImageCache.py**: The ImageCache uses the ImageAtlas, when one has been built, instead of opening
+and decoding the individual PNG files in the `images` directory.
+
+Classes and Methods:
+- **ImageAtlas**: This class encapsulates the memory-mapped atlases.
+  - `load(cls, atlas_dir, images_dir=None, words=None)`: Returns an ImageAtlas for `atlas_dir`, or None if no atlas
+    has been built there or, when `images_dir` is given, if it is out of date.
+  - `get_tile(self, word, size)`: Returns the tile for a word from the atlas best suited to `size`, or None.
+- `image_sources(images_dir, words)`: Returns the modification time, size and digest of the PNG file of every word.
+- `changed_sources(sources, images_dir, words)`: Returns the words whose PNG file differs from `sources`.
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import hashlib
+import json
+import logging
+
+import numpy as np
+from PIL import Image
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def file_digest(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def image_sources(images_dir: Path, words: Iterable[str]) -> Dict[str, List]:
+    sources = {}
+    for word in words:
+        path = Path(images_dir) / f"{word}.png"
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        sources[word] = [stat.st_mtime_ns, stat.st_size, file_digest(path)]
+    return sources
+
+
+def changed_sources(sources: Dict[str, List], images_dir: Path, words: Iterable[str]) -> List[str]:
+    changed = []
+    for word in words:
+        path = Path(images_dir) / f"{word}.png"
+        recorded = sources.get(word)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            if recorded is not None:
+                changed.append(word)
+            continue
+        if recorded is None or len(recorded) != 3 or recorded[1] != stat.st_size:
+            changed.append(word)
+        elif recorded[0] != stat.st_mtime_ns and recorded[2] != file_digest(path):
+            # Only a file with a new modification time is read again
+            changed.append(word)
+    return changed
+
+
+class ImageAtlas:
+    def __init__(self, atlas_dir: Path, index: Dict):
+        self.atlas_dir = Path(atlas_dir)
+        self.mode = index['mode']
+        self.bands = len(self.mode)
+        self.words = set(index['words'])
+        self.sizes = []
+        self.atlases: Dict[int, np.memmap] = {}
+        self.offsets: Dict[int, Dict[str, int]] = {}
+
+        for atlas in sorted(index['atlases'], key=lambda a: a['size']):
+            size = atlas['size']
+            self.sizes.append(size)
+            self.offsets[size] = atlas['offsets']
+            self.atlases[size] = np.memmap(self.atlas_dir / atlas['file'], dtype=np.uint8, mode='r')
+
+    @classmethod
+    def load(cls, atlas_dir: Path, images_dir: Optional[Path] = None,
+             words: Optional[Iterable[str]] = None) -> Optional["ImageAtlas"]:
+        index_path = Path(atlas_dir) / 'index.json'
+        if not index_path.exists():
+            return None
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+            if images_dir is not None:
+                changed = changed_sources(index.get('sources', {}), images_dir, words or index['words'])
+                if changed:
+                    logging.warning(f"Image atlas in {atlas_dir} does not match {len(changed)} images in "
+                                    f"{images_dir} (e.g. {changed[0]!r}); using the PNG files. "
+                                    f"Run build_image_atlas.py to rebuild it.")
+                    return None
+            atlas = cls(atlas_dir, index)
+        except Exception as e:
+            logging.error(f"Could not load image atlas from {atlas_dir}: {e}")
+            return None
+        logging.info(f"Loaded image atlas with sizes {atlas.sizes} for {len(atlas.words)} words.")
+        return atlas
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def best_size(self, size: int) -> Optional[int]:
+        # Downsampling from the next larger tile looks better than upsampling a smaller one
+        for atlas_size in self.sizes:
+            if atlas_size >= size:
+                return atlas_size
+        return None
+
+    def get_tile(self, word: str, size: int) -> Optional[Image.Image]:
+        atlas_size = self.best_size(size)
+        if word not in self.words or atlas_size is None:
+            return None
+        offset = self.offsets[atlas_size][word]
+        tile_bytes = atlas_size * atlas_size * self.bands
+        tile = self.atlases[atlas_size][offset:offset + tile_bytes]
+        # The raw mode of the atlas lets PIL use the mapped memory directly instead of copying it
+        return Image.frombuffer(self.mode, (atlas_size, atlas_size), tile, 'raw', self.mode, 0, 1)
@@ -0,0 +1,155 @@
+"""
+ImageCache.py
+
+This file keeps decoded word images in memory so that the image grid can be redrawn without
+reading and decoding the PNG files in the `images` directory every time.
+
+Functionality:
+- Decodes `images/<word>.png` once and keeps the decoded PIL image in a least-recently-used cache.
+- Keeps resized copies of the images, keyed by (word, pixel size), in a second least-recently-used cache.
+- Evicts the least recently used images when a cache goes over its byte budget.
+- Counts cache hits and misses so that the savings can be checked.
+- Takes the images from the memory-mapped atlases written by `build_image_atlas.py` when they are available,
+and from the PNG files for sizes larger than the largest atlas.
+
+Interaction with Other Files:
+- **AIWordsAssistantApp.py**: The AIWordsAssistantApp class asks the ImageCache for the resized image
+of each word in the grid. A window resize or a word-list refresh that changes only a few words then
+only decodes the images that are new.
+- **ImageAtlas.py**: When an ImageAtlas is given, resized images are made from its pre-scaled tiles instead
+of the full-resolution PNG files.
+
+Classes and Methods:
+- **LRUByteCache**: A thread-safe least-recently-used cache bounded by the total size of its values in bytes.
+- **ImageCache**: This class encapsulates the decoded and resized image caches.
+  - `get_image(self, word)`: Returns the decoded full-resolution image for a word, or None if there is no image.
+  - `get_resized_image(self, word, size)`: Returns the image for a word resized to `size` x `size` pixels.
+  - `stats(self)`: Returns the hit/miss counters and the memory used by both caches.
+  - `clear(self)`: Empties both caches.
+
+© Matthew J. Hergott
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import threading
+import logging
+
+from PIL import Image
+
+from ImageAtlas import ImageAtlas
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def image_nbytes(img: Image.Image) -> int:
+    # Size of the decoded pixel data; one byte per band for the 8-bit modes used by the word images
+    return img.width * img.height * len(img.getbands())
+
+
+class LRUByteCache:
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int]):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        nbytes = self.sizeof(value)
+        if nbytes > self.max_bytes:
+            # Never cache an item that would evict everything else
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self.entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class ImageCache:
+    def __init__(self, images_dir: Path,
+                 max_decoded_bytes: int = 64 * 1024 * 1024,
+                 max_resized_bytes: int = 32 * 1024 * 1024,
+                 atlas: Optional[ImageAtlas] = None):
+        self.images_dir = Path(images_dir)
+        self.atlas = atlas
+        self.decoded = LRUByteCache(max_decoded_bytes, image_nbytes)
+        self.resized = LRUByteCache(max_resized_bytes, image_nbytes)
+
+    def _load_image(self, word: str) -> Optional[Image.Image]:
+        image_path = self.images_dir / f"{word}.png"
+        if not image_path.exists():
+            logging.warning(f"Image not found: {image_path}")
+            return None
+
+        img = Image.open(image_path)
+        # Decode now (and release the file handle) instead of lazily on first use
+        img.load()
+        return img
+
+    def get_image(self, word: str) -> Optional[Image.Image]:
+        img = self.decoded.get(word)
+        if img is None:
+            img = self._load_image(word)
+            if img is not None:
+                self.decoded.put(word, img)
+        return img
+
+    def get_resized_image(self, word: str, size: int) -> Optional[Image.Image]:
+        key = (word, size)
+        img = self.resized.get(key)
+        if img is None:
+            full_img = self.atlas.get_tile(word, size) if self.atlas is not None else None
+            if full_img is None:
+                full_img = self.get_image(word)
+            if full_img is None:
+                return None
+            img = full_img if full_img.size == (size, size) else full_img.resize((size, size))
+            self.resized.put(key, img)
+        return img
+
+    def clear(self) -> None:
+        self.decoded.clear()
+        self.resized.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {'decoded': self.decoded.stats(), 'resized': self.resized.stats()}
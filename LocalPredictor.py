@@ -0,0 +1,80 @@
+"""
+LocalPredictor.py
+
+This file predicts important words in-process, without the language model or the web search.
+
+Functionality:
+- Loads the word association model built offline by `find_common_words.py`: a sparse matrix of the
+positive pointwise mutual information (PMI) between the image words, computed from their co-occurrence
+in WordNet, and a word frequency prior from wordfreq.
+- Scores every image word with one sparse matrix-vector product of the association matrix and an
+indicator vector of the words already used in the conversation, and returns the highest scoring words
+that have not been used yet.
+- Returns in milliseconds and needs no network, so it can stand in for the ReAct agent when the agent
+fails or times out.
+
+Interaction with Other Files:
+- **find_common_words.py**: Builds the model file `word_model/word_model.npz`.
+- **React.py**: The React class uses the LocalPredictor in its 'local' prediction mode and as the fallback
+when the agent returns no words.
+
+Classes and Methods:
+- **LocalPredictor**: This class encapsulates the association matrix and the prior.
+  - `load(cls, model_path)`: Returns a LocalPredictor, or None if no model has been built.
+  - `predict(self, seen_words, n=50)`: Returns up to `n` words associated with the words already used.
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+from typing import Iterable, List, Optional
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from VocabularyIndex import VocabularyIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class LocalPredictor:
+    def __init__(self, words: List[str], matrix: sparse.csr_matrix, prior: np.ndarray, prior_weight: float = 0.01):
+        self.words = list(words)
+        self.index = {word: i for i, word in enumerate(self.words)}
+        self.vocabulary = VocabularyIndex(self.words)
+        self.matrix = matrix
+        # Frequent words break ties between equally associated words
+        self.prior = prior_weight * prior / max(float(prior.max()), 1e-6)
+
+    @classmethod
+    def load(cls, model_path: Path = Path('word_model/word_model.npz')) -> Optional["LocalPredictor"]:
+        model_path = Path(model_path)
+        if not model_path.exists():
+            return None
+        try:
+            with np.load(model_path) as model:
+                matrix = sparse.csr_matrix((model['data'], model['indices'], model['indptr']),
+                                           shape=tuple(model['shape']))
+                predictor = cls(model['words'].tolist(), matrix, model['prior'])
+        except Exception as e:
+            logging.error(f"Could not load word model from {model_path}: {e}")
+            return None
+        logging.info(f"Loaded word model with {matrix.nnz} associations between {len(predictor.words)} words.")
+        return predictor
+
+    def predict(self, seen_words: Iterable[str], n: int = 50) -> List[str]:
+        seen = {self.index[word] for word in map(self.vocabulary.resolve, seen_words) if word is not None}
+        seen = np.fromiter(seen, dtype=np.intp)
+
+        x = np.zeros(len(self.words), dtype=np.float32)
+        x[seen] = 1.0
+        scores = self.matrix @ x + self.prior
+        scores[seen] = -np.inf
+
+        n = min(n, len(self.words) - len(seen))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [self.words[i] for i in top]
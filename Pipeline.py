@@ -0,0 +1,196 @@
+"""
+Pipeline.py
+
+This file runs the processing of audio chunks as a chain of stages connected by bounded queues.
+
+Functionality:
+- Runs each stage (e.g. transcribe, update conversation, predict words, update UI) on its own
+worker thread, so that the transcription of one chunk overlaps the agent work on the previous one.
+- Bounds every queue between stages and applies a configurable backpressure policy when a queue is full:
+  - `block`: wait until the stage has room.
+  - `drop-oldest`: discard the oldest pending item.
+  - `drop-newest`: discard the incoming item.
+  - `merge-pending`: combine the incoming item with the newest pending item using the stage's merge function.
+- Counts processed, dropped and merged items per stage and reports the current queue depths.
+- Runs every item in the context (contextvars) it was put in, so that the trace of an audio chunk
+follows it through the stages, and records tracing spans for the time an item waits in each queue
+(`<stage>.wait`) and the time each stage takes (`<stage>`).
+
+Interaction with Other Files:
+- **AIWordsAssistantApp.py**: The AudioRecorder callback puts every chunk into the pipeline and returns
+immediately; the app's stage methods do the transcription, conversation update, word prediction and
+grid update.
+- **Tracing.py**: The spans are recorded with the shared tracer.
+
+Classes and Methods:
+- **PipelineStage**: A bounded queue and the worker thread that feeds it to one stage function.
+  A stage function returns the item for the next stage, or None to stop processing the item.
+- **Pipeline**: This class encapsulates the chain of stages.
+  - `add_stage(self, name, func, maxsize=1, policy='drop-oldest', merge=None)`: Appends a stage.
+  - `start(self)`: Starts the worker threads.
+  - `put(self, item)`: Puts an item into the first stage.
+  - `clear(self)`: Discards all pending items.
+  - `stop(self)`: Stops the worker threads.
+  - `stats(self)`: Returns the queue depth and counters of every stage.
+
+© Matthew J. Hergott
+"""
+
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+import contextvars
+import threading
+import logging
+import time
+
+from Tracing import tracer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+POLICIES = ('block', 'drop-oldest', 'drop-newest', 'merge-pending')
+
+
+class PipelineStage:
+    def __init__(self, name: str,
+                 func: Callable[[Any], Any],
+                 maxsize: int = 1,
+                 policy: str = 'drop-oldest',
+                 merge: Optional[Callable[[Any, Any], Any]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        if policy == 'merge-pending' and merge is None:
+            raise ValueError(f"Stage {name} uses merge-pending but has no merge function.")
+
+        self.name = name
+        self.func = func
+        self.maxsize = maxsize
+        self.policy = policy
+        self.merge = merge
+        self.next_stage: Optional["PipelineStage"] = None
+        self.queue: deque = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.busy = False
+        self.thread = None
+        self.processed = 0
+        self.dropped = 0
+        self.merged = 0
+        self.errors = 0
+
+    def put(self, item: Any) -> None:
+        with self.condition:
+            if len(self.queue) >= self.maxsize:
+                if self.policy == 'block':
+                    while len(self.queue) >= self.maxsize and self.running:
+                        self.condition.wait()
+                elif self.policy == 'drop-oldest':
+                    self.queue.popleft()
+                    self.dropped += 1
+                elif self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return
+                elif self.policy == 'merge-pending':
+                    # The merged item keeps the queue time of the pending one and the context of the new one
+                    _, queued_at, pending = self.queue[-1]
+                    self.queue[-1] = (contextvars.copy_context(), queued_at, self.merge(pending, item))
+                    self.merged += 1
+                    return
+            self.queue.append((contextvars.copy_context(), time.monotonic(), item))
+            self.condition.notify_all()
+
+    def _worker(self) -> None:
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                context, queued_at, item = self.queue.popleft()
+                self.busy = True
+                self.condition.notify_all()
+
+            context.run(self._process, item, queued_at)
+
+            with self.condition:
+                self.busy = False
+                self.processed += 1
+
+    def _process(self, item: Any, queued_at: float) -> None:
+        tracer.record(f"{self.name}.wait", queued_at, time.monotonic())
+        try:
+            with tracer.span(self.name):
+                result = self.func(item)
+        except Exception as e:
+            self.errors += 1
+            result = None
+            logging.error(f"Pipeline stage {self.name} failed: {e}")
+
+        if result is not None and self.next_stage is not None:
+            self.next_stage.put(result)
+
+    def start(self) -> None:
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.thread = threading.Thread(target=self._worker, name=f"pipeline-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def clear(self) -> None:
+        with self.condition:
+            self.queue.clear()
+            self.condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                'depth': len(self.queue),
+                'busy': self.busy,
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'merged': self.merged,
+                'errors': self.errors,
+                'policy': self.policy,
+            }
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages: List[PipelineStage] = []
+
+    def add_stage(self, name: str,
+                  func: Callable[[Any], Any],
+                  maxsize: int = 1,
+                  policy: str = 'drop-oldest',
+                  merge: Optional[Callable[[Any, Any], Any]] = None) -> PipelineStage:
+        stage = PipelineStage(name, func, maxsize=maxsize, policy=policy, merge=merge)
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        return stage
+
+    def start(self) -> None:
+        for stage in self.stages:
+            stage.start()
+
+    def put(self, item: Any) -> None:
+        self.stages[0].put(item)
+
+    def clear(self) -> None:
+        for stage in self.stages:
+            stage.clear()
+
+    def stop(self) -> None:
+        for stage in self.stages:
+            stage.stop()
+
+    def idle(self) -> bool:
+        return all(not s.queue and not s.busy for s in self.stages)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.stats() for stage in self.stages}
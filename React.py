@@ -27,25 +27,48 @@ ReAct agent framework.
 Classes and Functions:
 ----------------------
 
-1. `WordsPredictLLM(query: str) -> str`:
+1. `WordsPredictLLM`:
     - A tool that predicts 50 important words likely to be used in a conversation.
-    - Uses the `ChatNVIDIA` model to generate predictions based on the input query.
+    - Uses the shared `ChatNVIDIA` client created in `React.load_model` to generate predictions based on the input query.
 
-2. `SearchResultsWordsLLM(query: str) -> str`:
+2. `SearchResultsWordsLLM`:
     - A tool that predicts 50 important words related to the results of a search engine query.
-    - Uses the `ChatNVIDIA` model to generate predictions based on the search engine results.
+    - Uses the shared `ChatNVIDIA` client created in `React.load_model` to generate predictions based on the search engine results.
 
-3. `React` Class:
+3. `PartialWordsCallbackHandler`:
+    - A LangChain callback handler that collects candidate words from word tool observations and from the
+      streamed tokens of the direct prompt while word prediction is still running, and reports them in batches.
+
+4. `React` Class:
     - Initializes the ReAct agent, loads the language model, creates tools, and sets up the agent.
     - Methods:
-        - `__init__(self)`: Initializes the ReAct agent and sets up the necessary components.
+        - `__init__(self)`: Initializes the ReAct agent and sets up the necessary components. `http_pool_size` is
+          the number of pooled connections to the LLM endpoint, shared by the agent, the tools and concurrent callers.
         - `load_model(self)`: Loads the language model using environment variables.
-        - `create_tools(self)`: Creates the tools for word prediction and search result analysis.
+        - `create_tools(self)`: Creates the tools for word prediction and search result analysis. The search
+          results are cached by a `TavilySearchCache` (see TavilyCustom/cache.py).
+        - `create_search_wrapper(self)`: Returns the Tavily API wrapper that the cache forwards misses to.
+        - `clear_cache(self)`: Deletes the cached tool observations and search results, on disk and in memory.
         - `get_available_models(self)`: Returns the available models from the `ChatNVIDIA` endpoint.
         - `create_agent(self)`: Creates the ReAct agent using the specified tools and prompt template.
-        - `run_agent(self, input)`: Runs the agent with the given input and returns the predicted words.
-        - `parse_words_for_app(self, session_id, current_words, react_words)`: Parses the predicted words for use in an application.
-        - `run_agent_for_app(self, session_id, current_words, conversation_text)`: Runs the agent and parses the output for an application.
+        - `run_agent(self, input, callbacks=None, session_id=None, conversation_words=None, newest_text=None)`: Predicts words for the given input with the ReAct agent,
+          with the local predictor in 'local' mode or, in 'direct' mode
+          (or 'auto' mode when the newest transcript, `newest_text`, does not look news-related), with one structured prompt.
+          The LangChain `callbacks` are passed to the agent, the tools and the (streamed) direct prompt.
+        - `run_react(self, input)`: Runs the ReAct agent with the given input and returns the predicted words.
+        - `run_direct(self, input)`: Asks the model once for a JSON list of words, bypassing the ReAct loop.
+        - `run_local(self, input, session_id=None, conversation_words=None)`: Predicts words in-process with the `LocalPredictor` from the words
+          already used in the conversation, without any network calls.
+        - `run_parallel(self, input)`: Runs word prediction and the web search (followed by search results word
+          prediction) concurrently on an asyncio event loop, and merges the word lists.
+        - `parse_words_for_app(self, session_id, current_words, react_words, conversation_words=None)`: Parses the predicted words
+          for use in an application, leaving out the words already used in the conversation (`conversation_words`, or
+          the `conversation_words/<session>.txt` file if not given).
+          Words without an image are mapped onto related image words with the `WordGraph`, if it has been built.
+        - `run_agent_for_app(self, session_id, current_words, conversation_text, on_partial_words=None, conversation_words=None, newest_text=None)`: Runs the agent
+          and parses the output for an application. If `on_partial_words` is given, it is called with interim
+          parsed results as soon as candidate words arrive, before the agent has finished. When tracing is enabled,
+          records a span for the prediction and, through LangChain callbacks, for every tool and LLM call.
         - `demo(self, demo_num=0)`: Demonstrates the agent's functionality with a sample input.
 
 Usage:
@@ -65,29 +88,46 @@ if __name__ == "__main__":
 """
 
 from dotenv import load_dotenv
+from typing import Any, Callable, List, Optional, Type
 import os
 import random
 import logging
+import time
+import json
+import re
+import asyncio
+import threading
+from importlib import metadata
+
+import requests
+from requests.adapters import HTTPAdapter
 
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from langchain.agents import AgentExecutor, create_react_agent
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    BaseCallbackHandler,
+    CallbackManagerForToolRun,
+)
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import PromptTemplate
-from langchain_core.tools import tool
+from langchain_core.pydantic_v1 import BaseModel, Field
+from langchain_core.tools import BaseTool
 
 from TavilyCustom.tool import TavilyAnswer, TavilySearchResults
+from TavilyCustom.cache import CachedTavilySearchAPIWrapper, TavilySearchCache
+from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+from VocabularyIndex import VocabularyIndex
+from LocalPredictor import LocalPredictor
+from WordGraph import WordGraph
+from ResultCache import CachedTool, ResultCache
+from Tracing import tracer
 
 import strings
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-@tool
-def WordsPredictLLM(query: str) -> str:
-    """Predicts 50 important words that are likely to be used in a conversation.""" 
-    
-    llm_predict = ChatNVIDIA(model="mistralai/mixtral-8x7b-instruct-v0.1",
-                             temperature=0)
-    
-    llm_query_format = """
+words_predict_template = """
     You are an expert at the English language, but you have no knowledge of recent news. 
     You are given an input text of a conversation between two or more people. 
     Predict 50 important words that are likely to be used in this conversation. 
@@ -98,26 +138,7 @@ def WordsPredictLLM(query: str) -> str:
     Answer: 
     """
 
-    prompt = PromptTemplate(
-        input_variables=["query"],
-        template=llm_query_format
-    )
-
-    llm_chain = prompt | llm_predict
-
-    result = llm_chain.invoke(query)
-    print(result.content)    
-    
-    return result.content  
-
-@tool
-def SearchResultsWordsLLM(query: str) -> str:
-    """Finds important words related to results of search engine query.""" 
-    
-    llm_search_results_words = ChatNVIDIA(model="mistralai/mixtral-8x7b-instruct-v0.1",
-                                          temperature=0)
-    
-    llm_query_format = """
+search_results_words_template = """
     You are an expert at the English language. 
     You are given the output of a search engine query. 
     Predict 50 important words that are likely to be used in a 
@@ -129,40 +150,327 @@ def SearchResultsWordsLLM(query: str) -> str:
     Answer: 
     """
 
-    prompt = PromptTemplate(
-        input_variables=["query"],
-        template=llm_query_format
-    )
+class LLMWordsInput(BaseModel):
+    """Input for the LLM words tools."""
+    query: str = Field(description="text to find important words for")
 
-    llm_chain = prompt | llm_search_results_words
+class LLMWordsTool(BaseTool):
+    """Tool that asks a shared LLM client for important words.
+    
+    The LLM client is created once in React.load_model and bound to every tool, 
+    instead of building a new ChatNVIDIA client on every tool call."""
+    
+    llm: BaseChatModel
+    template: str
+    args_schema: Type[BaseModel] = LLMWordsInput
+    llm_chain: Any = None
+    
+    def _get_chain(self):
+        if self.llm_chain is None:
+            prompt = PromptTemplate(
+                input_variables=["query"],
+                template=self.template
+            )
+            self.llm_chain = prompt | self.llm
+        return self.llm_chain
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        result = self._get_chain().invoke(query)
+        logging.debug(f'{self.name}: {result.content}')
+        
+        return result.content  
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        result = await self._get_chain().ainvoke(query)
+        logging.debug(f'{self.name}: {result.content}')
+        
+        return result.content  
+
+class WordsPredictLLM(LLMWordsTool):
+    name: str = "WordsPredictLLM"
+    description: str = "Predicts 50 important words that are likely to be used in a conversation."
+    template: str = words_predict_template
+
+class SearchResultsWordsLLM(LLMWordsTool):
+    name: str = "SearchResultsWordsLLM"
+    description: str = "Finds important words related to results of search engine query."
+    template: str = search_results_words_template
+
+PREDICTION_MODES = ('auto', 'react', 'direct', 'parallel', 'local')
+
+# Capitalised in any conversation, not names of people, places or events in the news
+COMMON_CAPITALISED = frozenset(
+    'I Monday Tuesday Wednesday Thursday Friday Saturday Sunday January February March April May June July '
+    'August September October November December Mr Mrs Ms Dr Mom Mum Dad Grandma Grandpa Aunt Uncle OK Okay'.split()
+)
+CAPITALISED_RUN = re.compile(r"\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+")
+
+def looks_news_related(text, news_keywords):
+    lowered = ' ' + ' '.join(re.findall(r"[a-z]+", text.lower())) + ' '
+    if any(f' {keyword} ' in lowered for keyword in news_keywords):
+        return True
+    
+    # A name of two or more capitalised words (a public figure, place, team or event) inside a sentence.
+    # Single first names ("Sarah and Tom") and the capitalised first word of a sentence do not count.
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        parts = sentence.split(maxsplit=1)
+        for run in CAPITALISED_RUN.findall(parts[1] if len(parts) > 1 else ''):
+            if sum(word not in COMMON_CAPITALISED for word in run.split()) >= 2:
+                return True
+    return False
+
+def search_query(text, max_chars=300):
+    # The newest part of the conversation, cut at a word boundary, makes the search query
+    text = ' '.join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[-max_chars:].split(' ', 1)[-1]
+
+def parse_direct_output(content):
+    # The model is asked for {"words": [...]}; fall back to the raw text if it is not valid JSON
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if match:
+        try:
+            words = json.loads(match.group(0)).get('words', [])
+            if isinstance(words, list):
+                return ', '.join(str(word) for word in words)
+        except (ValueError, AttributeError):
+            pass
+    return content
+
+def clean_words(output):
+    # Lower-case, strip list and sentence punctuation and split a comma-separated answer into words
+    output = output.strip().lower()
+    
+    replace_list = ["Final Answer", "[", "]", ".", ";", ":", "{", "}", "!", "?", "(", ")", "-", "_"]
 
-    result = llm_chain.invoke(query)
-    print(result.content)    
+    for i in replace_list:
+        output = output.replace(i, '')
+
+    words = output.split(',')
+    
+    for i, word in enumerate(words):
+        temp = ''.join(char for char in word.strip() if char.isalpha() or char == ' ')
+        words[i] = temp.strip()
     
-    return result.content 
+    return words
+
+# Tag of the runs whose token stream is a word list (the agent's own tokens are thoughts and actions)
+WORD_STREAM_TAG = 'word-stream'
+WORD_TOOL_NAMES = ('WordsPredictLLM', 'SearchResultsWordsLLM')
+
+class PartialWordsCallbackHandler(BaseCallbackHandler):
+    """Callback handler that reports candidate words while word prediction is still running.
+    
+    Words are taken from the observations of the word tools and from the token stream 
+    of the runs tagged with WORD_STREAM_TAG; `on_words` is called with all words found so far 
+    whenever at least `min_new_words` new ones have arrived."""
+    
+    def __init__(self, on_words: Callable[[List[str]], None], min_new_words: int = 5):
+        self.on_words = on_words
+        self.min_new_words = min_new_words
+        self.words: List[str] = []
+        self.seen = set()
+        self.unreported = 0
+        self.buffer = ''
+        self.lock = threading.Lock()
+    
+    def add_words(self, words):
+        with self.lock:
+            for word in words:
+                if word and word not in self.seen:
+                    self.seen.add(word)
+                    self.words.append(word)
+                    self.unreported += 1
+            if self.unreported < self.min_new_words:
+                return
+            self.unreported = 0
+            words = list(self.words)
+            
+            try:
+                self.on_words(words)
+            except Exception as e:
+                logging.error(f'Error handling partial words: {e}')
+    
+    def feed(self, text):
+        # Only list items that are followed by a separator are complete
+        self.buffer += text
+        if '"' in self.buffer:
+            items = re.findall(r'"([^"]*)"\s*[,\]]', self.buffer)
+        else:
+            items = self.buffer.split(',')[:-1]
+        self.add_words(clean_words(', '.join(items)))
+    
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        if kwargs.get('name') in WORD_TOOL_NAMES and isinstance(output, str):
+            self.add_words(clean_words(output))
+    
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if WORD_STREAM_TAG in (kwargs.get('tags') or []):
+            self.feed(token)
+
+# share_http_session and isolate_llm_client reach into ChatNVIDIA's private client, whose layout is that of
+# this version of langchain-nvidia-ai-endpoints (pinned in requirements.txt)
+NVIDIA_ENDPOINTS_VERSION = '0.1.2'
+NVIDIA_CLIENT_ATTRIBUTES = ('get_session_fn', 'last_inputs', 'copy')
+
+def nvidia_client(llm):
+    # Returns the client that sends the requests of a ChatNVIDIA, failing loudly if its internals have changed
+    client = getattr(getattr(llm, '_client', None), 'client', None)
+    if isinstance(client, ThreadLocalClient):
+        client = client._client
+    missing = ['_client.client'] if client is None else [name for name in NVIDIA_CLIENT_ATTRIBUTES
+                                                          if not hasattr(client, name)]
+    if missing:
+        try:
+            installed = metadata.version('langchain-nvidia-ai-endpoints')
+        except metadata.PackageNotFoundError:
+            installed = 'not installed'
+        raise RuntimeError(f"ChatNVIDIA client lacks {', '.join(missing)}: expected "
+                           f"langchain-nvidia-ai-endpoints=={NVIDIA_ENDPOINTS_VERSION}, found {installed}.")
+    return client
+
+def share_http_session(llm, session):
+    # ChatNVIDIA opens a new requests.Session (and a new TLS connection) for every call by default
+    nvidia_client(llm).get_session_fn = lambda: session
+    return llm
+
+class ThreadLocalClient:
+    # ChatNVIDIA's client keeps each request on itself (last_inputs) between building it and sending it,
+    # so threads sharing one client can send each other's prompts. Every thread gets its own copy,
+    # which still shares the pooled HTTP session.
+    def __init__(self, client):
+        object.__setattr__(self, '_client', client)
+        object.__setattr__(self, '_local', threading.local())
+        # Attributes set through the proxy, and how many times they were set
+        object.__setattr__(self, '_settings', {})
+        object.__setattr__(self, '_generation', 0)
+    
+    def _thread_client(self):
+        local = self._local
+        if getattr(local, 'client', None) is None:
+            local.client = self._client.copy()
+        elif local.generation != self._generation:
+            # Settings made from other threads since this copy was last used
+            for name, value in list(self._settings.items()):
+                setattr(local.client, name, value)
+        local.generation = self._generation
+        return local.client
+    
+    def __getattr__(self, name):
+        return getattr(self._thread_client(), name)
+    
+    def __setattr__(self, name, value):
+        # Settings apply to every thread: to the client that new copies are made from, and to the copies
+        setattr(self._client, name, value)
+        self._settings[name] = value
+        object.__setattr__(self, '_generation', self._generation + 1)
+        self._thread_client()
+
+def isolate_llm_client(llm):
+    # Call after share_http_session, so that the copies share the session
+    client = nvidia_client(llm)
+    if not isinstance(llm._client.client, ThreadLocalClient):
+        llm._client.client = ThreadLocalClient(client)
+    return llm
 
 class React:
-    def __init__(self) -> None:
+    def __init__(self, use_cache: bool = True, mode: str = 'auto', 
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 http_pool_size: int = 8,
+                 conversation_words_dir: str = 'conversation_words') -> None:
+        if mode not in PREDICTION_MODES:
+            raise ValueError(f"Unknown word prediction mode: {mode}")
+        
         self.words = strings.words
+        self.vocabulary = VocabularyIndex(self.words)
+        # Synonym and related-word graph built by find_common_words.py, if it has been built
+        self.word_graph = WordGraph.load()
         self.react_template = strings.react_template
-        print(self.react_template)
+        self.direct_template = strings.direct_template
+        self.news_keywords = strings.news_keywords
+        # 'react' always runs the agent, 'direct' always uses one structured prompt, 
+        # 'parallel' runs word prediction and web search concurrently without the ReAct loop, 
+        # 'local' uses the in-process LocalPredictor and needs no network, 
+        # 'auto' uses news_mode only for conversations that look news-related and 'direct' otherwise
+        self.mode = mode
+        self.news_mode = 'react'
+        # Event loop (running in another thread) for the 'parallel' mode; a private loop is used if None
+        self.loop = loop
+        self.parallel_timeout = 15
+        # Word association model built by find_common_words.py; also used when the agent fails or times out
+        self.local_predictor = LocalPredictor.load()
+        self.local_fallback = True
+        if mode == 'local' and self.local_predictor is None:
+            raise ValueError("The 'local' prediction mode needs a word model; run find_common_words.py first.")
+        logging.debug(f'ReAct prompt template: {self.react_template}')
         
         self.agent_llm_model = "mistralai/mixtral-8x7b-instruct-v0.1"
+        # Keep-alive connections to the LLM endpoint; one per concurrent prediction when serving many sessions
+        self.http_pool_size = http_pool_size
+        
+        # Tool observations, persisted until clear_cache(). The agent and direct outputs are not cached:
+        # their prompt is the conversation window, which changes with every transcript.
+        self.cache = ResultCache() if use_cache else None
+        
+        # Only read when run_agent_for_app is not given the words of the conversation
+        self.conversation_words_dir = conversation_words_dir
         
         self.load_model()
+        # One React serves concurrent sessions from many threads
+        isolate_llm_client(self.llm)
+        isolate_llm_client(self.tools_llm)
         self.create_tools()
         self.create_agent()
+        self.create_direct_chain()
         
     def load_model(self):
         load_dotenv()
         
+        # One pooled HTTP session with keep-alive, shared by the agent and the tools
+        self.http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.http_pool_size)
+        self.http_session.mount('https://', adapter)
+        self.http_session.mount('http://', adapter)
+        
         # https://python.langchain.com/v0.1/docs/integrations/chat/nvidia_ai_endpoints/
-        self.llm = ChatNVIDIA(model="mistralai/mixtral-8x7b-instruct-v0.1", temperature=0)            
+        self.llm = ChatNVIDIA(model=self.agent_llm_model, temperature=0)            
+        share_http_session(self.llm, self.http_session)
+        
+        # The tools use the same model and settings as the agent, so they share its client
+        self.tools_llm = self.llm
+    
+    def create_search_wrapper(self):
+        return TavilySearchAPIWrapper()
     
     def create_tools(self):
-        self.TavilyTool = TavilySearchResults(max_results=3)
-        self.tools = [WordsPredictLLM, self.TavilyTool, SearchResultsWordsLLM]
-        print(self.tools)
+        # Near-identical search queries share results; identical concurrent ones share one API call
+        self.tavily_cache = TavilySearchCache(disk_cache=self.cache)
+        self.TavilyTool = TavilySearchResults(max_results=3, 
+                                              api_wrapper=CachedTavilySearchAPIWrapper.wrap(self.create_search_wrapper(),
+                                                                                            self.tavily_cache))
+        self.tools = [WordsPredictLLM(llm=self.tools_llm), 
+                      self.TavilyTool, 
+                      SearchResultsWordsLLM(llm=self.tools_llm)]
+        if self.cache is not None:
+            # The search results are already cached by tavily_cache
+            self.tools = [t if t is self.TavilyTool else CachedTool(t, self.cache) for t in self.tools]
+        self.tools_by_name = {t.name: t for t in self.tools}
+        logging.debug(f'Tools: {self.tools}')
+        
+    def clear_cache(self):
+        # The cached tool queries and search results hold parts of the conversation
+        if self.cache is not None:
+            self.cache.clear()
+        self.tavily_cache.clear()
         
     def get_available_models(self):
         return ChatNVIDIA.get_available_models()
@@ -181,11 +489,38 @@ class React:
                                             verbose=True, handle_parsing_errors=True, 
                                             max_iterations=5, max_execution_time=15)    
         
-    def run_agent(self, input):
+    def create_direct_chain(self):
+        prompt = PromptTemplate(
+            template=self.direct_template,
+            input_variables=['input']
+        )
+        self.direct_chain = prompt | self.llm
+
+    def select_mode(self, input, newest_text=None):
+        if self.mode != 'auto':
+            return self.mode
+        # Only conversations about current events need the search tool of the ReAct agent. The newest
+        # transcript decides: the whole window would almost always contain some cue.
+        text = newest_text if newest_text is not None else search_query(input)
+        return self.news_mode if looks_news_related(text, self.news_keywords) else 'direct'
+
+    def run_agent(self, input, callbacks=None, session_id=None, conversation_words=None, newest_text=None):
+        mode = self.select_mode(input, newest_text)
+        logging.info(f'Word prediction mode: {mode}.')
+        
+        if mode == 'local':
+            return self.run_local(input, session_id, conversation_words)
+        if mode == 'direct':
+            return self.run_direct(input, callbacks)
+        if mode == 'parallel':
+            return self.run_parallel(input, callbacks)
+        return self.run_react(input, callbacks)
+
+    def run_react(self, input, callbacks=None):
         agent_error = False
         
         try:
-            output = self.agent_executor.invoke({"input": input})
+            output = self.agent_executor.invoke({"input": input}, config={"callbacks": callbacks})
         except Exception as e:
             agent_error = True
             logging.error(f'Error running react agent: {e}') 
@@ -196,27 +531,115 @@ class React:
             logging.error(f'Error running react agent: output is empty.') 
             return None, agent_error            
 
-        output = output['output'].strip().lower()
+        raw_output = output['output']
+        react_words, agent_error = self.parse_agent_output(raw_output)
         
-        logging.info(f'Agent output type: {type(output)}.')
-        logging.info(f'Agent output: {output}.')
+        return react_words, agent_error  
 
-        replace_list = ["Final Answer", "[", "]", ".", ";", ":", "{", "}", "!", "?", "(", ")", "-", "_"]
+    def run_direct(self, input, callbacks=None):
+        agent_error = False
+        
+        try:
+            if callbacks:
+                # Stream the answer so that the callbacks see the words as they are generated
+                config = {"callbacks": callbacks, "tags": [WORD_STREAM_TAG]}
+                content = ''.join(chunk.content for chunk in self.direct_chain.stream({"input": input}, config=config))
+            else:
+                content = self.direct_chain.invoke({"input": input}).content
+        except Exception as e:
+            agent_error = True
+            logging.error(f'Error running direct word prediction: {e}') 
+            return None, agent_error
+        raw_output = parse_direct_output(content)
+        
+        if raw_output is None or len(raw_output)<1:
+            agent_error = True
+            logging.error(f'Error running direct word prediction: output is empty.') 
+            return None, agent_error            
 
-        for i in replace_list:
-            output = output.replace(i, '')
+        react_words, agent_error = self.parse_agent_output(raw_output)
+        
+        return react_words, agent_error  
 
-        react_words = output.split(',')
+    def run_local(self, input, session_id=None, conversation_words=None):
+        agent_error = False
+        
+        if conversation_words is not None:
+            seen_words = conversation_words
+        elif session_id is not None:
+            seen_words = self.read_conversation_words(session_id)
+        else:
+            seen_words = {word.strip().lower() for word in re.split(r"[, .?!:;\n]", input)}
+        
+        start_time = time.perf_counter()
+        react_words = self.local_predictor.predict(seen_words)
+        logging.info(f'Local word prediction took {1000 * (time.perf_counter() - start_time):.1f} ms.')
+        
+        if len(react_words)<3:
+            agent_error = True
+            logging.error(f'Error running local word prediction: only returned {len(react_words)} words.') 
+        
+        return react_words, agent_error
+
+    async def _search_words(self, input, callbacks=None):
+        config = {"callbacks": callbacks}
+        search_results = await self.tools_by_name['TavilySearchResultsJSON'].ainvoke(
+            {"query": search_query(input)}, config=config)
+        if not search_results or isinstance(search_results, str):
+            # The Tavily tool returns the repr of the exception on failure
+            raise RuntimeError(f'search failed: {search_results}')
+        return await self.tools_by_name['SearchResultsWordsLLM'].ainvoke({"query": str(search_results)}, config=config)
+
+    async def arun_parallel(self, input, callbacks=None):
+        # The two branches are independent, so the refresh takes as long as the slower one
+        branches = [
+            self.tools_by_name['WordsPredictLLM'].ainvoke({"query": input}, config={"callbacks": callbacks}),
+            self._search_words(input, callbacks),
+        ]
+        results = await asyncio.wait_for(asyncio.gather(*branches, return_exceptions=True),
+                                         timeout=self.parallel_timeout)
+        
+        word_lists = []
+        for name, result in zip(['word prediction', 'search'], results):
+            if isinstance(result, Exception):
+                logging.error(f'Parallel {name} branch failed: {result}')
+            elif result:
+                word_lists.append(result)
+        return ', '.join(word_lists)
+
+    def run_parallel(self, input, callbacks=None):
+        agent_error = False
+        
+        try:
+            if self.loop is not None and self.loop.is_running():
+                future = asyncio.run_coroutine_threadsafe(self.arun_parallel(input, callbacks), self.loop)
+                output = future.result(timeout=self.parallel_timeout + 1)
+            else:
+                output = asyncio.run(self.arun_parallel(input, callbacks))
+        except Exception as e:
+            agent_error = True
+            logging.error(f'Error running parallel word prediction: {e}') 
+            return None, agent_error
+        
+        if output is None or len(output)<1:
+            agent_error = True
+            logging.error(f'Error running parallel word prediction: output is empty.') 
+            return None, agent_error            
+
+        return self.parse_agent_output(output)
+
+    def parse_agent_output(self, output):
+        agent_error = False
+        
+        logging.info(f'Agent output type: {type(output)}.')
+        logging.info(f'Agent output: {output.strip().lower()}.')
+
+        react_words = clean_words(output)
         
         if len(react_words)<3:
             agent_error = True
             logging.error(f'Error running react agent: only returned {len(react_words)} words.') 
             return react_words, agent_error        
-        
-        for i, react_string in enumerate(react_words):
-            react_string_trim = react_string.strip()
-            temp = ''.join(char for char in react_string_trim if char.isalpha() or char == ' ')
-            react_words[i] = temp.strip()
 
         # # remove results that have multiple words
         # react_words = [w for w in react_words if ' ' not in w]
@@ -226,24 +649,48 @@ class React:
         
         return react_words, agent_error  
     
-    def parse_words_for_app(self, session_id, current_words, react_words):
-        # get words previously used in conversation
-        filename = os.path.join('conversation_words', f'{session_id}.txt')
+    def read_conversation_words(self, session_id):
+        filename = os.path.join(self.conversation_words_dir, f'{session_id}.txt')
+        if not os.path.exists(filename):
+            # Nothing has been transcribed in this session yet
+            return set()
 
         with open(filename, 'r') as f:
             conv_words_str = f.read()
         
-        conv_words = conv_words_str.split(',')
-        conv_words = [word.strip() for word in conv_words]  
+        return {word.strip() for word in conv_words_str.split(',')}
+    
+    def image_word_for(self, word):
+        # The word itself or an inflected form of it, else the closest related image word
+        image_word = self.vocabulary.resolve(word)
+        if image_word is None and self.word_graph is not None:
+            image_word = self.word_graph.resolve(word)
+        return image_word
+    
+    def parse_words_for_app(self, session_id, current_words, react_words, conversation_words=None):
+        # get words previously used in conversation
+        conv_words = conversation_words if conversation_words is not None else self.read_conversation_words(session_id)
         
-        # eliminate from word candidates words previously used in conversation
-        filtered_react_words = [word for word in react_words if word not in conv_words]  
+        # eliminate from word candidates words previously used in conversation, also as another form:
+        # "nurses" is out once "nurse" was said, and "nurse" once "nurses" was
+        said_images = {image_word for image_word in map(self.vocabulary.resolve, conv_words) if image_word}
+        filtered_react_words = [word for word in react_words 
+                                if word not in conv_words and self.vocabulary.resolve(word) not in said_images]  
         
         # # eliminate from word candidates words currently used as images
         # word_candidates = [word for word in filtered_react_words if word not in current_words]
         
-        # find word candidates that have image associated with them
-        word_candidates_images = [word for word in filtered_react_words if word in self.words and word not in current_words]
+        # find word candidates that have image associated with them, e.g. "nurses" -> "nurse", "physician" -> "doctor"
+        current_words_set = set(current_words)
+        word_candidates_images = []
+        seen_images = set()
+        for word in filtered_react_words:
+            image_word = self.image_word_for(word)
+            if (image_word is None or image_word in current_words_set or image_word in seen_images
+                    or image_word in conv_words or image_word in said_images):
+                continue
+            seen_images.add(image_word)
+            word_candidates_images.append(image_word)
         
         # duplicate list of words currently used as images
         current_words_new = [word for word in current_words]
@@ -262,20 +709,50 @@ class React:
             random_indices = random.sample(range(len(word_candidates_images)), 24)
             current_words_new[:] = [word_candidates_images[i] for i in random_indices]   
         
-        word_candidates_ex_images = [word for word in filtered_react_words if word not in current_words_new]
+        current_words_new_set = set(current_words_new)
+        word_candidates_ex_images = [word for word in filtered_react_words 
+                                     if word not in current_words_new_set 
+                                     and self.image_word_for(word) not in current_words_new_set]
             
         return current_words_new, word_candidates_ex_images
     
-    def run_agent_for_app(self, session_id, current_words, conversation_text):
-        react_words, agent_error = self.run_agent(conversation_text)
+    def run_agent_for_app(self, session_id, current_words, conversation_text, on_partial_words=None, 
+                          conversation_words=None, newest_text=None):
+        with tracer.span('predict_words', mode=self.select_mode(conversation_text, newest_text)) as span:
+            trace_handler = tracer.callback_handler()
+            result = self._run_agent_for_app(session_id, current_words, conversation_text, on_partial_words, 
+                                             conversation_words, trace_handler, newest_text)
+            if trace_handler is not None:
+                span['agent_iterations'] = trace_handler.agent_iterations
+        return result
+    
+    def _run_agent_for_app(self, session_id, current_words, conversation_text, on_partial_words, 
+                           conversation_words, trace_handler, newest_text=None):
+        callbacks = [trace_handler] if trace_handler is not None else None
+        if on_partial_words is not None:
+            def on_words(words):
+                # Interim results start from the grid as it is now; the final result reconciles them
+                current_words_new, word_candidates_ex_images = self.parse_words_for_app(session_id, current_words, words, 
+                                                                                        conversation_words)
+                on_partial_words(current_words_new, word_candidates_ex_images)
+            callbacks = (callbacks or []) + [PartialWordsCallbackHandler(on_words)]
+        
+        react_words, agent_error = self.run_agent(conversation_text, callbacks, session_id, conversation_words,
+                                                  newest_text)
+        
+        if agent_error and self.local_fallback and self.local_predictor is not None and self.mode != 'local':
+            logging.warning('Agent returned no words; using the local word predictor instead.')
+            react_words, agent_error = self.run_local(conversation_text, session_id, conversation_words)
         
         if agent_error:
             return None, None
         
         try:
-            current_words_new, word_candidates_ex_images = self.parse_words_for_app(session_id, current_words, react_words)        
+            current_words_new, word_candidates_ex_images = self.parse_words_for_app(session_id, current_words, react_words, 
+                                                                                    conversation_words)        
         except Exception as e:
             logging.error(f'Error parsing agent output: {e}')
+            return None, None
     
         return current_words_new, word_candidates_ex_images
     
@@ -0,0 +1,87 @@
+"""
+ResizeScheduler.py
+
+This file coalesces bursts of window resize events into a single relayout of the image grid.
+
+Functionality:
+- Restarts a quiet-period timer on every resize event, so that a window drag that fires dozens of
+`<Configure>` events only triggers one relayout after the window has stopped changing size.
+- Runs the relayout with `after_idle`, after Tk has finished processing pending events and redraws.
+- Optionally calls a cheap preview function on every event while the relayout is pending.
+- Counts resize requests, suppressed relayouts and relayouts actually run.
+
+Interaction with Other Files:
+- **AIWordsAssistantApp.py**: The AIWordsAssistantApp class forwards its `<Configure>` events to the
+ResizeScheduler, which calls `create_image_grid` once the resize has settled.
+
+Classes and Methods:
+- **ResizeScheduler**: This class encapsulates the debounced resize handling.
+  - `schedule(self, width, height)`: Records a resize event and (re)starts the quiet-period timer.
+  - `cancel(self)`: Cancels a pending relayout.
+  - `stats(self)`: Returns the request, suppressed and relayout counters.
+
+© Matthew J. Hergott
+"""
+
+from typing import Callable, Dict, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class ResizeScheduler:
+    def __init__(self, widget,
+                 relayout: Callable[[], None],
+                 quiet_period_ms: int = 200,
+                 preview: Optional[Callable[[int, int], None]] = None):
+        self.widget = widget
+        self.relayout = relayout
+        self.quiet_period_ms = quiet_period_ms
+        self.preview = preview
+        self.timer_id = None
+        self.idle_id = None
+        self.requests = 0
+        self.suppressed = 0
+        self.relayouts = 0
+
+    def schedule(self, width: int, height: int) -> None:
+        self.requests += 1
+        if self.timer_id is not None or self.idle_id is not None:
+            # A relayout was already pending; this event replaces it
+            self.suppressed += 1
+            self.cancel()
+
+        if self.preview is not None:
+            try:
+                self.preview(width, height)
+            except Exception as e:
+                logging.warning(f"Resize preview failed: {e}")
+
+        if self.quiet_period_ms > 0:
+            self.timer_id = self.widget.after(self.quiet_period_ms, self._on_quiet)
+        else:
+            self._on_quiet()
+
+    def _on_quiet(self) -> None:
+        self.timer_id = None
+        self.idle_id = self.widget.after_idle(self._run_relayout)
+
+    def _run_relayout(self) -> None:
+        self.idle_id = None
+        self.relayouts += 1
+        self.relayout()
+
+    def cancel(self) -> None:
+        if self.timer_id is not None:
+            self.widget.after_cancel(self.timer_id)
+            self.timer_id = None
+        if self.idle_id is not None:
+            self.widget.after_cancel(self.idle_id)
+            self.idle_id = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'requests': self.requests,
+            'suppressed': self.suppressed,
+            'relayouts': self.relayouts,
+        }
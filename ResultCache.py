@@ -0,0 +1,201 @@
+"""
+ResultCache.py
+
+This file keeps a persistent cache of ReAct tool observations in SQLite.
+
+Functionality:
+- Normalises prompts (case, whitespace and surrounding punctuation) and stores results under a
+hash of the normalised prompt, separately for each namespace (the agent and each tool).
+- Returns a cached result only if it is younger than its time-to-live.
+- Evicts the least recently used entries when the cache grows beyond its size limit.
+- Remembers how long each result took to compute, and counts hits, misses and the time saved by hits.
+- Wraps any LangChain tool in a `CachedTool` that serves repeated queries from the cache.
+
+Interaction with Other Files:
+- **React.py**: The React class wraps its word tools in `CachedTool`, and the Tavily search cache keeps
+its results here too. `React.clear_cache` deletes all entries; the app calls it when it deletes the
+history of a session, because the cached queries hold parts of the conversation.
+
+Classes and Methods:
+- **ResultCache**: This class encapsulates the SQLite cache.
+  - `get(self, namespace, prompt)`: Returns the cached result, or None.
+  - `set(self, namespace, prompt, value, latency)`: Stores a result and the seconds it took to compute.
+  - `stats(self)`: Returns the hit/miss counters, the hit rate and the time saved.
+  - `clear(self)`: Deletes all entries.
+- **CachedTool**: A tool that forwards to another tool and caches its observations.
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForToolRun,
+    CallbackManagerForToolRun,
+)
+from langchain_core.tools import BaseTool
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ERROR_REPR = re.compile(r"^\w*(Error|Exception)\(")
+
+
+def normalize_prompt(prompt: str) -> str:
+    prompt = re.sub(r"\s+", " ", prompt.lower())
+    return prompt.strip(" .,;:!?\"'")
+
+
+class ResultCache:
+    def __init__(self, path: Path = Path('cache/react_cache.sqlite'),
+                 ttl_seconds: float = 60 * 60,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "namespace TEXT, key TEXT, value TEXT, size INTEGER, "
+                "latency REAL, created REAL, accessed REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def _key(self, prompt: str) -> str:
+        return hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+
+    def get(self, namespace: str, prompt: str) -> Optional[str]:
+        key = self._key(prompt)
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, latency, created FROM results WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+
+            if row is None or now - row[2] > self.ttl_seconds:
+                self.misses += 1
+                if row is not None:
+                    with self.connection:
+                        self.connection.execute("DELETE FROM results WHERE namespace = ? AND key = ?", (namespace, key))
+                return None
+
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE results SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+                )
+            self.hits += 1
+            self.saved_seconds += row[1]
+
+        logging.info(f"Cache hit for {namespace}; saved {row[1]:.2f} s. {self._summary()}")
+        return row[0]
+
+    def set(self, namespace: str, prompt: str, value: str, latency: float = 0.0) -> None:
+        key = self._key(prompt)
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, size, latency, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self.connection.execute("DELETE FROM results WHERE created < ?", (now - self.ttl_seconds,))
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.connection.execute("SELECT namespace, key, size FROM results ORDER BY accessed").fetchall()
+        for namespace, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.connection.execute("DELETE FROM results WHERE namespace = ? AND key = ?", (namespace, key))
+            total -= size
+
+    def clear(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM results")
+
+    def _summary(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return f"Hit rate {hit_rate:.0%} ({self.hits}/{lookups}), {self.saved_seconds:.1f} s saved in total."
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'saved_seconds': self.saved_seconds,
+            }
+
+
+class CachedTool(BaseTool):
+    """Tool that serves repeated queries to another tool from a ResultCache."""
+
+    tool: BaseTool
+    cache: Any
+
+    def __init__(self, tool: BaseTool, cache: ResultCache, **kwargs: Any):
+        super().__init__(tool=tool, cache=cache, name=tool.name, description=tool.description,
+                         args_schema=tool.args_schema, **kwargs)
+
+    def _is_cacheable(self, result: Any) -> bool:
+        # Tools such as the Tavily search return the repr of an exception instead of raising
+        if not result:
+            return False
+        return not (isinstance(result, str) and ERROR_REPR.match(result))
+
+    def _lookup(self, query: str) -> Optional[Any]:
+        cached = self.cache.get(self.name, query)
+        return None if cached is None else json.loads(cached)
+
+    def _store(self, query: str, result: Any, latency: float) -> None:
+        if self._is_cacheable(result):
+            self.cache.set(self.name, query, json.dumps(result), latency)
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> Any:
+        cached = self._lookup(query)
+        if cached is not None:
+            return cached
+        start = time.monotonic()
+        result = self.tool._run(query)
+        self._store(query, result, time.monotonic() - start)
+        return result
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> Any:
+        cached = self._lookup(query)
+        if cached is not None:
+            return cached
+        start = time.monotonic()
+        result = await self.tool._arun(query)
+        self._store(query, result, time.monotonic() - start)
+        return result
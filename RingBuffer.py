@@ -0,0 +1,115 @@
+"""
+RingBuffer.py
+
+This file provides a preallocated, fixed-size ring buffer of audio samples.
+
+Functionality:
+- Allocates one NumPy array up front; incoming audio blocks are written into it in place.
+- Tracks positions as absolute sample counts since the start of the recording, so that callers
+can remember where a chunk started and read it back later.
+- Returns a zero-copy view of a range of samples when the range does not wrap around the end of
+the array, and a single copy when it does. `view` returns a range that wraps around as a RingView
+of its two pieces instead, which copies only the slices that cross the end of the array.
+
+Interaction with Other Files:
+- **AudioRecorder.py**: The PortAudio callback in AudioRecorder writes every block into a RingBuffer,
+and the recording thread reads each chunk back out of it.
+
+Classes and Methods:
+- **RingBuffer**: This class encapsulates the ring buffer.
+  - `write(self, samples)`: Copies a block of samples into the buffer, overwriting the oldest samples.
+  - `read(self, start, end)`: Returns the samples between two absolute positions.
+  - `view(self, start, end)`: Like `read`, but never copies the whole range.
+  - `total_written`: The absolute position one past the newest sample.
+- **RingView**: The two pieces of a range that wraps around; sliced like an array.
+
+© Matthew J. Hergott
+"""
+
+from typing import Union
+import threading
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class RingView:
+    def __init__(self, first: np.ndarray, second: np.ndarray):
+        self.first = first
+        self.second = second
+        self.dtype = first.dtype
+
+    def __len__(self) -> int:
+        return len(self.first) + len(self.second)
+
+    def __getitem__(self, key: slice) -> np.ndarray:
+        start, stop, _ = key.indices(len(self))
+        split = len(self.first)
+        if stop <= split:
+            return self.first[start:stop]
+        if start >= split:
+            return self.second[start - split:stop - split]
+        return np.concatenate((self.first[start:], self.second[:stop - split]))
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = np.concatenate((self.first, self.second))
+        return data if dtype is None else data.astype(dtype)
+
+
+class RingBuffer:
+    def __init__(self, capacity: int, dtype=np.int16):
+        self.capacity = capacity
+        self.dtype = dtype
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.total_written = 0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def oldest(self) -> int:
+        # Absolute position of the oldest sample still in the buffer
+        return max(0, self.total_written - self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            with self.lock:
+                self.total_written += n - self.capacity
+            n = self.capacity
+
+        with self.lock:
+            pos = self.total_written % self.capacity
+            first = min(n, self.capacity - pos)
+            self.data[pos:pos + first] = samples[:first]
+            if first < n:
+                self.data[:n - first] = samples[first:]
+            self.total_written += n
+
+    def read(self, start: int, end: int = None) -> np.ndarray:
+        data = self.view(start, end)
+        # Wrapped range: one copy of the two pieces
+        return data if isinstance(data, np.ndarray) else np.asarray(data)
+
+    def view(self, start: int, end: int = None) -> Union[np.ndarray, RingView]:
+        with self.lock:
+            if end is None or end > self.total_written:
+                end = self.total_written
+            if start < self.oldest:
+                logging.warning(f"Ring buffer overrun: {self.oldest - start} samples were overwritten before being read.")
+                start = self.oldest
+            if end <= start:
+                return self.data[:0]
+
+            start_pos = start % self.capacity
+            end_pos = start_pos + (end - start)
+            if end_pos <= self.capacity:
+                # Contiguous range: a view, no copy
+                return self.data[start_pos:end_pos]
+            # Wrapped range: its two pieces, still without a copy
+            return RingView(self.data[start_pos:], self.data[:end_pos - self.capacity])
@@ -0,0 +1,235 @@
+"""
+SessionManager.py
+
+This file keeps the state of many concurrent sessions in memory and processes their chunks on a
+shared pool of worker threads.
+
+Functionality:
+- Owns the state of every session, keyed by `session_id`: its conversation window (a
+ConversationSession, with the set of words used in the conversation) and the words of its grid.
+Nothing is shared between sessions, and nothing is read from or written to files unless `persist`
+is set.
+- Processes the chunks of all sessions on one pool of `max_workers` threads. The chunks of one session
+run one at a time and in the order they were submitted, because each chunk builds on the conversation
+and the grid the previous one left. Chunks of different sessions run concurrently, and a session with
+a backlog gives its worker back after every chunk, so that it does not hold up the other sessions.
+- Runs every chunk in the context (contextvars) it was submitted in, so that tracing spans belong
+to the trace of the request.
+- Removes sessions that have been idle for `session_ttl_seconds`.
+
+Interaction with Other Files:
+- **ConversationSession.py**: Every session has its own conversation window.
+- **WordsService.py**: The service keeps its sessions in a SessionManager and processes their chunks
+on its workers.
+- **benchmarks/session_stress.py**: Stress test of concurrent sessions sharing one React agent.
+
+Classes and Methods:
+- **SessionState**: The state of one session.
+  - `state(self, text=None)`: Returns the session id, the grid words and the words without images.
+- **SessionManager**: This class encapsulates the sessions and the worker pool.
+  - `get(self, session_id, create=True)`: Returns a session, creating it if needed (None if it does not exist).
+  - `remove(self, session_id)`: Removes a session.
+  - `submit(self, session, func, *args, **kwargs)`: Queues `func(session, *args, **kwargs)` behind the
+    earlier chunks of the session and returns a `concurrent.futures.Future` of its result.
+  - `expire_idle(self)`: Removes the idle sessions and returns how many.
+  - `stats(self)`: Returns the session and chunk counts.
+  - `shutdown(self, wait=False)`: Cancels the futures of the chunks that have not started and stops the
+    worker pool. Chunks that are running finish.
+
+© Matthew J. Hergott
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+
+from ConversationSession import ConversationSession
+from strings import grid_words
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class SessionState:
+    def __init__(self, session_id: str, conversation: ConversationSession):
+        self.session_id = session_id
+        self.conversation = conversation
+        self.current_words = list(grid_words)
+        self.word_candidates = []
+        self.chunks = 0
+        self.last_used = time.monotonic()
+        # Chunks waiting for the session's turn on a worker; guarded by lock
+        self.lock = threading.Lock()
+        self.pending: deque = deque()
+        self.active = False
+
+    def state(self, text: Optional[str] = None) -> Dict[str, Any]:
+        state = {'session_id': self.session_id,
+                 'words': list(self.current_words),
+                 'candidates': list(self.word_candidates)}
+        if text is not None:
+            state['text'] = text
+        return state
+
+
+class SessionManager:
+    def __init__(self, max_workers: Optional[int] = None,
+                 conversation_max_tokens: int = 800,
+                 conversation_summary_tokens: int = 0,
+                 session_ttl_seconds: float = 30 * 60,
+                 persist: bool = False,
+                 conversations_dir: Path = Path('conversations'),
+                 conversation_words_dir: Path = Path('conversation_words')):
+        # The workers spend most of their time waiting for the APIs, so there are more of them than cores
+        self.max_workers = max_workers or min(32, 4 * (os.cpu_count() or 1))
+        self.conversation_max_tokens = conversation_max_tokens
+        self.conversation_summary_tokens = conversation_summary_tokens
+        self.session_ttl_seconds = session_ttl_seconds
+        self.persist = persist  # also append the conversations to files, as the app does
+        self.conversations_dir = Path(conversations_dir)
+        self.conversation_words_dir = Path(conversation_words_dir)
+        if self.persist:
+            self.conversations_dir.mkdir(exist_ok=True)
+            self.conversation_words_dir.mkdir(exist_ok=True)
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='session-worker')
+        self.lock = threading.Lock()
+        self.sessions: Dict[str, SessionState] = {}
+        # Sessions with chunks queued or running, also those removed since
+        self.active_sessions = set()
+        self.closed = False
+        self.created = 0
+        self.expired = 0
+        self.processed = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def get(self, session_id: Optional[str] = None, create: bool = True) -> Optional[SessionState]:
+        session_id = session_id or uuid.uuid4().hex[:12]
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None and create:
+                conversation = ConversationSession(session_id, max_tokens=self.conversation_max_tokens,
+                                                   summary_tokens=self.conversation_summary_tokens,
+                                                   conversations_dir=self.conversations_dir,
+                                                   conversation_words_dir=self.conversation_words_dir,
+                                                   persist=self.persist)
+                session = self.sessions[session_id] = SessionState(session_id, conversation)
+                self.created += 1
+                logging.info(f"Created session {session_id}; {len(self.sessions)} sessions.")
+        return session
+
+    def remove(self, session_id: str) -> bool:
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def submit(self, session: SessionState, func: Callable, *args: Any, **kwargs: Any) -> Future:
+        future = Future()
+        with session.lock:
+            # closed is set under self.lock, so a chunk is either refused here or its session is among
+            # the active sessions whose chunks shutdown cancels
+            with self.lock:
+                if self.closed:
+                    raise RuntimeError('cannot submit chunks after shutdown')
+                session.pending.append((contextvars.copy_context(), future, func, args, kwargs))
+                if session.active:
+                    # The worker of the session takes it in turn
+                    return future
+                session.active = True
+                self.active_sessions.add(session)
+        self._schedule(session)
+        return future
+
+    def _schedule(self, session: SessionState) -> None:
+        try:
+            self.executor.submit(self._run_next, session)
+        except RuntimeError:
+            # The pool has been shut down
+            self._cancel_pending(session)
+
+    def _cancel_pending(self, session: SessionState) -> int:
+        # Chunks that never reached a worker; their futures raise CancelledError
+        with session.lock:
+            pending = list(session.pending)
+            session.pending.clear()
+            session.active = False
+            with self.lock:
+                self.active_sessions.discard(session)
+        for _, future, _, _, _ in pending:
+            # Also wakes up concurrent.futures.wait on the future
+            future.cancel()
+            future.set_running_or_notify_cancel()
+        return len(pending)
+
+    def _run_next(self, session: SessionState) -> None:
+        with session.lock:
+            if not session.pending:
+                # Cancelled by shutdown
+                return
+            context, future, func, args, kwargs = session.pending.popleft()
+
+        if future.set_running_or_notify_cancel():
+            session.last_used = time.monotonic()
+            try:
+                result = context.run(func, session, *args, **kwargs)
+            except BaseException as e:
+                with self.lock:
+                    self.errors += 1
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            session.chunks += 1
+            session.last_used = time.monotonic()
+            with self.lock:
+                self.processed += 1
+
+        with session.lock:
+            if not session.pending:
+                session.active = False
+                with self.lock:
+                    self.active_sessions.discard(session)
+                return
+        # Back of the queue, behind the chunks of the other sessions
+        self._schedule(session)
+
+    def expire_idle(self) -> int:
+        now = time.monotonic()
+        with self.lock:
+            idle = [session_id for session_id, session in self.sessions.items()
+                    if not session.active and now - session.last_used > self.session_ttl_seconds]
+            for session_id in idle:
+                del self.sessions[session_id]
+            self.expired += len(idle)
+        for session_id in idle:
+            logging.info(f"Session {session_id} expired.")
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'busy_sessions': sum(session.active for session in self.sessions.values()),
+                'pending_chunks': sum(len(session.pending) for session in self.sessions.values()),
+                'created': self.created,
+                'expired': self.expired,
+                'processed': self.processed,
+                'errors': self.errors,
+                'workers': self.max_workers,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        # The pool only knows the next chunk of every session, so the others are cancelled here
+        with self.lock:
+            self.closed = True
+            sessions = list(self.active_sessions)
+        cancelled = sum(self._cancel_pending(session) for session in sessions)
+        if cancelled:
+            logging.info(f"Cancelled {cancelled} queued chunks.")
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,263 @@
+"""Cache for the Tavily search API.
+
+Agents issue many near-identical search queries within a session
+("pickleball rules", "Pickleball rules 2024", "the rules of pickleball").
+The queries are normalised to a key (lower case, stopwords, the current
+year and punctuation removed, the remaining words as a sorted set), and
+results are served from an in-memory LRU with a time-to-live, backed by
+an optional persistent tier. Identical requests that are in flight at the
+same time are coalesced into one API call.
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its "
+    "latest me new news of on or our recent show tell that the their there this "
+    "to today us was we what when where which who why will with you your".split()
+)
+
+
+def normalize_query(query: str) -> str:
+    """Return the cache key of a search query."""
+    current_year = str(time.localtime().tm_year)
+    tokens = re.findall(r"[a-z0-9]+", query.lower())
+    words = {t for t in tokens if t not in STOPWORDS and t != current_year}
+    if not words:
+        # A query of stopwords only is its own key
+        words = set(tokens)
+    return " ".join(sorted(words))
+
+
+class TavilySearchCache:
+    """TTL'd LRU of search results with an optional persistent tier.
+
+    The persistent tier is any object with `get(namespace, key)` and
+    `set(namespace, key, value, latency)` methods that stores strings,
+    such as the `ResultCache` of the app.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 10 * 60,
+        max_entries: int = 256,
+        disk_cache: Any = None,
+        disk_namespace: str = "tavily",
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.disk_cache = disk_cache
+        self.disk_namespace = disk_namespace
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.in_flight: Dict[str, Future] = {}
+        self.in_flight_async: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.calls = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl_seconds:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+
+        if self.disk_cache is not None:
+            value = self.disk_cache.get(self.disk_namespace, key)
+            if value is not None:
+                result = json.loads(value)
+                self._put_memory(key, result)
+                with self.lock:
+                    self.disk_hits += 1
+                return result
+        return None
+
+    def _put_memory(self, key: str, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def set(self, key: str, value: Any, latency: float = 0.0) -> None:
+        self._put_memory(key, value)
+        if self.disk_cache is not None:
+            self.disk_cache.set(self.disk_namespace, key, json.dumps(value), latency)
+
+    def call(self, key: str, func: Callable[[], Any]) -> Any:
+        """Return the cached value for `key`, or compute it once with `func`."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[key] = future
+                self.misses += 1
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        start = time.monotonic()
+        try:
+            value = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.set(key, value, time.monotonic() - start)
+            future.set_result(value)
+            return value
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    async def acall(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Asynchronous version of `call` for coroutines on the same event loop."""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self.lock:
+            task = self.in_flight_async.get(loop_key)
+            owner = task is None
+            if owner:
+                task = asyncio.ensure_future(self._acompute(loop_key, key, func))
+                self.in_flight_async[loop_key] = task
+                self.misses += 1
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        # One caller being cancelled must not cancel the call the others wait for
+        return await asyncio.shield(task)
+
+    async def _acompute(
+        self, loop_key: Tuple[int, str], key: str, func: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        start = time.monotonic()
+        try:
+            value = await func()
+            self.set(key, value, time.monotonic() - start)
+            return value
+        finally:
+            with self.lock:
+                self.in_flight_async.pop(loop_key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses + self.coalesced
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "api_calls": self.calls,
+                "hit_rate": (lookups - self.calls) / lookups if lookups else 0.0,
+            }
+
+
+class CachedTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    """Tavily API wrapper that serves repeated queries from a TavilySearchCache.
+
+    Forwards cache misses to another wrapper, so that it can be put in
+    front of the real API wrapper or of a stub one.
+    """
+
+    # Any, so that pydantic keeps the wrapper and the cache instead of copying them
+    wrapper: Any
+    cache: Any
+
+    @classmethod
+    def wrap(
+        cls, wrapper: TavilySearchAPIWrapper, cache: Optional[TavilySearchCache] = None
+    ) -> "CachedTavilySearchAPIWrapper":
+        return cls(
+            wrapper=wrapper,
+            cache=cache or TavilySearchCache(),
+            tavily_api_key=wrapper.tavily_api_key,
+        )
+
+    def _key(self, query: str, **params: Any) -> str:
+        options = ",".join(
+            f"{name}={sorted(value) if isinstance(value, list) else value}"
+            for name, value in sorted(params.items())
+        )
+        return f"{normalize_query(query)}|{options}"
+
+    def raw_results(
+        self,
+        query: str,
+        max_results: Optional[int] = 5,
+        search_depth: Optional[str] = "advanced",
+        include_domains: Optional[List[str]] = [],
+        exclude_domains: Optional[List[str]] = [],
+        include_answer: Optional[bool] = False,
+        include_raw_content: Optional[bool] = False,
+        include_images: Optional[bool] = False,
+    ) -> Dict:
+        params = dict(
+            max_results=max_results,
+            search_depth=search_depth,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains,
+            include_answer=include_answer,
+            include_raw_content=include_raw_content,
+            include_images=include_images,
+        )
+        return self.cache.call(
+            self._key(query, **params),
+            lambda: self.wrapper.raw_results(query, **params),
+        )
+
+    async def raw_results_async(
+        self,
+        query: str,
+        max_results: Optional[int] = 5,
+        search_depth: Optional[str] = "advanced",
+        include_domains: Optional[List[str]] = [],
+        exclude_domains: Optional[List[str]] = [],
+        include_answer: Optional[bool] = False,
+        include_raw_content: Optional[bool] = False,
+        include_images: Optional[bool] = False,
+    ) -> Dict:
+        params = dict(
+            max_results=max_results,
+            search_depth=search_depth,
+            include_domains=include_domains,
+            exclude_domains=exclude_domains,
+            include_answer=include_answer,
+            include_raw_content=include_raw_content,
+            include_images=include_images,
+        )
+        return await self.cache.acall(
+            self._key(query, **params),
+            lambda: self.wrapper.raw_results_async(query, **params),
+        )
@@ -0,0 +1,39 @@
+"""
+TokenCounter.py
+
+This file counts the tokens of the text that is sent to the language model.
+
+Functionality:
+- Estimates the count locally with a regular expression: one token per short word, number digit or
+punctuation mark, and one more token for every further six letters of a long word.
+- The agent runs Mixtral, whose SentencePiece tokenizer is not available without downloading the model,
+so the count is an approximation of it for English conversation, not an exact count. It needs no
+network access and no extra dependency, and it only has to keep the conversation window at about
+`max_tokens`, far below the context length of the model.
+
+Interaction with Other Files:
+- **ConversationSession.py**: The ConversationSession counts the tokens of every sentence it keeps,
+to cap the tokens of the conversation window sent to the agent.
+
+Classes and Methods:
+- **TokenCounter**: This class encapsulates the estimate.
+  - `count(self, text)`: Returns the estimated number of tokens in `text`.
+  - `backend`: 'estimate', reported in the statistics of the ConversationSession.
+
+© Matthew J. Hergott
+"""
+
+import logging
+import re
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+
+class TokenCounter:
+    def __init__(self):
+        self.backend = 'estimate'
+
+    def count(self, text: str) -> int:
+        return sum(1 + (len(piece) - 1) // 6 for piece in TOKEN_PATTERN.findall(text))
@@ -0,0 +1,264 @@
+"""
+Tracing.py
+
+This file records how long each step of the record-to-words pipeline takes.
+
+Functionality:
+- Provides context-manager spans with monotonic start and end times. Spans nest: a span opened inside
+another span records it as its parent.
+- Groups spans into traces, one per audio chunk. The current trace and span are kept in context
+variables, so they follow a chunk through the Pipeline stages (the Pipeline runs every item in the
+context it was put in) and into asyncio tasks.
+- Provides a LangChain callback handler that records a span for every tool call and LLM call of the
+agent, and counts the agent iterations.
+- Writes every finished span as one JSON line to a trace file, and keeps the recent durations of
+every span name for p50/p95/p99 summaries, which are logged when the tracer is closed.
+- Bounds the trace files: when the trace file grows beyond `max_bytes`, it is renamed to
+`<name>.1` (replacing the previous one) and a new trace file is started.
+- Does nothing (and costs next to nothing) when tracing is disabled.
+
+Interaction with Other Files:
+- **AudioRecorder.py**: Starts a trace for every chunk it emits and records the encoding span.
+- **Pipeline.py**: Records the time every item waits in each stage's queue and the time each stage takes.
+- **AIWordsAssistantApp.py**: Configures the tracer, records the transcription request and the grid
+redraw spans, and closes the tracer on exit.
+- **React.py**: Records the word prediction span and passes the callback handler to the agent and tools.
+
+Classes and Methods:
+- **Tracer**: This class encapsulates the trace file and the duration statistics.
+  - `configure(self, path=None, enabled=True)`: Turns tracing on or off and sets the trace file.
+  - `trace(self, name, **attributes)`: Context manager that starts a new trace.
+  - `span(self, name, **attributes)`: Context manager that records a span in the current trace.
+  - `record(self, name, start, end, **attributes)`: Records a span with known start and end times.
+  - `mark(self, name, **attributes)`: Records a span from the start of the current trace until now.
+  - `callback_handler(self)`: Returns a LangChain callback handler for the current trace.
+  - `summary(self)`: Returns the count and the p50/p95/p99/max durations (ms) of every span name.
+  - `close(self)`: Logs the summary and closes the trace file.
+- **TracingCallbackHandler**: The LangChain callback handler.
+- `tracer`: The tracer shared by all modules (disabled until configured).
+
+© Matthew J. Hergott
+"""
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Optional
+from uuid import UUID
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+current_trace: ContextVar[Optional[str]] = ContextVar('current_trace', default=None)
+current_span: ContextVar[Optional[str]] = ContextVar('current_span', default=None)
+trace_start: ContextVar[Optional[float]] = ContextVar('trace_start', default=None)
+
+
+def new_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class Tracer:
+    def __init__(self, path: Path = Path('traces/traces.jsonl'),
+                 enabled: bool = False,
+                 max_samples: int = 10000,
+                 flush_every: int = 50,
+                 max_bytes: int = 16 * 1024 * 1024):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.flush_every = flush_every
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file = None
+        self.file_bytes = 0
+        self.unflushed = 0
+        self.durations: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.max_samples))
+
+    def configure(self, path: Optional[Path] = None, enabled: bool = True) -> None:
+        with self.lock:
+            if path is not None and Path(path) != self.path:
+                self._close_file()
+                self.path = Path(path)
+            self.enabled = enabled
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.durations[record['name']].append(record['duration_ms'])
+            if self.file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = open(self.path, 'a')
+                self.file_bytes = self.file.tell()
+            self.file.write(line + '\n')
+            self.file_bytes += len(line) + 1
+            self.unflushed += 1
+            if self.file_bytes >= self.max_bytes:
+                self._rotate_file()
+            elif self.unflushed >= self.flush_every:
+                self.file.flush()
+                self.unflushed = 0
+
+    def record(self, name: str, start: float, end: float,
+               trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+               span_id: Optional[str] = None, **attributes: Any) -> None:
+        if not self.enabled:
+            return
+        record = {
+            'trace': trace_id if trace_id is not None else current_trace.get(),
+            'span': span_id or new_id(),
+            'parent': parent_id if parent_id is not None else current_span.get(),
+            'name': name,
+            'start': start,
+            'end': end,
+            'duration_ms': round(1000 * (end - start), 3),
+            'thread': threading.current_thread().name,
+        }
+        if attributes:
+            record['attributes'] = attributes
+        self._write(record)
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any):
+        if not self.enabled:
+            yield None
+            return
+        trace_id = new_id()
+        trace_token = current_trace.set(trace_id)
+        start_token = trace_start.set(time.monotonic())
+        span_token = current_span.set(None)
+        try:
+            with self.span(name, **attributes):
+                yield trace_id
+        finally:
+            current_span.reset(span_token)
+            trace_start.reset(start_token)
+            current_trace.reset(trace_token)
+
+    def mark(self, name: str, **attributes: Any) -> None:
+        # A span from the start of the current trace until now, e.g. from audio chunk to updated grid
+        start = trace_start.get()
+        if self.enabled and start is not None:
+            self.record(name, start, time.monotonic(), **attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        if not self.enabled:
+            yield attributes
+            return
+        span_id = new_id()
+        parent_id = current_span.get()
+        token = current_span.set(span_id)
+        start = time.monotonic()
+        try:
+            # The caller can add attributes (e.g. a result size) while the span is open
+            yield attributes
+        except BaseException as e:
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            end = time.monotonic()
+            current_span.reset(token)
+            self.record(name, start, end, parent_id=parent_id, span_id=span_id, **attributes)
+
+    def callback_handler(self) -> Optional["TracingCallbackHandler"]:
+        if not self.enabled:
+            return None
+        return TracingCallbackHandler(self, current_trace.get(), current_span.get())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            samples = {name: np.array(values) for name, values in self.durations.items() if values}
+        summary = {}
+        for name, values in sorted(samples.items()):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            summary[name] = {'count': len(values), 'p50': round(float(p50), 1), 'p95': round(float(p95), 1),
+                             'p99': round(float(p99), 1), 'max': round(float(values.max()), 1)}
+        return summary
+
+    def log_summary(self) -> None:
+        for name, stats in self.summary().items():
+            logging.info(f"Span {name}: {stats['count']} calls, p50 {stats['p50']} ms, p95 {stats['p95']} ms, "
+                         f"p99 {stats['p99']} ms, max {stats['max']} ms")
+
+    def _close_file(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.unflushed = 0
+
+    def _rotate_file(self) -> None:
+        # Keeps the previous file, so that at most twice max_bytes of traces are on disk
+        self._close_file()
+        try:
+            os.replace(self.path, self.path.with_name(self.path.name + '.1'))
+        except OSError as e:
+            logging.warning(f"Could not rotate the trace file {self.path}: {e}")
+
+    def close(self) -> None:
+        if self.enabled:
+            self.log_summary()
+        with self.lock:
+            self._close_file()
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Callback handler that records a span for every tool and LLM call of a LangChain run."""
+
+    def __init__(self, tracer: Tracer, trace_id: Optional[str], parent_id: Optional[str]):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.runs: Dict[UUID, tuple] = {}
+        self.agent_iterations = 0
+        self.lock = threading.Lock()
+
+    def _start(self, run_id: UUID, name: str, **attributes: Any) -> None:
+        with self.lock:
+            self.runs[run_id] = (name, time.monotonic(), attributes)
+
+    def _end(self, run_id: UUID, **attributes: Any) -> None:
+        with self.lock:
+            run = self.runs.pop(run_id, None)
+        if run is None:
+            return
+        name, start, start_attributes = run
+        self.tracer.record(name, start, time.monotonic(), trace_id=self.trace_id, parent_id=self.parent_id,
+                           **start_attributes, **attributes)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, f"tool:{serialized.get('name', 'unknown')}")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=repr(error))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, 'llm')
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, 'llm')
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=repr(error))
+
+    def on_agent_action(self, action: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self.lock:
+            self.agent_iterations += 1
+
+
+tracer = Tracer()
@@ -0,0 +1,104 @@
+"""
+TranscriptStitcher.py
+
+This file merges the transcripts of overlapping audio chunks, so that the words spoken in the overlap
+reach the conversation only once.
+
+Functionality:
+- When the AudioRecorder cuts speech in the middle, it starts the next chunk `overlap_seconds` before
+the cut. The word cut in two is then whole in the next chunk, and the first words of its transcript
+repeat the last words of the previous transcript.
+- Aligns the start of each transcript with the end of the previous one: finds the longest run of
+words that is both a suffix of the previous transcript and a prefix of the new one, comparing words
+without case and punctuation. Up to `max_edge_words` words at the end of the previous transcript
+(the half of the cut word) and at the start of the new one (the half of a word before the overlap)
+may be left out of the match.
+- Drops the matched words, and the cut words before them, from the new transcript. Without a match
+of `min_match_words` words (or of a single word right at both edges) the transcript is kept whole,
+so that a chunk without overlap, or one whose predecessor was dropped, loses nothing.
+
+Interaction with Other Files:
+- **AudioRecorder.py**: Passes the seconds of overlap of every chunk to its callback.
+- **AIWordsAssistantApp.py**: Stitches every transcript before it is appended to the conversation.
+- **benchmarks/chunk_overlap.py**: Measures the word error rate of stitched transcripts.
+
+Classes and Methods:
+- **TranscriptStitcher**: This class keeps the previous transcript of a recording.
+  - `stitch(self, text, overlap_seconds=0.0)`: Returns the part of `text` that is not in the previous transcript.
+  - `align(self, previous, words, max_words)`: Returns the number of leading words of `words` that repeat the end of `previous`.
+  - `reset(self)`: Forgets the previous transcript.
+  - `stats(self)`: Returns the number of transcripts, of stitched ones and of dropped words.
+
+© Matthew J. Hergott
+"""
+
+from typing import Any, Dict, List
+import logging
+import math
+import re
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+NON_WORD_PATTERN = re.compile(r"[^\w']+")
+
+
+def normalize_word(word: str) -> str:
+    return NON_WORD_PATTERN.sub('', word.lower())
+
+
+class TranscriptStitcher:
+    def __init__(self, words_per_second: float = 3.5,
+                 min_match_words: int = 2,
+                 max_edge_words: int = 2):
+        # Bounds the alignment to the words that fit in the overlap, with room for fast speakers
+        self.words_per_second = words_per_second
+        self.min_match_words = min_match_words
+        self.max_edge_words = max_edge_words
+        self.previous: List[str] = []
+        self.chunks = 0
+        self.stitched = 0
+        self.dropped_words = 0
+
+    def reset(self) -> None:
+        self.previous = []
+
+    def align(self, previous: List[str], words: List[str], max_words: int) -> int:
+        best = (0, 0)  # (matched words, words dropped from the start of words)
+        best_cost = None
+        for tail in range(min(self.max_edge_words, len(previous)) + 1):
+            end = len(previous) - tail
+            for head in range(min(self.max_edge_words, len(words)) + 1):
+                longest = min(end, len(words) - head, max_words)
+                for k in range(longest, 0, -1):
+                    if previous[end - k:end] == words[head:head + k]:
+                        if k >= self.min_match_words or (tail == 0 and head == 0):
+                            # Longer matches first, then the fewest words left out at the edges
+                            cost = (-k, tail + head)
+                            if best_cost is None or cost < best_cost:
+                                best, best_cost = (k, head), cost
+                        break
+        k, head = best
+        return head + k if k else 0
+
+    def stitch(self, text: str, overlap_seconds: float = 0.0) -> str:
+        words = text.split()
+        normalized = [normalize_word(word) for word in words]
+        self.chunks += 1
+
+        skip = 0
+        if overlap_seconds > 0 and self.previous:
+            max_words = math.ceil(overlap_seconds * self.words_per_second) + self.max_edge_words
+            skip = self.align(self.previous, normalized, max_words)
+
+        # The next chunk overlaps the end of this whole transcript
+        self.previous = normalized
+        if skip == 0:
+            return text
+
+        self.stitched += 1
+        self.dropped_words += skip
+        logging.debug(f"Stitched transcript: dropped {' '.join(words[:skip])!r}")
+        return ' '.join(words[skip:])
+
+    def stats(self) -> Dict[str, Any]:
+        return {'chunks': self.chunks, 'stitched': self.stitched, 'dropped_words': self.dropped_words}
@@ -0,0 +1,61 @@
+"""
+Transcription.py
+
+This file transcribes audio chunks to text with the OpenAI speech-to-text API (Whisper).
+
+Functionality:
+- Sends an audio chunk, in memory or from a file, to the transcription endpoint of an OpenAI client.
+- Keeps only the printable characters of the transcript, and reports an error for a failed request
+or an empty transcript.
+- Records the request as a `transcribe.request` tracing span.
+
+Interaction with Other Files:
+- **AIWordsAssistantApp.py**: The app transcribes the chunks of the AudioRecorder.
+- **WordsService.py**: The service transcribes the audio that its clients send.
+- **Tracing.py**: The request span belongs to the trace of the chunk.
+
+Functions:
+- `transcribe_audio(client, fname, audio_file, model)`: Returns the transcript and an error flag.
+
+© Matthew J. Hergott
+"""
+
+from typing import BinaryIO, Optional, Tuple
+import logging
+import string
+
+from Tracing import tracer
+from strings import transcription_error_msg
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def transcribe_audio(client, fname: str, audio_file: BinaryIO, model: str = "whisper-1") -> Tuple[Optional[str], bool]:
+    # The file name tells the API the audio format, also for an in-memory file
+    transcription_error = False
+    try:
+        with tracer.span('transcribe.request') as span:
+            if hasattr(audio_file, 'getbuffer'):
+                span['bytes'] = len(audio_file.getbuffer())
+            transcription = client.audio.transcriptions.create(
+                model=model,
+                file=(fname, audio_file)
+            )
+    except Exception as e:
+        transcription_error = True
+        logging.error(f'Error transcribing audio: {e}')
+        logging.error(transcription_error_msg)
+        return None, transcription_error
+
+    text = transcription.text
+
+    text = ''.join(filter(lambda x: x in string.printable, text))
+
+    if len(text)<1:
+        transcription_error = True
+        logging.info(transcription_error_msg)
+        return None, transcription_error
+
+    logging.info(f"Transcription for {fname}: {text}")
+
+    return text, transcription_error
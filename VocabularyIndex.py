@@ -0,0 +1,99 @@
+"""
+VocabularyIndex.py
+
+This file provides constant-time lookups of the words that have an image in the app.
+
+Functionality:
+- Keeps the image words from `strings.words` in a frozenset.
+- Optionally builds a normalisation map from common inflected forms (plurals, -ing and -ed forms)
+to the image word they come from, so that "nurses" resolves to "nurse". Forms that are more likely
+another word ("cared" is not "car", "seed" is not "see") are left out: three-letter stems ending in a
+single consonant only take the doubled forms ("sitting", not "siting"), a form of a word ending in "e"
+wins over the same form of the word without it ("planed" is "plane"), "-es" only follows a sibilant
+or "o", stems shorter than three letters have no forms, and `NOT_INFLECTIONS` lists the remaining
+look-alikes.
+- Resolves a candidate word to its image word with a single dictionary lookup.
+
+Interaction with Other Files:
+- **React.py**: The React class builds one VocabularyIndex at start-up and uses it in
+`parse_words_for_app` to find which agent words have an image.
+
+Classes and Methods:
+- **VocabularyIndex**: This class encapsulates the vocabulary set and the normalisation map.
+  - `__init__(self, words, normalize=True)`: Builds the index from a list of image words.
+  - `resolve(self, word)`: Returns the image word for `word`, or None if it has no image.
+
+© Matthew J. Hergott
+"""
+
+from typing import Dict, Iterable, Iterator, Optional
+
+VOWELS = frozenset('aeiou')
+SIBILANT_ENDINGS = ('s', 'x', 'z', 'ch', 'sh', 'o')
+# Words that look like a regular inflection of an image word but are not one
+NOT_INFLECTIONS = frozenset({
+    'seed', 'feed', 'need', 'bred', 'shed', 'sled', 'wed', 'ted',
+    'stared', 'staring',
+    'bring', 'sing', 'sling', 'spring', 'string', 'swing', 'thing', 'wing', 'king', 'ring', 'ding',
+    'during', 'morning', 'evening', 'ceiling', 'pudding', 'wedding', 'bedding', 'darling',
+    'bus', 'gas', 'yes', 'lens', 'news', 'series', 'species', 'physics', 'lyrics',
+    'bites', 'fates', 'wares', 'tapes', 'planes', 'shades', 'stripes', 'notes',
+})
+
+
+def inflected_forms(word: str) -> Iterator[str]:
+    # Regular English inflections; irregular forms are left to the agent
+    if len(word) < 3 or not word.isalpha():
+        return
+    yield word + 's'
+    if word.endswith(SIBILANT_ENDINGS):
+        yield word + 'es'
+    if word.endswith('y') and len(word) > 1 and word[-2] not in VOWELS:
+        yield word[:-1] + 'ies'
+        yield word[:-1] + 'ied'
+    if word.endswith('fe'):
+        yield word[:-2] + 'ves'
+    elif word.endswith('f'):
+        yield word[:-1] + 'ves'
+    if word.endswith('e'):
+        yield word + 'd'
+        yield word[:-1] + 'ing'
+    else:
+        single_consonant = word[-1] not in VOWELS and word[-2] in VOWELS and word[-3] not in VOWELS
+        if single_consonant and word[-1] not in 'wxy':
+            # Doubled final consonant: "stop" -> "stopped", "stopping"
+            yield word + word[-1] + 'ed'
+            yield word + word[-1] + 'ing'
+        if not single_consonant or word[-1] in 'wxy' or len(word) > 3:
+            # A short stem without the doubling is another word's form: "cared", "biting"
+            yield word + 'ed'
+            yield word + 'ing'
+
+
+class VocabularyIndex:
+    def __init__(self, words: Iterable[str], normalize: bool = True):
+        self.words = frozenset(word.strip().lower() for word in words)
+        self.normalize = normalize
+        self.forms: Dict[str, str] = {}
+
+        if normalize:
+            # Words ending in "e" first, so that they keep the forms they share with the word without it
+            for word in sorted(self.words, key=lambda word: (not word.endswith('e'), word)):
+                for form in inflected_forms(word):
+                    # A form that is itself an image word keeps its own image
+                    if form not in self.words and form not in NOT_INFLECTIONS:
+                        self.forms.setdefault(form, word)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def resolve(self, word: str) -> Optional[str]:
+        if word in self.words:
+            return word
+        word = word.strip().lower()
+        if word in self.words:
+            return word
+        return self.forms.get(word)
@@ -0,0 +1,189 @@
+"""
+VoiceActivityDetector.py
+
+This file splits a stream of audio samples into speech segments at natural pauses.
+
+Functionality:
+- Splits incoming audio into short frames and computes the energy (dBFS) and zero-crossing rate
+of all frames at once with NumPy.
+- Marks a frame as speech when it is loud enough, or when it is slightly quieter but has the
+zero-crossing rate of an unvoiced consonant. The loudness threshold adapts to the background noise:
+the noise floor is a low percentile of the energy of all frames in the last `noise_history_seconds`,
+so that it follows steady noise (a fan, room hum) of any level, while the pauses between words keep
+speech from raising it.
+- Emits a segment when a pause follows at least `min_segment_seconds` of audio, or when a segment
+reaches `max_segment_seconds`.
+- Drops segments that contain too little speech, so that silence is never sent for transcription.
+- Can be run offline over a WAV file to check the segmentation. `benchmarks/vad_segments.py` checks
+it against synthetic WAV fixtures.
+
+Interaction with Other Files:
+- **AudioRecorder.py**: The recording thread feeds new samples from the ring buffer to the
+VoiceActivityDetector and saves each segment it emits.
+
+Classes and Methods:
+- **VoiceActivityDetector**: This class encapsulates the detector and its segmentation state.
+  - `frame_features(self, frames)`: Returns the energy and zero-crossing rate of each frame.
+  - `update_noise_floor(self, energy_db)`: Updates the noise floor with the energy of new frames.
+  - `speech_frames(self, frames)`: Returns a boolean speech flag for each frame.
+  - `process(self, samples)`: Consumes samples and returns the (start, end) sample positions of finished segments.
+  - `flush(self)`: Returns the segment in progress, if it contains speech.
+- `segment_wav(path, **kwargs)`: Runs the detector over a WAV file and returns the segments in seconds.
+
+Usage:
+------
+    python VoiceActivityDetector.py recordings/<file>.wav
+
+© Matthew J. Hergott
+"""
+
+from typing import List, Tuple
+import logging
+import sys
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class VoiceActivityDetector:
+    def __init__(self, fs: int,
+                 frame_ms: int = 30,
+                 energy_threshold_db: float = -45.0,
+                 noise_margin_db: float = 10.0,
+                 unvoiced_margin_db: float = 8.0,
+                 zcr_unvoiced_range: Tuple[float, float] = (0.1, 0.45),
+                 min_segment_seconds: float = 3.0,
+                 max_segment_seconds: float = 30.0,
+                 min_pause_seconds: float = 0.6,
+                 min_speech_seconds: float = 0.3,
+                 padding_seconds: float = 0.3,
+                 noise_history_seconds: float = 8.0,
+                 noise_percentile: float = 10.0):
+        self.fs = fs
+        self.frame_len = max(1, int(fs * frame_ms / 1000))
+        self.energy_threshold_db = energy_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.unvoiced_margin_db = unvoiced_margin_db
+        self.zcr_unvoiced_range = zcr_unvoiced_range
+        self.min_segment = int(fs * min_segment_seconds)
+        self.max_segment = int(fs * max_segment_seconds)
+        self.min_pause_frames = max(1, int(fs * min_pause_seconds) // self.frame_len)
+        self.min_speech = int(fs * min_speech_seconds)
+        self.padding = int(fs * padding_seconds)
+        self.noise_history_frames = max(1, int(fs * noise_history_seconds) // self.frame_len)
+        self.noise_percentile = noise_percentile
+        self.reset()
+
+    def reset(self, position: int = 0) -> None:
+        self.position = position  # absolute position of the next sample to be framed
+        self.pending = np.zeros(0, dtype=np.float32)  # samples of an incomplete frame
+        self.segment_start = position
+        self.speech_samples = 0
+        self.silence_run = 0
+        self.noise_floor_db = self.energy_threshold_db - self.noise_margin_db
+        # Energy (dBFS) of the most recent frames, speech or not
+        self.energy_history = np.zeros(0, dtype=np.float64)
+        self.dropped_segments = 0
+
+    def frame_features(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # frames: (n_frames, frame_len) floats in [-1, 1]
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energy_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+        return energy_db, zcr
+
+    def update_noise_floor(self, energy_db: np.ndarray) -> None:
+        # Quiet frames alone would never learn noise that is already above the threshold
+        self.energy_history = np.concatenate((self.energy_history, energy_db))[-self.noise_history_frames:]
+        self.noise_floor_db = float(np.percentile(self.energy_history, self.noise_percentile))
+
+    def speech_frames(self, frames: np.ndarray) -> np.ndarray:
+        energy_db, zcr = self.frame_features(frames)
+        self.update_noise_floor(energy_db)
+        threshold = max(self.energy_threshold_db, self.noise_floor_db + self.noise_margin_db)
+        voiced = energy_db > threshold
+        low, high = self.zcr_unvoiced_range
+        unvoiced = (energy_db > threshold - self.unvoiced_margin_db) & (zcr > low) & (zcr < high)
+        return voiced | unvoiced
+
+    def _to_float(self, samples: np.ndarray) -> np.ndarray:
+        if np.issubdtype(samples.dtype, np.integer):
+            return samples.astype(np.float32) / float(np.iinfo(samples.dtype).max)
+        return samples.astype(np.float32, copy=False)
+
+    def _emit(self, end: int, segments: List[Tuple[int, int]]) -> None:
+        if self.speech_samples >= self.min_speech:
+            segments.append((self.segment_start, end))
+        else:
+            self.dropped_segments += 1
+        self.segment_start = end
+        self.speech_samples = 0
+        self.silence_run = 0
+
+    def process(self, samples: np.ndarray) -> List[Tuple[int, int]]:
+        samples = self._to_float(samples)
+        if len(self.pending):
+            samples = np.concatenate((self.pending, samples))
+
+        n_frames = len(samples) // self.frame_len
+        used = n_frames * self.frame_len
+        self.pending = samples[used:].copy()
+        segments: List[Tuple[int, int]] = []
+        if n_frames == 0:
+            return segments
+
+        frames = samples[:used].reshape(n_frames, self.frame_len)
+        speech = self.speech_frames(frames)
+
+        for is_speech in speech:
+            frame_end = self.position + self.frame_len
+            self.position = frame_end
+
+            if is_speech:
+                self.speech_samples += self.frame_len
+                self.silence_run = 0
+            else:
+                self.silence_run += 1
+                if self.speech_samples == 0 and frame_end - self.segment_start > self.padding:
+                    # No speech yet: keep only a little leading silence
+                    self.segment_start = frame_end - self.padding
+                    continue
+
+            length = frame_end - self.segment_start
+            if length >= self.max_segment:
+                self._emit(frame_end, segments)
+            elif self.silence_run >= self.min_pause_frames and length >= self.min_segment:
+                self._emit(frame_end, segments)
+
+        return segments
+
+    def flush(self) -> List[Tuple[int, int]]:
+        segments: List[Tuple[int, int]] = []
+        end = self.position + len(self.pending)
+        self.position = end
+        self.pending = np.zeros(0, dtype=np.float32)
+        if end > self.segment_start:
+            self._emit(end, segments)
+        return segments
+
+
+def segment_wav(path, block_size: int = 1024, **kwargs) -> List[Tuple[float, float]]:
+    fs, data = wav.read(path)
+    if data.ndim > 1:
+        data = data[:, 0]
+    vad = VoiceActivityDetector(fs, **kwargs)
+    segments = []
+    # Feed the file in blocks, as the audio callback would
+    for i in range(0, len(data), block_size):
+        segments.extend(vad.process(data[i:i + block_size]))
+    segments.extend(vad.flush())
+    return [(start / fs, end / fs) for start, end in segments]
+
+
+if __name__ == "__main__":
+    for wav_path in sys.argv[1:]:
+        for start, end in segment_wav(wav_path):
+            print(f"{wav_path}: {start:.2f}s - {end:.2f}s")
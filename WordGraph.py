@@ -0,0 +1,105 @@
+"""
+WordGraph.py
+
+This file reads the synonym and related-word graph of the image words written by `find_common_words.py`.
+
+Functionality:
+- Maps the graph arrays into memory with NumPy, so that loading takes about a millisecond and
+only the pages that lookups touch are read from disk.
+- Stores the graph in compressed sparse row (CSR) form over one sorted table of strings: for every
+image word the WordNet synonyms, hyponyms and hypernyms of its most common senses, and for every such
+neighbour the image words it is related to, the closest relation first.
+- Finds a word in the string table by binary search.
+
+Interaction with Other Files:
+- **find_common_words.py**: `build_word_graph` builds the arrays in the `word_graph` directory.
+- **React.py**: The React class uses the WordGraph in `parse_words_for_app` to map agent words that
+have no image (e.g. "physician") onto image words (e.g. "doctor").
+
+Classes and Methods:
+- **WordGraph**: This class encapsulates the memory-mapped graph.
+  - `load(cls, graph_dir)`: Returns a WordGraph for `graph_dir`, or None if no graph has been built there.
+  - `neighbors(self, word)`: Returns the neighbours of an image word.
+  - `image_words(self, word)`: Returns the image words related to a word, the closest first.
+  - `resolve(self, word)`: Returns the image word most closely related to a word, or None if there is none
+    or the word is related to more than `max_ambiguity` image words.
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+from typing import List, Optional
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+GRAPH_ARRAYS = ('strings', 'image_ids', 'neighbors_indptr', 'neighbors', 'relations', 'images_indptr', 'images')
+
+
+class WordGraph:
+    def __init__(self, arrays, max_ambiguity: int = 5):
+        self.strings = arrays['strings']
+        self.image_ids = arrays['image_ids']
+        self.neighbors_indptr = arrays['neighbors_indptr']
+        self.neighbors_ids = arrays['neighbors']
+        self.relations = arrays['relations']
+        self.images_indptr = arrays['images_indptr']
+        self.images = arrays['images']
+        # A general word related to many image words (e.g. "entity") says little about any one of them
+        self.max_ambiguity = max_ambiguity
+        # The image word of each string id, or -1 (one small array, built once)
+        self.image_of_string = np.full(len(self.strings), -1, dtype=np.int32)
+        self.image_of_string[self.image_ids] = np.arange(len(self.image_ids), dtype=np.int32)
+
+    @classmethod
+    def load(cls, graph_dir: Path = Path('word_graph')) -> Optional["WordGraph"]:
+        graph_dir = Path(graph_dir)
+        if not (graph_dir / 'strings.npy').exists():
+            return None
+        try:
+            arrays = {name: np.load(graph_dir / f"{name}.npy", mmap_mode='r') for name in GRAPH_ARRAYS}
+            graph = cls(arrays)
+        except Exception as e:
+            logging.error(f"Could not load word graph from {graph_dir}: {e}")
+            return None
+        logging.info(f"Loaded word graph with {len(graph.neighbors_ids)} edges between "
+                     f"{len(graph.image_ids)} image words and {len(graph.strings)} strings.")
+        return graph
+
+    def string_id(self, word: str) -> Optional[int]:
+        key = word.strip().lower().encode('utf-8')
+        i = int(np.searchsorted(self.strings, key))
+        if i < len(self.strings) and self.strings[i] == key:
+            return i
+        return None
+
+    def _string(self, i: int) -> str:
+        return self.strings[i].decode('utf-8')
+
+    def neighbors(self, word: str) -> List[str]:
+        i = self.string_id(word)
+        if i is None or self.image_of_string[i] < 0:
+            return []
+        image = self.image_of_string[i]
+        start, end = self.neighbors_indptr[image], self.neighbors_indptr[image + 1]
+        return [self._string(j) for j in self.neighbors_ids[start:end]]
+
+    def image_words(self, word: str) -> List[str]:
+        i = self.string_id(word)
+        if i is None:
+            return []
+        start, end = self.images_indptr[i], self.images_indptr[i + 1]
+        return [self._string(self.image_ids[image]) for image in self.images[start:end]]
+
+    def resolve(self, word: str) -> Optional[str]:
+        i = self.string_id(word)
+        if i is None:
+            return None
+        if self.image_of_string[i] >= 0:
+            return self._string(i)
+        start, end = self.images_indptr[i], self.images_indptr[i + 1]
+        if start == end or end - start > self.max_ambiguity:
+            return None
+        return self._string(self.image_ids[self.images[start]])
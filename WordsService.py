@@ -0,0 +1,349 @@
+"""
+WordsService.py
+
+This file serves the word prediction of the AI Words Assistant to many clients at once, over a local
+HTTP and WebSocket API and without the customtkinter window. Tablets send audio or text and get the
+words for their grid back.
+
+Functionality:
+- Keeps the sessions in a SessionManager: the conversation window (a ConversationSession), the
+24 words on the client's grid and the words without images of every session, in memory. The
+SQLite result cache of the React agent, which would keep the tool results of all sessions in one file,
+is only used if `persist` is set. A session
+is created by `POST /sessions` or by the first request that names it, and is removed after it has
+been idle for `session_ttl_seconds`.
+- Does what the app's pipeline does for every chunk: transcribes the audio, appends the transcript to
+the conversation and predicts new words with `React.run_agent_for_app`. The chunks run on the worker
+pool of the SessionManager (`max_workers` threads): in order within a session, concurrently across
+sessions, so that the event loop only handles the connections. All sessions share one OpenAI client
+and one React agent, and so their pooled keep-alive connections to the OpenAI and NVIDIA endpoints.
+- Over a WebSocket, sends the interim words while the agent is still running, then the final words.
+
+HTTP API:
+- `POST /sessions`: Creates a session (optionally with the `session_id` of the JSON body) and returns its words.
+- `GET /sessions/{session_id}`: Returns the words of a session and the token counts of its conversation.
+- `DELETE /sessions/{session_id}`: Removes a session.
+- `POST /sessions/{session_id}/audio`: The body is an audio chunk in any format the OpenAI API accepts,
+named by the `format` query parameter or the content type (WAV by default). Returns the transcript and
+the new words.
+- `POST /sessions/{session_id}/text`: The JSON body `{"text": ...}` is used as the transcript. Any other
+body, or a `text` that is not a non-empty string, is answered with 400.
+- `GET /sessions/{session_id}/ws`: WebSocket. Binary messages are audio chunks (in the `format` of the
+query string), text messages are `{"text": ...}`; a text message without a string `text` gets an
+`error` message. Every message is answered with `partial` messages
+while the agent runs and then a `words` (or `error`) message.
+- `GET /health` and `GET /stats`.
+
+Interaction with Other Files:
+- **SessionManager.py**: Owns the sessions and the worker pool.
+- **Transcription.py**: Transcribes the audio chunks.
+- **React.py**: One React agent predicts the words of all sessions.
+- **Tracing.py**: Every request is traced like an audio chunk of the app, if tracing is enabled.
+- **benchmarks/service_load.py**: Load test that measures the sessions one CPU core can serve.
+
+Classes and Methods:
+- **WordsService**: This class encapsulates the sessions, the shared clients and the API.
+  - `create_app(self)`: Returns the aiohttp application.
+  - `get_session(self, session_id, create=True)`: Returns the session, creating it if needed.
+  - `process_chunk(self, session, audio=None, audio_format='wav', text=None, on_partial_words=None)`: Processes
+    one chunk of a session on a worker and returns the new state of the session and an error (or None).
+  - `process(self, session, ...)`: Queues a chunk on the SessionManager and awaits its result.
+  - `stats(self)`: Returns the session and request counts and the CPU time of the process.
+
+Usage:
+    python WordsService.py [--host 127.0.0.1] [--port 8080] [--mode auto] [--workers 16] [--trace]
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import re
+import time
+import uuid
+
+from aiohttp import WSMsgType, web
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from React import React
+from SessionManager import SessionManager, SessionState
+from Tracing import tracer
+from Transcription import transcribe_audio
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+AUDIO_FORMATS = {
+    'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/wave': 'wav', 'audio/flac': 'flac', 'audio/ogg': 'ogg',
+    'audio/mpeg': 'mp3', 'audio/mp4': 'm4a', 'audio/webm': 'webm',
+}
+TRANSCRIPTION_FAILED = 'transcription failed'
+PREDICTION_FAILED = 'prediction failed'
+ERROR_STATUS = {TRANSCRIPTION_FAILED: 422, PREDICTION_FAILED: 502}
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # the limit of the OpenAI transcription API
+
+
+class WordsService:
+    def __init__(self, react: Optional[React] = None,
+                 openai_client: Optional[OpenAI] = None,
+                 prediction_mode: str = 'auto',
+                 max_workers: Optional[int] = None,
+                 conversation_max_tokens: int = 800,
+                 conversation_summary_tokens: int = 0,
+                 session_ttl_seconds: float = 30 * 60,
+                 persist: bool = False,
+                 conversations_dir: Path = Path('conversations'),
+                 conversation_words_dir: Path = Path('conversation_words')):
+        self.react = react
+        self.openai_client = openai_client
+        self.prediction_mode = prediction_mode
+        self.persist = persist
+        self.sessions = SessionManager(max_workers=max_workers,
+                                       conversation_max_tokens=conversation_max_tokens,
+                                       conversation_summary_tokens=conversation_summary_tokens,
+                                       session_ttl_seconds=session_ttl_seconds,
+                                       persist=persist,
+                                       conversations_dir=conversations_dir,
+                                       conversation_words_dir=conversation_words_dir)
+        self.max_workers = self.sessions.max_workers
+        self.loop = None
+        self.expiry_task = None
+        self.requests = 0
+        self.errors = 0
+
+    async def on_startup(self, app: web.Application) -> None:
+        self.loop = asyncio.get_running_loop()
+        if self.openai_client is None:
+            load_dotenv()
+            self.openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        if self.react is None:
+            # The 'parallel' mode runs its concurrent tool calls on the service's event loop. The SQLite
+            # result cache is shared by all sessions and kept on disk, so it is only used with `persist`
+            self.react = React(use_cache=self.persist, mode=self.prediction_mode, loop=self.loop,
+                               http_pool_size=self.max_workers,
+                               conversation_words_dir=str(self.sessions.conversation_words_dir))
+        elif self.react.loop is None:
+            self.react.loop = self.loop
+        self.expiry_task = asyncio.create_task(self._expire_sessions())
+        logging.info(f"Words service started with {self.max_workers} workers.")
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        if self.expiry_task is not None:
+            self.expiry_task.cancel()
+        self.sessions.shutdown()
+        logging.info(f"Words service stats: {self.stats()}")
+        tracer.close()
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=MAX_UPLOAD_BYTES)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        app.add_routes([
+            web.get('/health', self.handle_health),
+            web.get('/stats', self.handle_stats),
+            web.post('/sessions', self.handle_create_session),
+            web.get('/sessions/{session_id}', self.handle_get_session),
+            web.delete('/sessions/{session_id}', self.handle_delete_session),
+            web.post('/sessions/{session_id}/audio', self.handle_audio),
+            web.post('/sessions/{session_id}/text', self.handle_text),
+            web.get('/sessions/{session_id}/ws', self.handle_websocket),
+        ])
+        return app
+
+    def get_session(self, session_id: str, create: bool = True) -> Optional[SessionState]:
+        return self.sessions.get(session_id, create)
+
+    async def _expire_sessions(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, self.sessions.session_ttl_seconds / 2))
+            self.sessions.expire_idle()
+
+    def process_chunk(self, session: SessionState, audio: Optional[bytes] = None, audio_format: str = 'wav',
+                      text: Optional[str] = None,
+                      on_partial_words: Optional[Callable] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        # Runs on a worker of the SessionManager, never at the same time as another chunk of the session
+        if audio is not None:
+            fname = f"{session.session_id}_{session.chunks + 1}.{audio_format}"
+            with tracer.span('transcribe'):
+                text, transcription_error = transcribe_audio(self.openai_client, fname, io.BytesIO(audio))
+            if transcription_error:
+                return session.state(), TRANSCRIPTION_FAILED
+
+        with tracer.span('conversation'):
+            conversation_text = session.conversation.append(text)
+            conversation_words = session.conversation.words()
+
+        # Interim words go into session.current_words, so the final result reconciles them
+        try:
+            with tracer.span('predict'):
+                current_words_new, word_candidates_ex_images = self.react.run_agent_for_app(
+                    session.session_id, session.current_words, conversation_text, on_partial_words,
+                    conversation_words, newest_text=text)
+        except Exception as e:
+            logging.error(f'React agent failed for session {session.session_id}: {e}')
+            current_words_new = None
+
+        if current_words_new is None:
+            return session.state(text), PREDICTION_FAILED
+
+        session.current_words[:] = current_words_new
+        session.word_candidates = word_candidates_ex_images
+        tracer.mark('chunk.total')
+        return session.state(text), None
+
+    async def process(self, session: SessionState, audio: Optional[bytes] = None, audio_format: str = 'wav',
+                      text: Optional[str] = None,
+                      on_partial_words: Optional[Callable] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+        self.requests += 1
+        # The worker runs the chunk in this context, so its spans belong to the request's trace
+        with tracer.trace('request', session=session.session_id, audio=audio is not None):
+            future = self.sessions.submit(session, self.process_chunk, audio, audio_format, text, on_partial_words)
+            state, error = await asyncio.wrap_future(future)
+        if error is not None:
+            self.errors += 1
+        return state, error
+
+    def partial_words_sender(self, session: SessionState, ws: web.WebSocketResponse) -> Callable:
+        def on_partial_words(current_words_new, word_candidates_ex_images):
+            # Runs on a worker thread while the session's chunk is being processed
+            if current_words_new == session.current_words:
+                return
+            session.current_words[:] = current_words_new
+            session.word_candidates = word_candidates_ex_images
+            message = {'type': 'partial', **session.state()}
+            asyncio.run_coroutine_threadsafe(self._send(ws, message), self.loop)
+
+        return on_partial_words
+
+    async def _send(self, ws: web.WebSocketResponse, message: Dict[str, Any]) -> None:
+        if not ws.closed:
+            try:
+                await ws.send_json(message)
+            except ConnectionError as e:
+                logging.debug(f"Could not send to WebSocket: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            **self.sessions.stats(),
+            'requests': self.requests,
+            'errors': self.errors,
+            'cpu_seconds': time.process_time(),
+        }
+        if self.react is not None:
+            stats['search_cache'] = self.react.tavily_cache.stats()
+        return stats
+
+    def _session_from_request(self, request: web.Request, create: bool = True) -> SessionState:
+        session_id = request.match_info['session_id']
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise web.HTTPBadRequest(text=json.dumps({'error': 'invalid session_id'}), content_type='application/json')
+        session = self.get_session(session_id, create)
+        if session is None:
+            raise web.HTTPNotFound(text=json.dumps({'error': 'unknown session'}), content_type='application/json')
+        return session
+
+    @staticmethod
+    def _text(body: Any) -> Optional[str]:
+        # The transcript of a `{"text": ...}` body, or None for any other JSON value
+        text = body.get('text') if isinstance(body, dict) else None
+        return text if isinstance(text, str) and text.strip() else None
+
+    @staticmethod
+    def _response(state: Dict[str, Any], error: Optional[str]) -> web.Response:
+        if error is None:
+            return web.json_response(state)
+        return web.json_response({**state, 'error': error}, status=ERROR_STATUS[error])
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok'})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle_create_session(self, request: web.Request) -> web.Response:
+        try:
+            body = await request.json() if request.body_exists else {}
+        except ValueError:
+            body = {}
+        session_id = str(body.get('session_id') or uuid.uuid4().hex[:12]) if isinstance(body, dict) else ''
+        if not SESSION_ID_PATTERN.match(session_id):
+            return web.json_response({'error': 'invalid session_id'}, status=400)
+        return web.json_response(self.get_session(session_id).state(), status=201)
+
+    async def handle_get_session(self, request: web.Request) -> web.Response:
+        session = self._session_from_request(request, create=False)
+        return web.json_response({**session.state(), 'conversation': session.conversation.stats()})
+
+    async def handle_delete_session(self, request: web.Request) -> web.Response:
+        session = self._session_from_request(request, create=False)
+        self.sessions.remove(session.session_id)
+        return web.json_response({'session_id': session.session_id, 'deleted': True})
+
+    async def handle_audio(self, request: web.Request) -> web.Response:
+        session = self._session_from_request(request)
+        audio = await request.read()
+        if not audio:
+            return web.json_response({'error': 'empty audio'}, status=400)
+        audio_format = request.query.get('format') or AUDIO_FORMATS.get(request.content_type, 'wav')
+        return self._response(*await self.process(session, audio=audio, audio_format=audio_format))
+
+    async def handle_text(self, request: web.Request) -> web.Response:
+        session = self._session_from_request(request)
+        try:
+            text = self._text(await request.json())
+        except ValueError:
+            text = None
+        if text is None:
+            return web.json_response({'error': 'no text'}, status=400)
+        return self._response(*await self.process(session, text=text))
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        session = self._session_from_request(request)
+        audio_format = request.query.get('format', 'wav')
+        ws = web.WebSocketResponse(heartbeat=30, max_msg_size=MAX_UPLOAD_BYTES)
+        await ws.prepare(request)
+        await ws.send_json({'type': 'words', **session.state()})
+        on_partial_words = self.partial_words_sender(session, ws)
+
+        async for message in ws:
+            if message.type == WSMsgType.BINARY:
+                state, error = await self.process(session, audio=message.data, audio_format=audio_format,
+                                                  on_partial_words=on_partial_words)
+            elif message.type == WSMsgType.TEXT:
+                try:
+                    text = self._text(json.loads(message.data))
+                except ValueError:
+                    text = None
+                if text is None:
+                    await ws.send_json({'type': 'error', 'error': 'no text'})
+                    continue
+                state, error = await self.process(session, text=text, on_partial_words=on_partial_words)
+            else:
+                break
+            if error is None:
+                await self._send(ws, {'type': 'words', **state})
+            else:
+                await self._send(ws, {'type': 'error', 'error': error, **state})
+        return ws
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve word predictions over HTTP and WebSocket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--mode', default='auto', help="prediction mode of React")
+    parser.add_argument('--workers', type=int, help='threads for transcription and prediction')
+    parser.add_argument('--trace', action='store_true', help='write traces to traces/service.jsonl')
+    args = parser.parse_args()
+
+    if args.trace:
+        tracer.configure(Path('traces') / 'service.jsonl', enabled=True)
+    service = WordsService(prediction_mode=args.mode, max_workers=args.workers)
+    web.run_app(service.create_app(), host=args.host, port=args.port)
@@ -0,0 +1 @@
+"""Offline benchmarks for the AI Words Assistant. Run them from the app directory, e.g. `python -m benchmarks.audio_encoding`."""
@@ -0,0 +1,67 @@
+"""
+Side-by-side benchmark of the word prediction modes of `React`.
+
+Runs the ReAct agent ('react'), the single structured prompt ('direct'), the concurrent word
+prediction and search branches ('parallel') and, when its model has been built, the in-process
+LocalPredictor ('local') against a local stub LLM with a fixed latency per call and a stub Tavily
+search, and reports the wall-clock time, the time until the first partial words
+reach the callback and the number of LLM calls per refresh.
+The stub agent takes `--steps` tool calls before its final answer, as Mixtral commonly does.
+
+    python -m benchmarks.agent_modes [--latency 0.5] [--search-latency 0.5] [--steps 3] [--runs 5]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+from benchmarks.stubs import StubChatServer, make_stub_react, react_responder
+from LocalPredictor import LocalPredictor
+from React import PartialWordsCallbackHandler
+
+CONVERSATION = "I need to buy some bread and milk for the kids.\nShould we go to the shop after school?"
+
+
+def run_mode(server, mode, runs, search_latency):
+    react = make_stub_react(server.base_url, search_latency=search_latency, use_cache=False, mode=mode)
+    times, first_times, calls = [], [], []
+    for _ in range(runs):
+        requests_before = server.requests
+        partial_times = []
+        handler = PartialWordsCallbackHandler(lambda words: partial_times.append(time.perf_counter()))
+        start = time.perf_counter()
+        words, error = react.run_agent(CONVERSATION, callbacks=[handler])
+        end = time.perf_counter()
+        times.append(end - start)
+        first_times.append((partial_times[0] if partial_times else end) - start)
+        calls.append(server.requests - requests_before)
+        if error:
+            print(f"{mode}: prediction failed")
+    return times, first_times, calls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per LLM call')
+    parser.add_argument('--search-latency', type=float, default=0.5, help='seconds per search')
+    parser.add_argument('--steps', type=int, default=3, help='tool calls the stub agent makes')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    # The modules under test configure INFO logging when they are imported
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    server = StubChatServer(latency=args.latency, responder=lambda r: react_responder(r, args.steps)).start()
+    try:
+        modes = ['react', 'direct', 'parallel']
+        if LocalPredictor.load() is not None:
+            modes.append('local')
+        for mode in modes:
+            times, first_times, calls = run_mode(server, mode, args.runs, args.search_latency)
+            print(f"{mode:>7}: median {statistics.median(times):6.2f} s per refresh, "
+                  f"first words after {statistics.median(first_times):6.2f} s, "
+                  f"{statistics.mean(calls):4.1f} LLM calls per refresh")
+    finally:
+        server.stop()
@@ -0,0 +1,76 @@
+"""
+Benchmark of the audio that is uploaded for transcription.
+
+Reports the bytes uploaded and the CPU time spent resampling and encoding one chunk for each
+combination of sample rate and audio format. Uses a WAV file if one is given, otherwise a
+synthetic 30-second chunk at the capture rate.
+
+    python -m benchmarks.audio_encoding [recording.wav] [--repeat 5]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+from AudioEncoder import available_formats, encode_audio, resample_audio
+
+CAPTURE_FS = 44100
+CONFIGS = [(44100, 'wav'), (16000, 'wav'), (16000, 'flac'), (16000, 'ogg')]
+
+
+def synthetic_chunk(fs=CAPTURE_FS, seconds=30, seed=0):
+    # Voiced harmonics with a syllable-rate envelope plus background noise
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(fs * seconds)) / fs
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / fs
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    signal = 4000 * voiced * envelope + rng.normal(0, 100, len(t))
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+
+def run_benchmark(samples, fs, repeat=5):
+    results = []
+    formats = available_formats()
+    for upload_fs, audio_format in CONFIGS:
+        if audio_format not in formats:
+            print(f"Skipping {audio_format}: the soundfile package is not installed.")
+            continue
+        cpu_times = []
+        for _ in range(repeat):
+            start = time.process_time()
+            audio_file = encode_audio(resample_audio(samples, fs, upload_fs), upload_fs, audio_format, 'chunk.wav')
+            cpu_times.append(time.process_time() - start)
+        results.append({
+            'fs': upload_fs,
+            'format': audio_format,
+            'bytes': len(audio_file.getbuffer()),
+            'cpu_ms': 1000 * min(cpu_times),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('wav_file', nargs='?', help='WAV file to use as the chunk')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.wav_file:
+        fs, samples = wav.read(args.wav_file)
+        if samples.ndim > 1:
+            samples = samples[:, 0]
+    else:
+        fs, samples = CAPTURE_FS, synthetic_chunk()
+
+    print(f"Chunk: {len(samples) / fs:.1f} s at {fs} Hz")
+    baseline = None
+    for r in run_benchmark(samples, fs, args.repeat):
+        baseline = baseline or r['bytes']
+        print(f"{r['fs']:>6} Hz {r['format']:>5}: {r['bytes']:>10,} bytes "
+              f"({r['bytes'] / baseline:6.1%})  encode CPU {r['cpu_ms']:7.1f} ms")
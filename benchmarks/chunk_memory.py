@@ -0,0 +1,99 @@
+"""
+Peak memory per audio chunk of `AudioRecorder`, measured with tracemalloc.
+
+Feeds `--chunks` chunks of synthetic speech through the recorder as the microphone would, one
+block at a time into its ring buffer, and emits each chunk through the real path: the view into the
+ring buffer, resampling, encoding and the callback. The recorder uses fixed chunks of
+`--chunk-seconds` in a ring buffer that is only a few seconds longer, so most chunks wrap around
+the end of the buffer.
+
+Reports the memory allocated at the peak of every chunk, beyond what was allocated before it, and
+exits with status 1 if any peak exceeds the size of the ring buffer (`--max-ring-fraction` times
+it), or if the memory still allocated after the chunks grows with their number.
+
+    python -m benchmarks.chunk_memory [--chunks 20] [--chunk-seconds 30] [--audio-format wav]
+        [--max-ring-fraction 1.0]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import logging
+import sys
+import tracemalloc
+
+from benchmarks.audio_encoding import CAPTURE_FS, synthetic_chunk
+
+BLOCK_SIZE = 1024  # samples per audio callback, as sounddevice delivers them
+
+
+def run_benchmark(chunks=20, chunk_seconds=30, overlap_seconds=0.0, audio_format='wav'):
+    from AudioRecorder import AudioRecorder
+
+    emitted = []
+    recorder = AudioRecorder('memory', lambda *args: emitted.append(len(args[2].getbuffer())), use_vad=False,
+                             audio_format=audio_format, chunk_seconds=chunk_seconds,
+                             overlap_seconds=overlap_seconds)
+    recorder.recording = True
+    speech = synthetic_chunk(CAPTURE_FS, chunk_seconds)[:, None]
+
+    tracemalloc.start()
+    peaks = []
+    retained = []
+    previous_end = -1
+    for _ in range(chunks):
+        start = recorder.buffer.total_written
+        for i in range(0, len(speech), BLOCK_SIZE):
+            recorder._audio_callback(speech[i:i + BLOCK_SIZE], BLOCK_SIZE, None, None)
+        end = recorder.buffer.total_written
+
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        chunk, overlap = recorder._read_chunk(start, end, previous_end)
+        recorder._emit_chunk(chunk, f"memory_{len(peaks)}.wav", overlap)
+        del chunk
+        current, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(current)
+        previous_end = end
+    tracemalloc.stop()
+
+    return {
+        'ring_bytes': recorder.buffer.nbytes,
+        'chunk_bytes': speech.nbytes,
+        'upload_bytes': emitted[-1] if emitted else 0,
+        'peaks': peaks,
+        'retained': retained,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=20)
+    parser.add_argument('--chunk-seconds', type=float, default=30)
+    parser.add_argument('--overlap', type=float, default=1.5, help='seconds of overlap between chunks')
+    parser.add_argument('--audio-format', default='wav')
+    parser.add_argument('--max-ring-fraction', type=float, default=1.0,
+                        help='fail if a chunk peaks above this fraction of the ring buffer')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    report = run_benchmark(args.chunks, args.chunk_seconds, args.overlap, args.audio_format)
+    mb = 2**20
+    peaks = report['peaks']
+    limit = args.max_ring_fraction * report['ring_bytes']
+    print(f"ring buffer {report['ring_bytes'] / mb:.2f} MB, chunk {report['chunk_bytes'] / mb:.2f} MB captured, "
+          f"{report['upload_bytes'] / mb:.2f} MB uploaded ({args.audio_format})")
+    print(f"peak per chunk: max {max(peaks) / mb:.2f} MB, first {peaks[0] / mb:.2f} MB, last {peaks[-1] / mb:.2f} MB "
+          f"over {len(peaks)} chunks ({max(peaks) / report['ring_bytes']:.2f} x the ring buffer)")
+
+    failed = False
+    if max(peaks) > limit:
+        print(f"FAIL: a chunk peaked at {max(peaks) / mb:.2f} MB > {limit / mb:.2f} MB")
+        failed = True
+    # Allocations kept between chunks must not accumulate
+    growth = report['retained'][-1] - report['retained'][1]
+    if growth > report['chunk_bytes'] / 10:
+        print(f"FAIL: {growth / mb:.2f} MB more allocated after {len(peaks)} chunks than after 2")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,109 @@
+"""
+Word error rate of chunked transcription, with and without overlapping chunks and stitching.
+
+Simulates a speaker (the stub transcripts, at `--words-per-second` with random word lengths and
+pauses) and a transcriber that gets the speech cut into fixed chunks, as `AudioRecorder` cuts it
+with `use_vad=False` or when a segment reaches `chunk_seconds`. The transcriber writes every word
+that is whole in its chunk, and a word cut in two as its first letters if most of it is in the
+chunk (and not at all otherwise); like Whisper, it capitalises the first word of a chunk and ends
+the chunk with a full stop. The transcripts go through `TranscriptStitcher` when the chunks overlap
+and are appended to a `ConversationSession`, as the app appends them, and the conversation it
+builds is compared with the spoken words.
+
+Reports, for every chunk length, the word error rate without overlap and with `--overlap` seconds
+of overlap, and the extra audio that the overlap uploads.
+
+    python -m benchmarks.chunk_overlap [--chunk-seconds 2 3 5 10 30] [--overlap 1.5] [--minutes 10]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import logging
+import random
+
+from benchmarks.stubs import STUB_TRANSCRIPTS
+from ConversationSession import ConversationSession
+from TranscriptStitcher import TranscriptStitcher, normalize_word
+
+
+def speech(minutes, words_per_second, seed=0):
+    """Returns the spoken words with their (start, end) times in seconds."""
+    rng = random.Random(seed)
+    words = []
+    t = 0.0
+    while t < minutes * 60:
+        for word in rng.choice(STUB_TRANSCRIPTS).split():
+            duration = rng.uniform(0.5, 1.5) / words_per_second
+            words.append((word, t, t + duration))
+            t += duration
+        t += rng.uniform(0.2, 0.8)  # pause between sentences
+    return words
+
+
+def transcribe(words, start, end):
+    text = []
+    for word, word_start, word_end in words:
+        if word_end <= start or word_start >= end:
+            continue
+        inside = (min(word_end, end) - max(word_start, start)) / (word_end - word_start)
+        if inside >= 1.0:
+            text.append(word)
+        elif inside > 0.5:
+            # Half a word comes out as another, shorter one
+            text.append(word[:max(1, len(word) // 2)])
+    if not text:
+        return ''
+    text[0] = text[0][:1].upper() + text[0][1:]
+    return ' '.join(text).rstrip('.,?') + '.'
+
+
+def edit_distance(reference, hypothesis):
+    previous = list(range(len(hypothesis) + 1))
+    for i, r in enumerate(reference, 1):
+        current = [i]
+        for j, h in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h)))
+        previous = current
+    return previous[-1]
+
+
+def word_error_rate(words, chunk_seconds, overlap_seconds):
+    total = words[-1][2]
+    stitcher = TranscriptStitcher()
+    # A window that never evicts, so that the whole conversation is scored
+    conversation = ConversationSession('chunk_overlap', max_tokens=10**9, persist=False)
+    start = 0.0
+    while start < total:
+        end = start + chunk_seconds
+        chunk_start = max(0.0, start - overlap_seconds)
+        text = transcribe(words, chunk_start, end)
+        if text:
+            text = stitcher.stitch(text, start - chunk_start)
+            if text:
+                conversation.append(text)
+        start = end
+
+    reference = [normalize_word(word) for word, _, _ in words]
+    hypothesis = [normalize_word(word) for word in conversation.text.split()]
+    return edit_distance(reference, hypothesis) / len(reference)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunk-seconds', type=float, nargs='+', default=[2, 3, 5, 10, 30], help='chunk lengths')
+    parser.add_argument('--overlap', type=float, default=1.5, help='seconds of overlap between chunks')
+    parser.add_argument('--minutes', type=float, default=10, help='minutes of simulated speech')
+    parser.add_argument('--words-per-second', type=float, default=2.5, help='speaking rate')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    words = speech(args.minutes, args.words_per_second, args.seed)
+    print(f"{len(words)} words in {words[-1][2] / 60:.1f} minutes, overlap {args.overlap} s")
+    for chunk_seconds in args.chunk_seconds:
+        without = word_error_rate(words, chunk_seconds, 0.0)
+        with_overlap = word_error_rate(words, chunk_seconds, args.overlap)
+        extra_audio = min(args.overlap, chunk_seconds) / chunk_seconds
+        print(f"{chunk_seconds:5.1f} s chunks: WER {100 * without:5.2f}% without overlap, "
+              f"{100 * with_overlap:5.2f}% with overlap (+{100 * extra_audio:.0f}% audio)")
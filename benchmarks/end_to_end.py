@@ -0,0 +1,299 @@
+"""
+Offline end-to-end benchmark of the app, from recorded audio to updated words.
+
+Replays WAV files (or synthetic speech) through the ring buffer and voice activity detection of
+`AudioRecorder`, as the microphone would, faster than real time if asked. The app runs headless
+(no Tk window): its `audio_recorder_callback`, pipeline, conversation and word prediction are the
+real ones, and the grid update resolves the images without drawing them. Whisper, ChatNVIDIA and
+Tavily are local stubs, each with a log-normal latency and a failure rate.
+
+Reports the chunks per second, the end-to-end latency percentiles from each speech segment to its
+words (the `chunk.total` span of the tracer), the per-stage latencies, the pipeline counters and the
+memory high-water mark. `--max-p95` and `--min-chunks-per-sec` make it exit with status 1 when the
+run is slower, so it can be used as a regression gate.
+
+    python -m benchmarks.end_to_end [recording.wav ...] [--speed 4] [--mode auto]
+        [--whisper-latency 0.8] [--llm-latency 0.5] [--search-latency 0.5] [--spread 0.3]
+        [--failure-rate 0.0] [--chunk-seconds 30] [--overlap 1.5] [--max-p95 10] [--min-chunks-per-sec 0.1]
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+import argparse
+import logging
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from benchmarks.audio_encoding import CAPTURE_FS, synthetic_chunk
+from benchmarks.stubs import StubChatServer, StubLatency, make_stub_react, react_responder, vocabulary_words
+
+BLOCK_SIZE = 1024  # samples per audio callback, as sounddevice delivers them
+GRID_PIXEL_SIZE = 150
+
+
+def max_rss_mb():
+    if resource is None:
+        return float('nan')
+    # Kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+
+def silence(fs, seconds, seed=0):
+    return np.random.default_rng(seed).normal(0, 100, int(fs * seconds)).astype(np.int16)
+
+
+def synthetic_speech(utterances=12, seconds=4.0, pause=1.0, fs=CAPTURE_FS):
+    pieces = [silence(fs, pause)]
+    for i in range(utterances):
+        pieces += [synthetic_chunk(fs, seconds, seed=i), silence(fs, pause, seed=i)]
+    return np.concatenate(pieces), fs
+
+
+def read_wavs(paths, pause=1.0):
+    from AudioEncoder import resample_audio
+
+    pieces = []
+    for path in paths:
+        fs, data = wav.read(path)
+        if data.ndim > 1:
+            data = data[:, 0]
+        if np.issubdtype(data.dtype, np.floating):
+            data = np.clip(data * 32767, -32768, 32767)
+        data = resample_audio(data.astype(np.int16), fs, CAPTURE_FS)
+        # A pause after every file ends its last speech segment
+        pieces += [data, silence(CAPTURE_FS, pause)]
+    return np.concatenate(pieces), CAPTURE_FS
+
+
+def make_replay_recorder(samples, speed):
+    from AudioRecorder import AudioRecorder
+
+    class ReplayRecorder(AudioRecorder):
+        """AudioRecorder that is fed from `samples` instead of a sounddevice input stream."""
+
+        def start_recording(self):
+            self.recording = True
+            self.finished = threading.Event()
+            self.thread = threading.Thread(target=self._recording_thread, daemon=True)
+            self.thread.start()
+            self.feeder = threading.Thread(target=self._replay, daemon=True)
+            self.feeder.start()
+
+        def _replay(self):
+            interval = BLOCK_SIZE / self.fs / speed
+            next_time = time.monotonic()
+            for i in range(0, len(samples), BLOCK_SIZE):
+                if not self.recording:
+                    break
+                block = samples[i:i + BLOCK_SIZE]
+                self._audio_callback(block[:, None], len(block), None, None)
+                next_time += interval
+                time.sleep(max(0.0, next_time - time.monotonic()))
+            # Let voice activity detection catch up with the end of the audio
+            time.sleep(0.3)
+            self.finished.set()
+
+    return ReplayRecorder
+
+
+def make_headless_app(samples, speed, chat_url, whisper_url, search_latency, mode, stream_partial_words, work_dir,
+                      chunk_seconds=30, overlap_seconds=1.5):
+    from openai import OpenAI
+    from AIWordsAssistantApp import AIWordsAssistantApp
+    from Tracing import tracer
+
+    ReplayRecorder = make_replay_recorder(samples, speed)
+
+    class HeadlessApp(AIWordsAssistantApp):
+        """The app without its window, recording from `samples` and predicting with stub services."""
+
+        def setup_directories(self):
+            super().setup_directories()
+            self.traces_dir = Path(work_dir)
+            tracer.configure(self.traces_dir / 'traces.jsonl', enabled=True)
+
+        def create_react(self):
+            return make_stub_react(chat_url, search_latency=search_latency, use_cache=False, mode=mode,
+                                   loop=self.loop)
+
+        def initialize_app(self):
+            self.OpenAI_client = OpenAI(api_key='stub', base_url=whisper_url, max_retries=0)
+            self.chunks = 0
+            self.create_pipeline()
+            self.start_event_loop()
+
+        def create_audio_recorder(self):
+            return ReplayRecorder(self.session_id, self.audio_recorder_callback,
+                                  save_recordings=self.save_recordings,
+                                  upload_fs=self.upload_fs,
+                                  audio_format=self.audio_format,
+                                  chunk_seconds=self.chunk_seconds,
+                                  overlap_seconds=self.chunk_overlap_seconds)
+
+        def audio_recorder_callback(self, session_id, fname, audio_file=None, overlap_seconds=0.0):
+            self.chunks += 1
+            super().audio_recorder_callback(session_id, fname, audio_file, overlap_seconds)
+
+        def update_button(self, text, color, hover_color):
+            pass
+
+        def create_image_grid(self):
+            # What the grid update does apart from drawing: decode and resize the image of every word
+            with tracer.span('grid.redraw'):
+                for word in self.current_words:
+                    self.image_cache.get_resized_image(word, GRID_PIXEL_SIZE)
+
+        def set_words_text(self, text):
+            pass
+
+        def call_in_ui_thread(self, func, *args):
+            # There is no Tk main loop to hand the grid update to
+            func(*args)
+
+        def wait_until_idle(self, timeout):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                stats = self.pipeline.stats().values()
+                if all(stage['depth'] == 0 and not stage['busy'] for stage in stats):
+                    return True
+                time.sleep(0.05)
+            return False
+
+        def close(self):
+            self.exiting = True
+            self.stop_recording(exiting=True)
+            self.pipeline.stop()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    app = HeadlessApp()
+    app.stream_partial_words = stream_partial_words
+    app.chunk_seconds = chunk_seconds
+    app.chunk_overlap_seconds = overlap_seconds
+    return app
+
+
+def run_benchmark(samples, fs, speed=4.0, mode='auto', whisper_latency=0.0, llm_latency=0.0,
+                  search_latency=0.0, steps=3, stream_partial_words=True, chunk_seconds=30, overlap_seconds=1.5,
+                  timeout=120.0):
+    import strings
+    from Tracing import tracer
+
+    words = vocabulary_words(strings.words)
+    whisper_server = StubChatServer(latency=whisper_latency).start()
+    chat_server = StubChatServer(latency=llm_latency, responder=lambda r: react_responder(r, steps, words)).start()
+    work_dir = tempfile.mkdtemp(prefix='end_to_end_')
+    try:
+        app = make_headless_app(samples, speed, chat_server.base_url, whisper_server.base_url, search_latency,
+                                mode, stream_partial_words, work_dir, chunk_seconds, overlap_seconds)
+        rss_before = max_rss_mb()
+        start = time.perf_counter()
+        app.start_recording()
+        app.audio_recorder.finished.wait()
+        drained = app.wait_until_idle(timeout)
+        seconds = time.perf_counter() - start
+        pipeline_stats = app.pipeline.stats()
+        chunks = app.chunks
+        app.close()
+        spans = tracer.summary()
+        tracer.close()
+    finally:
+        whisper_server.stop()
+        chat_server.stop()
+
+    return {
+        'audio_seconds': len(samples) / fs,
+        'seconds': seconds,
+        'chunks': chunks,
+        'chunks_per_sec': chunks / seconds,
+        'drained': drained,
+        'latency': spans.get('chunk.total'),
+        'spans': spans,
+        'pipeline': pipeline_stats,
+        'whisper_requests': (whisper_server.requests, whisper_server.failures),
+        'llm_requests': (chat_server.requests, chat_server.failures),
+        'max_rss_mb': (rss_before, max_rss_mb()),
+        'trace_file': Path(work_dir) / 'traces.jsonl',
+    }
+
+
+def print_report(report):
+    print(f"audio: {report['audio_seconds']:.1f} s replayed in {report['seconds']:.1f} s, "
+          f"{report['chunks']} chunks, {report['chunks_per_sec']:.2f} chunks/sec"
+          + ("" if report['drained'] else " (pipeline did not drain)"))
+    latency = report['latency']
+    if latency:
+        print(f"end-to-end latency: {latency['count']} chunks, p50 {latency['p50'] / 1000:.2f} s, "
+              f"p95 {latency['p95'] / 1000:.2f} s, p99 {latency['p99'] / 1000:.2f} s, max {latency['max'] / 1000:.2f} s")
+    else:
+        print("end-to-end latency: no chunk reached the grid")
+    for name, stats in report['spans'].items():
+        print(f"  {name:>28}: {stats['count']:4d} x, p50 {stats['p50']:9.1f} ms, p95 {stats['p95']:9.1f} ms")
+    for name, stats in report['pipeline'].items():
+        print(f"  stage {name:>12}: processed {stats['processed']}, dropped {stats['dropped']}, "
+              f"merged {stats['merged']}, errors {stats['errors']}")
+    print(f"stub requests (failed): whisper {report['whisper_requests']}, llm {report['llm_requests']}")
+    rss_before, rss_after = report['max_rss_mb']
+    print(f"memory high-water mark: {rss_after:.0f} MB ({rss_before:.0f} MB before recording)")
+    print(f"trace: {report['trace_file']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('wav_files', nargs='*', help='WAV files to replay; synthetic speech if none are given')
+    parser.add_argument('--utterances', type=int, default=12, help='synthetic utterances')
+    parser.add_argument('--speed', type=float, default=4.0, help='replay speed, times real time')
+    parser.add_argument('--mode', default='auto', help="prediction mode of React")
+    parser.add_argument('--steps', type=int, default=3, help='tool calls the stub agent makes')
+    parser.add_argument('--whisper-latency', type=float, default=0.8, help='median seconds per transcription')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='median seconds per LLM call')
+    parser.add_argument('--search-latency', type=float, default=0.5, help='median seconds per search')
+    parser.add_argument('--spread', type=float, default=0.3, help='sigma of the log-normal stub latencies')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of failed stub requests')
+    parser.add_argument('--chunk-seconds', type=float, default=30, help='longest speech segment')
+    parser.add_argument('--overlap', type=float, default=1.5, help='seconds of overlap after a cut in speech')
+    parser.add_argument('--no-partial-words', action='store_true', help='do not stream interim words')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-p95', type=float, help='fail if the p95 end-to-end latency exceeds this (s)')
+    parser.add_argument('--min-chunks-per-sec', type=float, help='fail if fewer chunks per second are processed')
+    args = parser.parse_args()
+    # The modules under test configure INFO logging when they are imported
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    if args.wav_files:
+        samples, fs = read_wavs(args.wav_files)
+    else:
+        samples, fs = synthetic_speech(args.utterances)
+
+    def latency(median, seed):
+        return StubLatency(median, args.spread, args.failure_rate, seed=args.seed + seed)
+
+    report = run_benchmark(samples, fs, args.speed, args.mode,
+                           whisper_latency=latency(args.whisper_latency, 1),
+                           llm_latency=latency(args.llm_latency, 2),
+                           search_latency=latency(args.search_latency, 3),
+                           steps=args.steps, stream_partial_words=not args.no_partial_words,
+                           chunk_seconds=args.chunk_seconds, overlap_seconds=args.overlap)
+    print_report(report)
+
+    failed = False
+    p95 = report['latency']['p95'] / 1000 if report['latency'] else float('inf')
+    if args.max_p95 is not None and p95 > args.max_p95:
+        print(f"FAIL: p95 end-to-end latency {p95:.2f} s > {args.max_p95:.2f} s")
+        failed = True
+    if args.min_chunks_per_sec is not None and report['chunks_per_sec'] < args.min_chunks_per_sec:
+        print(f"FAIL: {report['chunks_per_sec']:.2f} chunks/sec < {args.min_chunks_per_sec:.2f}")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,69 @@
+"""
+Microbenchmark of the per-call overhead of the LLM word tools.
+
+Compares the old way of building a new `ChatNVIDIA` client and prompt on every tool call with the
+`WordsPredictLLM` tool bound to one shared client and a keep-alive HTTP session, both against a
+local stub endpoint so that only the client-side overhead is measured.
+
+    python -m benchmarks.llm_client_reuse [--calls 50]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+from langchain_core.prompts import PromptTemplate
+from langchain_nvidia_ai_endpoints import ChatNVIDIA
+
+from React import WordsPredictLLM, share_http_session, words_predict_template
+from benchmarks.stubs import STUB_MODEL, StubChatServer
+
+QUERY = "I am in pain. Were you in the flood? I saw it on the news."
+
+
+def new_client_per_call(base_url):
+    llm = ChatNVIDIA(model=STUB_MODEL, base_url=base_url, api_key="stub", temperature=0)
+    prompt = PromptTemplate(input_variables=["query"], template=words_predict_template)
+    return (prompt | llm).invoke(QUERY).content
+
+
+def time_calls(func, calls):
+    times = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def report(name, times, server, connections_before):
+    print(f"{name:>22}: median {1000 * statistics.median(times):7.2f} ms, "
+          f"mean {1000 * statistics.mean(times):7.2f} ms, "
+          f"connections {server.connections - connections_before}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    server = StubChatServer().start()
+    try:
+        connections = server.connections
+        before = time_calls(lambda: new_client_per_call(server.base_url), args.calls)
+        report("new client per call", before, server, connections)
+
+        session = requests.Session()
+        llm = share_http_session(ChatNVIDIA(model=STUB_MODEL, base_url=server.base_url, 
+                                            api_key="stub", temperature=0), session)
+        tool = WordsPredictLLM(llm=llm)
+        connections = server.connections
+        after = time_calls(lambda: tool.invoke({"query": QUERY}), args.calls)
+        report("shared pooled client", after, server, connections)
+
+        print(f"Overhead saved per tool call: {1000 * (statistics.median(before) - statistics.median(after)):.2f} ms")
+    finally:
+        server.stop()
@@ -0,0 +1,83 @@
+"""
+Check of the prediction mode that `React.select_mode` chooses in 'auto' mode.
+
+Ordinary conversation must take the single direct prompt, and only conversation about current events
+the ReAct agent with its search tool: a transcript that is wrongly taken for news costs 3-5 LLM calls
+instead of one. Classifies every sentence below as the newest transcript, and also the newest
+transcript of a long window whose older part talks about the news, and exits with status 1 if any of
+them gets the wrong mode.
+
+    python -m benchmarks.mode_selection
+
+© Matthew J. Hergott
+"""
+
+import logging
+import sys
+
+ORDINARY = [
+    "I need to buy some bread and milk for the kids today.",
+    "How was your day? I lost my keys.",
+    "We went to see Sarah and Tom on Sunday.",
+    "Did you watch the game yesterday? We won by two points.",
+    "The prices at the market went up again, so I only got apples.",
+    "There was a fire drill at work this morning and nobody knew where to go.",
+    "Can you report the broken light to the landlord? It happened again last night.",
+    "My score on the test was better than I expected.",
+    "Mom said Aunt Lucy is coming over on Friday for dinner.",
+    "I have a doctor's appointment on Tuesday at three.",
+    "The dog needs a walk, and the cat needs to go to the vet.",
+    "It's really cold tonight. Can you close the window?",
+]
+
+NEWS = [
+    "Did you see the news about the election results?",
+    "The president gave a speech about inflation and interest rates.",
+    "They said on the radio that the hurricane will reach Florida tomorrow.",
+    "I read that Taylor Swift is playing at Wembley Stadium next month.",
+    "The stock market dropped after the announcement from the government.",
+    "Who do you think will win the world cup this year?",
+    "There was an earthquake in Japan this morning.",
+]
+
+
+class AutoMode:
+    """The attributes `React.select_mode` uses, without a model or API keys."""
+
+    def __init__(self):
+        import strings
+
+        self.mode = 'auto'
+        self.news_mode = 'react'
+        self.news_keywords = strings.news_keywords
+
+
+def run_checks():
+    from React import React
+
+    auto = AutoMode()
+    failures = []
+    for text in ORDINARY:
+        mode = React.select_mode(auto, text, newest_text=text)
+        if mode != 'direct':
+            failures.append((text, mode, 'direct'))
+    for text in NEWS:
+        mode = React.select_mode(auto, text, newest_text=text)
+        if mode != 'react':
+            failures.append((text, mode, 'react'))
+
+    # A window with news in its older part: only the newest transcript decides
+    window = ' '.join(NEWS + ORDINARY * 3)
+    mode = React.select_mode(auto, window, newest_text=ORDINARY[0])
+    if mode != 'direct':
+        failures.append(('<window with older news>', mode, 'direct'))
+    return failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, force=True)
+    failures = run_checks()
+    print(f"{len(ORDINARY)} ordinary and {len(NEWS)} news transcripts, {len(failures)} in the wrong mode")
+    for text, mode, expected in failures:
+        print(f"  {mode} instead of {expected}: {text}")
+    sys.exit(1 if failures else 0)
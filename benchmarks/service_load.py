@@ -0,0 +1,192 @@
+"""
+Load test of the headless words service in `WordsService.py`.
+
+Runs the service in a child process, against the stub LLM, Whisper and Tavily services of
+`benchmarks.stubs` (which run in this process), and simulates tablets: every session sends `--chunks`
+audio chunks (or transcripts, with `--text`), `--interval` seconds apart, over HTTP or over a
+WebSocket (`--websocket`). For every number of concurrent sessions it reports the request latency
+percentiles, the chunks per second and the CPU time the service process spends per chunk. From the
+CPU time it estimates how many sessions one core can serve when every session sends a chunk every
+`--chunk-seconds` seconds, as a speech segment of the app is long.
+
+    python -m benchmarks.service_load [--sessions 8 32 128] [--chunks 5] [--interval 0.5] [--websocket]
+        [--text] [--mode auto] [--workers 64] [--llm-latency 0.5] [--whisper-latency 0.8]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import random
+import socket
+import time
+
+import aiohttp
+import numpy as np
+
+from benchmarks.audio_encoding import CAPTURE_FS, synthetic_chunk
+from benchmarks.stubs import (STUB_TRANSCRIPTS, StubChatServer, StubLatency, make_stub_react, react_responder,
+                              vocabulary_words)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port, chat_url, whisper_url, search_latency, spread, mode, workers):
+    """Runs the service with stub clients; the target of the child process."""
+    from aiohttp import web
+    from openai import OpenAI
+    from WordsService import WordsService
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    react = make_stub_react(chat_url, search_latency=StubLatency(search_latency, spread, seed=3),
+                            use_cache=False, mode=mode,
+                            http_pool_size=workers)
+    service = WordsService(react=react, max_workers=workers,
+                           openai_client=OpenAI(api_key='stub', base_url=whisper_url, max_retries=0))
+    web.run_app(service.create_app(), host='127.0.0.1', port=port, print=None)
+
+
+async def wait_for_service(client, base_url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with client.get(f"{base_url}/health") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("The words service did not start.")
+
+
+async def get_stats(client, base_url):
+    async with client.get(f"{base_url}/stats") as response:
+        return await response.json()
+
+
+async def run_session(client, base_url, session_id, chunks, interval, audio, websocket, latencies, errors):
+    transcripts = itertools.cycle(STUB_TRANSCRIPTS)
+    # Tablets do not all start speaking at the same moment
+    await asyncio.sleep(random.uniform(0, interval))
+    if websocket:
+        async with client.ws_connect(f"{base_url}/sessions/{session_id}/ws") as ws:
+            await ws.receive_json()  # the words the grid starts with
+            for _ in range(chunks):
+                start = time.perf_counter()
+                if audio is not None:
+                    await ws.send_bytes(audio)
+                else:
+                    await ws.send_json({'text': next(transcripts)})
+                message = await ws.receive_json()
+                while message['type'] == 'partial':
+                    message = await ws.receive_json()
+                latencies.append(time.perf_counter() - start)
+                errors.append(message['type'] == 'error')
+                await asyncio.sleep(interval)
+        return
+
+    for _ in range(chunks):
+        start = time.perf_counter()
+        if audio is not None:
+            request = client.post(f"{base_url}/sessions/{session_id}/audio", data=audio,
+                                  headers={'Content-Type': 'audio/wav'})
+        else:
+            request = client.post(f"{base_url}/sessions/{session_id}/text", json={'text': next(transcripts)})
+        async with request as response:
+            await response.json()
+        latencies.append(time.perf_counter() - start)
+        errors.append(response.status != 200)
+        await asyncio.sleep(interval)
+
+
+async def run_level(client, base_url, level, sessions, chunks, interval, audio, websocket):
+    latencies, errors = [], []
+    stats_before = await get_stats(client, base_url)
+    start = time.perf_counter()
+    await asyncio.gather(*[run_session(client, base_url, f"load-{level}-{i}", chunks, interval, audio, websocket,
+                                       latencies, errors)
+                           for i in range(sessions)])
+    seconds = time.perf_counter() - start
+    stats_after = await get_stats(client, base_url)
+    cpu_seconds = stats_after['cpu_seconds'] - stats_before['cpu_seconds']
+    return {
+        'sessions': sessions,
+        'chunks': len(latencies),
+        'errors': sum(errors),
+        'seconds': seconds,
+        'latency': np.percentile(latencies, [50, 95, 99]) if latencies else [float('nan')] * 3,
+        'cpu_per_chunk': cpu_seconds / len(latencies) if latencies else float('nan'),
+    }
+
+
+async def run_load_test(base_url, levels, chunks, interval, audio, websocket):
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120)) as client:
+        await wait_for_service(client, base_url)
+        return [await run_level(client, base_url, level, sessions, chunks, interval, audio, websocket)
+                for level, sessions in enumerate(levels)]
+
+
+def audio_chunk(seconds=4.0, upload_fs=16000):
+    from AudioEncoder import encode_audio, resample_audio
+
+    samples = synthetic_chunk(CAPTURE_FS, seconds)
+    return encode_audio(resample_audio(samples, CAPTURE_FS, upload_fs), upload_fs, 'wav', 'chunk.wav').getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[8, 32, 128], help='concurrent sessions')
+    parser.add_argument('--chunks', type=int, default=5, help='chunks per session')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between the chunks of a session')
+    parser.add_argument('--chunk-seconds', type=float, default=5.0,
+                        help='seconds of speech per chunk in real use, for the sessions per core')
+    parser.add_argument('--websocket', action='store_true', help='send the chunks over WebSockets')
+    parser.add_argument('--text', action='store_true', help='send transcripts instead of audio')
+    parser.add_argument('--mode', default='auto', help='prediction mode of React')
+    parser.add_argument('--workers', type=int, default=64, help='worker threads of the service')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='median seconds per LLM call')
+    parser.add_argument('--whisper-latency', type=float, default=0.8, help='median seconds per transcription')
+    parser.add_argument('--search-latency', type=float, default=0.5, help='median seconds per search')
+    parser.add_argument('--spread', type=float, default=0.3, help='sigma of the log-normal stub latencies')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    import strings
+
+    words = vocabulary_words(strings.words)
+    chat_server = StubChatServer(latency=StubLatency(args.llm_latency, args.spread, seed=1),
+                                 responder=lambda r: react_responder(r, 3, words)).start()
+    whisper_server = StubChatServer(latency=StubLatency(args.whisper_latency, args.spread, seed=2)).start()
+    port = free_port()
+    # A separate process, so that its CPU time is the service's alone
+    service = multiprocessing.get_context('spawn').Process(
+        target=serve, args=(port, chat_server.base_url, whisper_server.base_url,
+                            args.search_latency, args.spread, args.mode, args.workers),
+        daemon=True)
+    service.start()
+    try:
+        audio = None if args.text else audio_chunk()
+        results = asyncio.run(run_load_test(f"http://127.0.0.1:{port}", args.sessions, args.chunks, args.interval,
+                                            audio, args.websocket))
+    finally:
+        service.terminate()
+        service.join()
+        chat_server.stop()
+        whisper_server.stop()
+
+    transport = 'WebSocket' if args.websocket else 'HTTP'
+    print(f"{transport}, {'text' if args.text else 'audio'}, mode {args.mode}, {args.workers} workers")
+    for result in results:
+        p50, p95, p99 = result['latency']
+        sessions_per_core = args.chunk_seconds / result['cpu_per_chunk']
+        print(f"{result['sessions']:5d} sessions: {result['chunks'] / result['seconds']:6.1f} chunks/s, "
+              f"latency p50 {p50:5.2f} s, p95 {p95:5.2f} s, p99 {p99:5.2f} s, {result['errors']} errors, "
+              f"{1000 * result['cpu_per_chunk']:6.1f} ms CPU per chunk, ~{sessions_per_core:.0f} sessions per core")
@@ -0,0 +1,177 @@
+"""
+Stress test of concurrent sessions sharing one React agent, through the SessionManager of `WordsService.py`.
+
+Every session `i` speaks with its own marker (`zq<i>`) in every transcript, and the stub LLM answers
+a prompt that carries the marker of session `i` with words from a set that belongs to session `i`
+alone (and a prompt without a marker, such as a tool call, with filler words). A session is leaked
+into when its grid or its words without images ever hold a word of another session, or when the
+stub LLM receives a prompt with the markers of two sessions.
+
+For every number of concurrent sessions it also reports the chunks per second, the scaling
+efficiency (the throughput divided by the number of sessions times the throughput of one session;
+1.0 is linear scaling), the CPU time per chunk of this process, stub LLM included, and the CPU load
+(the CPU seconds per second). The sessions can only scale linearly until the process is busy on the
+CPU: one process runs its Python code on one core at a time, so on a small machine the throughput
+levels off at about one chunk per CPU time per chunk, and the scaling efficiency falls from there on.
+A level passes if its scaling efficiency or its CPU load reaches `--min-efficiency`, that is if the
+sessions either scale linearly or are limited by the CPU and not by waiting on each other.
+
+The test exits with status 1 if any session is leaked into, any chunk fails, or any level does not
+pass.
+
+    python -m benchmarks.session_stress [--sessions 1 2 4 8 16 32] [--chunks 6] [--mode react]
+        [--llm-latency 0.1] [--spread 0.2] [--workers 64] [--min-efficiency 0.6]
+
+© Matthew J. Hergott
+"""
+
+from concurrent.futures import wait
+import argparse
+import logging
+import random
+import re
+import sys
+import threading
+import time
+
+from benchmarks.stubs import STUB_TRANSCRIPTS, StubChatServer, StubLatency, make_stub_react, react_responder
+
+WORDS_PER_SESSION = 10
+SESSION_MARKER = re.compile(r'\bzq(\d+)\b')
+
+
+class SessionWords:
+    """Disjoint sets of grid words, one per session, and the stub LLM that answers with them."""
+
+    def __init__(self, react, sessions, seed=0):
+        import strings
+
+        # Words that are their own image, so that the grid shows exactly the words of the answer
+        pool = sorted({w for w in strings.words if react.image_word_for(w) == w} - set(strings.grid_words))
+        random.Random(seed).shuffle(pool)
+        needed = WORDS_PER_SESSION * (sessions + 1)
+        if len(pool) < needed:
+            raise ValueError(f"{sessions} sessions need {needed} words with images; there are {len(pool)}.")
+        self.filler = pool[:WORDS_PER_SESSION]
+        self.words = [pool[WORDS_PER_SESSION * (i + 1):WORDS_PER_SESSION * (i + 2)] for i in range(sessions)]
+        self.owner = {w: i for i, words in enumerate(self.words) for w in words}
+        self.lock = threading.Lock()
+        self.mixed_prompts = 0
+
+    def answer(self, prompt):
+        markers = {int(m) for m in SESSION_MARKER.findall(prompt)}
+        if len(markers) > 1:
+            with self.lock:
+                self.mixed_prompts += 1
+        if not markers:
+            return ", ".join(self.filler)
+        return ", ".join(self.words[min(markers)])
+
+    def leaked(self, session_index, words):
+        return sorted(w for w in words if self.owner.get(w, session_index) != session_index)
+
+
+def run_level(service, session_words, sessions, chunks, level):
+    """Sends `chunks` transcripts for each of `sessions` sessions at once; returns the seconds and the leaks."""
+    manager = service.sessions
+    states = [manager.get(f"stress-{level}-{i}") for i in range(sessions)]
+    leaks = []
+    errors = []
+
+    def check(session_index, future):
+        try:
+            state, error = future.result()
+        except Exception as e:
+            errors.append(repr(e))
+            return
+        if error is not None:
+            errors.append(error)
+        leaked = session_words.leaked(session_index, state['words'] + state['candidates'])
+        if leaked:
+            leaks.append((states[session_index].session_id, leaked))
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    futures = []
+    for c in range(chunks):
+        for i, session in enumerate(states):
+            text = f"zq{i} says: {STUB_TRANSCRIPTS[(c + i) % len(STUB_TRANSCRIPTS)]}"
+            future = manager.submit(session, service.process_chunk, None, 'wav', text)
+            future.add_done_callback(lambda f, i=i: check(i, f))
+            futures.append(future)
+    wait(futures)
+    seconds = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+
+    for i, session in enumerate(states):
+        # Only the session's own marker may be in its conversation
+        foreign = {m for m in SESSION_MARKER.findall(" ".join(session.conversation.words())) if int(m) != i}
+        if foreign:
+            leaks.append((session.session_id, sorted(f"zq{m}" for m in foreign)))
+        manager.remove(session.session_id)
+    return {'sessions': sessions, 'chunks': len(futures), 'seconds': seconds, 'cpu_seconds': cpu_seconds,
+            'errors': len(errors), 'leaks': leaks}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32],
+                        help='concurrent sessions of every level')
+    parser.add_argument('--chunks', type=int, default=6, help='chunks per session')
+    parser.add_argument('--mode', default='react', help='prediction mode of React')
+    parser.add_argument('--steps', type=int, default=3, help='tool calls the stub agent makes')
+    parser.add_argument('--llm-latency', type=float, default=0.1, help='median seconds per LLM call')
+    parser.add_argument('--spread', type=float, default=0.2, help='sigma of the log-normal stub latencies')
+    parser.add_argument('--workers', type=int, help='worker threads; by default the largest number of sessions')
+    parser.add_argument('--min-efficiency', type=float, default=0.6,
+                        help='lowest scaling efficiency or CPU load of a level that passes')
+    args = parser.parse_args()
+    # The modules under test configure INFO logging when they are imported
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    from WordsService import WordsService
+
+    workers = args.workers or max(args.sessions)
+    session_words = None
+    chat_server = StubChatServer(latency=StubLatency(args.llm_latency, args.spread, seed=1),
+                                 responder=lambda r: react_responder(r, args.steps, session_words.answer)).start()
+    results = []
+    try:
+        react = make_stub_react(chat_server.base_url, use_cache=False, mode=args.mode, http_pool_size=workers)
+        session_words = SessionWords(react, max(args.sessions))
+        service = WordsService(react=react, openai_client=None, max_workers=workers)
+        for level, sessions in enumerate(args.sessions):
+            results.append(run_level(service, session_words, sessions, args.chunks, level))
+        service.sessions.shutdown(wait=True)
+    finally:
+        chat_server.stop()
+
+    print(f"mode {args.mode}, {args.steps} tool calls, {workers} workers, {args.chunks} chunks per session")
+    single = None
+    slow_levels = []
+    for result in results:
+        rate = result['chunks'] / result['seconds']
+        if result['sessions'] == 1:
+            single = rate
+        efficiency = rate / (result['sessions'] * single) if single else float('nan')
+        cpu_load = result['cpu_seconds'] / result['seconds']
+        passed = not single or max(efficiency, cpu_load) >= args.min_efficiency
+        if not passed:
+            slow_levels.append(result['sessions'])
+        print(f"{result['sessions']:4d} sessions: {rate:7.1f} chunks/s, scaling efficiency {efficiency:5.2f}, "
+              f"{1000 * result['cpu_seconds'] / result['chunks']:5.1f} ms CPU per chunk, CPU load {cpu_load:4.2f}, "
+              f"{result['errors']} errors, {len(result['leaks'])} leaks{'' if passed else ', SLOW'}")
+        for session_id, leaked in result['leaks'][:5]:
+            print(f"  {session_id}: {', '.join(leaked)}")
+    print(f"prompts with the markers of two sessions: {session_words.mixed_prompts}")
+
+    leaked = session_words.mixed_prompts or any(result['leaks'] for result in results)
+    failed_chunks = sum(result['errors'] for result in results)
+    if leaked:
+        print("FAIL: state leaked between sessions")
+    if failed_chunks:
+        print(f"FAIL: {failed_chunks} chunks failed")
+    if slow_levels:
+        print(f"FAIL: scaling efficiency and CPU load below {args.min_efficiency} with "
+              f"{', '.join(map(str, slow_levels))} sessions")
+    sys.exit(1 if leaked or failed_chunks or slow_levels else 0)
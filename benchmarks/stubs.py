@@ -0,0 +1,263 @@
+"""
+Local stub services for the offline benchmarks.
+
+`StubChatServer` is a small HTTP server that answers OpenAI-style `/v1/chat/completions` and
+`/v1/models` requests, so that `ChatNVIDIA` clients can be pointed at it with `base_url`.
+It keeps connections alive (HTTP/1.1) and counts the connections it accepts. Pass a `responder`
+to choose the reply from the request, e.g. `react_responder` plays a multi-step ReAct agent.
+It also answers OpenAI `/v1/audio/transcriptions` requests with the next of its `transcripts`, so
+that an `OpenAI` client can be pointed at it for Whisper.
+
+The latency of every stub is a fixed number of seconds or a `StubLatency`: log-normally distributed
+around a median, with a rate of failed requests (HTTP 503 from the server, an exception from the
+Tavily stub).
+
+© Matthew J. Hergott
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+STUB_MODEL = "mistralai/mixtral-8x7b-instruct-v0.1"
+STUB_WORDS = "hospital, doctor, nurse, medicine, emergency, ambulance, patient, heart, pain, help"
+
+
+STUB_TRANSCRIPTS = [
+    "I went to the doctor this morning because my chest hurt.",
+    "She said I should take the medicine twice a day.",
+    "Then I took the bus to the bank to get some money.",
+    "The weather was terrible, there was a storm and the roads flooded.",
+    "Can you call my daughter and tell her I am home?",
+    "I would like some coffee and a piece of bread, please.",
+]
+
+
+class StubLatency:
+    """Latency of a stub service: log-normal around `median` seconds, with a `failure_rate`."""
+
+    def __init__(self, median=0.0, spread=0.0, failure_rate=0.0, seed=None):
+        self.median = median
+        self.spread = spread  # sigma of the log of the latency; 0 is a fixed latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            if self.median <= 0:
+                return 0.0
+            return self.median * math.exp(self.random.gauss(0, self.spread)) if self.spread else self.median
+
+    def failed(self):
+        with self.lock:
+            return self.failure_rate > 0 and self.random.random() < self.failure_rate
+
+    def __bool__(self):
+        return self.median > 0 or self.failure_rate > 0
+
+
+def as_latency(latency):
+    return latency if isinstance(latency, StubLatency) else StubLatency(latency)
+
+
+def react_responder(request, steps=3, words=None):
+    """Replies like the agent LLM: `steps` tool calls before the final answer, JSON for direct prompts.
+
+    `words` returns the words to answer for a prompt; by default always `STUB_WORDS`.
+    """
+    prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+    answer = words(prompt) if words else STUB_WORDS
+    if "Begin!" in prompt:
+        if prompt.count("Observation:") - 1 < steps:
+            return "Thought: I should predict more words\nAction: WordsPredictLLM\nAction Input: the conversation"
+        return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+    if "JSON" in prompt:
+        return json.dumps({"words": [w.strip() for w in answer.split(",")]})
+    return answer
+
+
+def vocabulary_words(vocabulary, n=10):
+    """Returns a `words` function for `react_responder` that picks `n` words of `vocabulary` per prompt."""
+    def words(prompt):
+        # The same prompt gets the same words, a new conversation (almost always) other ones
+        return ", ".join(random.Random(prompt).sample(list(vocabulary), n))
+    return words
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, content, chunks=10):
+        # Server-sent events, with the latency spread over the chunks as a model generating tokens would
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        size = max(1, -(-len(content) // chunks))
+        latency = self.server.latency.sample()
+        for i in range(0, len(content), size):
+            time.sleep(latency / chunks)
+            event = {"id": "stub", "object": "chat.completion.chunk", "model": STUB_MODEL,
+                     "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[i:i + size]},
+                                  "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        self._send_json({"object": "list", "data": [{"id": STUB_MODEL, "object": "model"}]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency.failed():
+            with self.server.lock:
+                self.server.failures += 1
+            self._send_json({"error": {"message": "stub failure", "type": "server_error"}}, status=503)
+            return
+        if self.path.endswith("/audio/transcriptions"):
+            # The multipart upload is read in full, as the service would, and then ignored
+            time.sleep(self.server.latency.sample())
+            self._send_json({"text": self.server.transcribe()})
+            return
+        request = json.loads(body or b"{}")
+        if request.get("stream"):
+            self._send_stream(self.server.respond(request))
+            return
+        time.sleep(self.server.latency.sample())
+        self._send_json({
+            "id": "stub",
+            "object": "chat.completion",
+            "model": STUB_MODEL,
+            "choices": [{"index": 0,
+                         "message": {"role": "assistant", "content": self.server.respond(request)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+
+class StubChatServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when dozens of clients connect at once
+    request_queue_size = 128
+
+    def __init__(self, latency=0.0, content=STUB_WORDS, responder=None, port=0, transcripts=STUB_TRANSCRIPTS):
+        super().__init__(("127.0.0.1", port), StubChatHandler)
+        self.latency = as_latency(latency)
+        self.content = content
+        self.responder = responder
+        self.transcripts = itertools.cycle(transcripts)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.failures = 0
+        self.thread = None
+
+    def respond(self, request):
+        return self.responder(request) if self.responder else self.content
+
+    def transcribe(self):
+        with self.lock:
+            return next(self.transcripts)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+STUB_SEARCH_RESULTS = [
+    {"url": "https://example.com/flood", "content": "Heavy rain caused a flood; the river rose and roads were closed."},
+    {"url": "https://example.com/storm", "content": "Emergency services helped people leave their homes after the storm."},
+]
+
+
+def make_stub_tavily_wrapper(latency=0.0, results=STUB_SEARCH_RESULTS):
+    """Returns a TavilySearchAPIWrapper that answers from memory after `latency` seconds."""
+    import asyncio
+    from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+    latency = as_latency(latency)
+
+    def sample():
+        if latency.failed():
+            raise ConnectionError("stub Tavily failure")
+        return latency.sample()
+
+    class StubTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+        calls: int = 0
+
+        def raw_results(self, query, max_results=5, **kwargs):
+            self.calls += 1
+            time.sleep(sample())
+            return {"query": query, "answer": results[0]["content"], "results": results[:max_results]}
+
+        def results(self, query, max_results=5, **kwargs):
+            return self.raw_results(query, max_results)["results"]
+
+        async def raw_results_async(self, query, max_results=5, **kwargs):
+            self.calls += 1
+            await asyncio.sleep(sample())
+            return {"query": query, "answer": results[0]["content"], "results": results[:max_results]}
+
+        async def results_async(self, query, max_results=5, **kwargs):
+            return (await self.raw_results_async(query, max_results))["results"]
+
+    return StubTavilySearchAPIWrapper(tavily_api_key="stub")
+
+
+def make_stub_react(base_url, search_latency=0.0, **kwargs):
+    """Returns a React agent whose LLM client and Tavily search are stubs instead of NVIDIA NIM and Tavily."""
+    import requests
+    from langchain_nvidia_ai_endpoints import ChatNVIDIA
+    from React import React, share_http_session
+
+    class StubReact(React):
+        def load_model(self):
+            self.http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.http_pool_size)
+            self.http_session.mount("http://", adapter)
+            self.llm = share_http_session(ChatNVIDIA(model=STUB_MODEL, base_url=base_url,
+                                                     api_key="stub", temperature=0), self.http_session)
+            self.tools_llm = self.llm
+
+        def create_search_wrapper(self):
+            return make_stub_tavily_wrapper(search_latency)
+
+    react = StubReact(**kwargs)
+    react.agent_executor.verbose = False
+    return react
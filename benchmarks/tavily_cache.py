@@ -0,0 +1,70 @@
+"""
+Benchmark of the Tavily search cache in `TavilyCustom/cache.py`.
+
+Sends a session's worth of near-identical queries, then bursts of identical concurrent queries
+(from threads and from coroutines), through the cached API wrapper to a stub Tavily wrapper with
+a fixed latency per call, and reports the API calls made, the cache counters and the time taken.
+
+    python -m benchmarks.tavily_cache [--search-latency 0.5] [--burst 8]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stubs import make_stub_tavily_wrapper
+from TavilyCustom.cache import CachedTavilySearchAPIWrapper, TavilySearchCache
+
+SESSION_QUERIES = [
+    "pickleball rules",
+    f"Pickleball rules {time.localtime().tm_year}",
+    "the rules of pickleball",
+    "pickleball rules?",
+    "pickleball court size",
+    "what is the pickleball court size",
+    "pickleball paddles",
+    "latest news pickleball paddles",
+]
+
+
+def run_benchmark(search_latency=0.5, burst=8):
+    stub = make_stub_tavily_wrapper(search_latency)
+    cache = TavilySearchCache()
+    wrapper = CachedTavilySearchAPIWrapper.wrap(stub, cache)
+    report = {}
+
+    start = time.perf_counter()
+    for query in SESSION_QUERIES:
+        wrapper.results(query, 3)
+    report['session'] = (len(SESSION_QUERIES), stub.calls, time.perf_counter() - start)
+
+    calls_before = stub.calls
+    start = time.perf_counter()
+    with ThreadPoolExecutor(burst) as pool:
+        list(pool.map(lambda _: wrapper.results("storm damage in Texas", 3), range(burst)))
+    report['threads'] = (burst, stub.calls - calls_before, time.perf_counter() - start)
+
+    async def coroutine_burst():
+        return await asyncio.gather(*[wrapper.results_async("flood warnings in Ohio", 3) for _ in range(burst)])
+
+    calls_before = stub.calls
+    start = time.perf_counter()
+    asyncio.run(coroutine_burst())
+    report['coroutines'] = (burst, stub.calls - calls_before, time.perf_counter() - start)
+
+    return report, cache.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--search-latency', type=float, default=0.5, help='seconds per search')
+    parser.add_argument('--burst', type=int, default=8, help='identical concurrent queries')
+    args = parser.parse_args()
+
+    report, stats = run_benchmark(args.search_latency, args.burst)
+    for name, (queries, api_calls, seconds) in report.items():
+        print(f"{name:>10}: {queries} queries, {api_calls} API calls, {seconds:5.2f} s")
+    print(f"cache: {stats}")
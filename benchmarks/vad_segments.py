@@ -0,0 +1,136 @@
+"""
+Offline check of the segmentation of `VoiceActivityDetector`, with `segment_wav` over WAV fixtures.
+
+Writes synthetic WAV files and checks the segments the detector finds in each of them:
+
+- silence: near-silent background only; no segment.
+- steady noise: constant noise at `--noise-dbfs` (a fan or room hum, louder than the fixed threshold
+  of -45 dBFS); no segment.
+- speech: utterances separated by pauses, over a quiet background; one segment per utterance, cut in
+  the pauses.
+- speech in noise: the same utterances after a lead-in of noise only, over noise at
+  `--speech-noise-dbfs`; one segment per utterance.
+- long speech: speech without pauses; segments no longer than `max_segment_seconds`.
+
+Exits with status 1 if any check fails. `--keep DIR` keeps the fixtures for listening or for
+`python VoiceActivityDetector.py DIR/*.wav`.
+
+    python -m benchmarks.vad_segments [--fs 16000] [--noise-dbfs -27] [--speech-noise-dbfs -35] [--keep DIR]
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+import argparse
+import logging
+import sys
+import tempfile
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+from VoiceActivityDetector import segment_wav
+
+UTTERANCE_SECONDS = 4.0
+PAUSE_SECONDS = 1.5
+UTTERANCES = 4
+LEAD_IN_SECONDS = 10.0
+MAX_SEGMENT_SECONDS = 30.0
+
+
+def noise(fs, seconds, dbfs, rng):
+    return rng.normal(0, 10 ** (dbfs / 20), int(fs * seconds))
+
+
+def speech(fs, seconds, rng, dbfs=-14.0):
+    # Voiced harmonics with a syllable-rate envelope, at about `dbfs` RMS
+    t = np.arange(int(fs * seconds)) / fs
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t + rng.uniform(0, 2 * np.pi))
+    phase = 2 * np.pi * np.cumsum(pitch) / fs
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8)) * np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    return voiced * 10 ** (dbfs / 20) / np.sqrt(np.mean(voiced ** 2))
+
+
+def utterances(fs, background_dbfs, lead_in, rng):
+    """Returns the samples and the (start, end) seconds of every utterance."""
+    pieces = [noise(fs, lead_in, background_dbfs, rng)]
+    spans = []
+    t = lead_in
+    for _ in range(UTTERANCES):
+        pieces.append(speech(fs, UTTERANCE_SECONDS, rng) + noise(fs, UTTERANCE_SECONDS, background_dbfs, rng))
+        pieces.append(noise(fs, PAUSE_SECONDS, background_dbfs, rng))
+        spans.append((t, t + UTTERANCE_SECONDS))
+        t += UTTERANCE_SECONDS + PAUSE_SECONDS
+    return np.concatenate(pieces), spans
+
+
+def write_wav(path, samples, fs):
+    wav.write(path, fs, (np.clip(samples, -1, 1) * 32767).astype(np.int16))
+
+
+def check_utterances(segments, spans):
+    problems = []
+    if len(segments) != len(spans):
+        problems.append(f"{len(segments)} segments for {len(spans)} utterances")
+    for start, end in spans:
+        covering = [s for s in segments if s[0] <= start + 0.1 and s[1] >= end - 0.1]
+        if not covering:
+            problems.append(f"utterance {start:.1f}-{end:.1f} s is not inside one segment")
+    for seg_start, seg_end in segments:
+        for start, end in spans:
+            if start + 0.1 < seg_start < end - 0.1 or start + 0.1 < seg_end < end - 0.1:
+                problems.append(f"segment {seg_start:.2f}-{seg_end:.2f} s cuts utterance {start:.1f}-{end:.1f} s")
+    return problems
+
+
+def run_checks(directory, fs, noise_dbfs, speech_noise_dbfs, seed=0):
+    rng = np.random.default_rng(seed)
+    directory = Path(directory)
+    results = []
+
+    def run(name, samples, check):
+        path = directory / f"{name}.wav"
+        write_wav(path, samples, fs)
+        segments = segment_wav(path, max_segment_seconds=MAX_SEGMENT_SECONDS)
+        results.append((name, segments, check(segments)))
+
+    run('silence', noise(fs, 20, -70, rng),
+        lambda segments: [f"{len(segments)} segments in silence"] if segments else [])
+    run('steady_noise', noise(fs, 60, noise_dbfs, rng),
+        lambda segments: [f"{len(segments)} segments in steady noise"] if segments else [])
+
+    samples, spans = utterances(fs, -70, 1.0, rng)
+    run('speech', samples, lambda segments: check_utterances(segments, spans))
+
+    noisy, noisy_spans = utterances(fs, speech_noise_dbfs, LEAD_IN_SECONDS, rng)
+    run('speech_in_noise', noisy, lambda segments: check_utterances(segments, noisy_spans))
+
+    run('long_speech', speech(fs, 70, rng),
+        lambda segments: [f"segment {s:.1f}-{e:.1f} s is longer than {MAX_SEGMENT_SECONDS:.0f} s"
+                          for s, e in segments if e - s > MAX_SEGMENT_SECONDS + 0.01]
+        + ([] if segments else ["no segments in speech"]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fs', type=int, default=16000)
+    parser.add_argument('--noise-dbfs', type=float, default=-27.0, help='level of the steady noise fixture')
+    parser.add_argument('--speech-noise-dbfs', type=float, default=-35.0, help='background of the noisy speech')
+    parser.add_argument('--keep', help='directory to keep the WAV fixtures in')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(args.keep or tmp)
+        directory.mkdir(parents=True, exist_ok=True)
+        results = run_checks(directory, args.fs, args.noise_dbfs, args.speech_noise_dbfs)
+
+    failed = False
+    for name, segments, problems in results:
+        spans = ', '.join(f"{start:.2f}-{end:.2f}" for start, end in segments) or 'none'
+        print(f"{name:>16}: {'FAIL' if problems else 'ok':4} segments (s): {spans}")
+        for problem in problems:
+            print(f"{'':>18}{problem}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,71 @@
+"""
+Benchmark of the memory-mapped synonym and related-word graph in `WordGraph.py`.
+
+Reports the time to load the graph (memory mapping the arrays) and the latency of `resolve`
+for words in the graph and for words that are not, and of `neighbors` for image words.
+Build the graph first with `python find_common_words.py`.
+
+    python -m benchmarks.word_graph [--graph-dir word_graph] [--lookups 10000]
+
+© Matthew J. Hergott
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from WordGraph import WordGraph
+
+
+def time_per_call(func, words):
+    start = time.perf_counter()
+    for word in words:
+        func(word)
+    return (time.perf_counter() - start) / len(words)
+
+
+def run_benchmark(graph_dir, lookups=10000, loads=20, seed=0):
+    load_times = []
+    for _ in range(loads):
+        start = time.perf_counter()
+        graph = WordGraph.load(graph_dir)
+        load_times.append(time.perf_counter() - start)
+    if graph is None:
+        return None
+
+    rng = np.random.default_rng(seed)
+    strings = [s.decode('utf-8') for s in graph.strings[rng.integers(0, len(graph.strings), lookups)]]
+    image_words = [graph._string(i) for i in graph.image_ids[rng.integers(0, len(graph.image_ids), lookups)]]
+    misses = [f"{word}zz" for word in strings]
+
+    return {
+        'load_ms': 1000 * statistics.median(load_times),
+        'strings': len(graph.strings),
+        'edges': len(graph.neighbors_ids),
+        'resolve_hit_us': 1e6 * time_per_call(graph.resolve, strings),
+        'resolve_miss_us': 1e6 * time_per_call(graph.resolve, misses),
+        'neighbors_us': 1e6 * time_per_call(graph.neighbors, image_words),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--graph-dir', default='word_graph')
+    parser.add_argument('--lookups', type=int, default=10000)
+    args = parser.parse_args()
+    # WordGraph configures INFO logging when it is imported
+    logging.basicConfig(level=logging.WARNING, force=True)
+
+    results = run_benchmark(args.graph_dir, args.lookups)
+    if results is None:
+        sys.exit(f"No word graph in {args.graph_dir}; run find_common_words.py first.")
+
+    print(f"{results['strings']} strings, {results['edges']} edges")
+    print(f"load (mmap):      {results['load_ms']:8.3f} ms")
+    print(f"resolve (hit):    {results['resolve_hit_us']:8.2f} us per lookup")
+    print(f"resolve (miss):   {results['resolve_miss_us']:8.2f} us per lookup")
+    print(f"neighbors:        {results['neighbors_us']:8.2f} us per lookup")
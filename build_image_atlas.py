@@ -0,0 +1,87 @@
+"""
+build_image_atlas.py
+
+Offline build step that packs the word images into memory-mappable atlases.
+
+For each tile size (64 and 128 pixels by default) every word in `strings.words` is resized once
+and written into a raw RGB file, one fixed-size tile after another. The images have no transparency,
+so an alpha band would only add a third to the size. Larger sizes are made from the PNG files, which
+are 256 pixels and compress far better than a raw tile. An `index.json` file records the tile size,
+the byte size of each tile and the byte offset of every word's tile in each atlas, and the modification
+time, size and SHA-1 digest of every source PNG.
+At runtime `ImageAtlas.py` maps these files into memory and slices tiles out of them instead of
+opening and decoding the individual PNG files.
+
+When the images in the `images` directory have changed since the atlas was built, the app logs a
+warning and uses the PNG files until the atlas is rebuilt. To build or rebuild it:
+
+    python build_image_atlas.py
+
+© Matthew J. Hergott
+"""
+
+from pathlib import Path
+import json
+import logging
+
+import numpy as np
+from PIL import Image
+
+from ImageAtlas import image_sources
+from strings import words
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ATLAS_MODE = 'RGB'
+ATLAS_SIZES = (64, 128)
+
+
+def build_image_atlas(images_dir=Path('images'), atlas_dir=Path('image_atlas'), sizes=ATLAS_SIZES):
+    images_dir = Path(images_dir)
+    atlas_dir = Path(atlas_dir)
+    atlas_dir.mkdir(exist_ok=True)
+
+    available_words = [word for word in words if (images_dir / f"{word}.png").exists()]
+    missing = len(words) - len(available_words)
+    if missing:
+        logging.warning(f"{missing} words have no image and are left out of the atlas.")
+
+    bands = len(ATLAS_MODE)
+    index = {'mode': ATLAS_MODE, 'words': available_words, 'atlases': [],
+             'sources': image_sources(images_dir, words)}
+
+    atlases = {}
+    for size in sizes:
+        fname = f"atlas_{size}.bin"
+        atlases[size] = np.memmap(atlas_dir / fname, dtype=np.uint8, mode='w+',
+                                  shape=(len(available_words), size, size, bands))
+        tile_bytes = size * size * bands
+        index['atlases'].append({
+            'size': size,
+            'file': fname,
+            'tile_bytes': tile_bytes,
+            'offsets': {word: i * tile_bytes for i, word in enumerate(available_words)},
+        })
+
+    # Decode every PNG once and write all the sizes from it
+    for i, word in enumerate(available_words):
+        with Image.open(images_dir / f"{word}.png") as img:
+            img = img.convert(ATLAS_MODE)
+            for size, atlas in atlases.items():
+                tile = img if img.size == (size, size) else img.resize((size, size), Image.LANCZOS)
+                atlas[i] = np.asarray(tile)
+
+    for size, atlas in atlases.items():
+        atlas.flush()
+        logging.info(f"Wrote {len(available_words)} tiles of {size}x{size} to {atlas_dir / f'atlas_{size}.bin'}")
+    atlases.clear()
+
+    with open(atlas_dir / 'index.json', 'w') as f:
+        json.dump(index, f)
+
+    return index
+
+
+if __name__ == "__main__":
+    index = build_image_atlas()
+    print(f"Saved atlases for {len(index['words'])} words to 'image_atlas'")
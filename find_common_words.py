@@ -1,8 +1,15 @@
 import nltk
-from wordfreq import top_n_list
+from wordfreq import top_n_list, zipf_frequency
 from nltk.corpus import wordnet as wn
 from nltk.corpus import stopwords
+from pathlib import Path
 import csv
+import re
+
+import numpy as np
+from scipy import sparse
+
+from VocabularyIndex import VocabularyIndex
 
 # Ensure the required resources are downloaded
 nltk.download('words')
@@ -30,6 +37,20 @@ def get_word_synonyms(word):
     synonyms.discard(word)
     return synonyms
 
+RELATIONS = ('synonym', 'hyponym', 'hypernym')
+
+def get_word_neighbours(word, max_senses=3):
+    # Synonyms (relation 0), hyponyms (1) and hypernyms (2) of the most common senses of a word
+    neighbours = {}
+    for synset in wn.synsets(word)[:max_senses]:
+        for relation, related in enumerate(([synset], synset.hyponyms(), synset.hypernyms())):
+            for related_synset in related:
+                for lemma in related_synset.lemmas():
+                    name = lemma.name().replace('_', ' ').lower()
+                    if name != word and neighbours.get(name, len(RELATIONS)) > relation:
+                        neighbours[name] = relation
+    return sorted(neighbours.items(), key=lambda item: (item[1], item[0]))
+
 def save_words_to_csv(words, filename="common_words.csv"):
     with open(filename, 'w', newline='') as csvfile:
         writer = csv.writer(csvfile, quoting=csv.QUOTE_NONE, escapechar='\\')
@@ -47,6 +68,103 @@ def save_words_with_synonyms_to_csv(words, filename="words_synonyms.csv"):
             else:
                 writer.writerow([word])
 
+def build_word_graph(words, graph_dir=Path("word_graph")):
+    # CSR adjacency arrays over one sorted string table, loaded with memory mapping by WordGraph.py
+    words = [word.strip().lower() for word in words]
+    neighbours = [get_word_neighbours(word) for word in words]
+    
+    strings = sorted(set(words) | {name for word_neighbours in neighbours for name, _ in word_neighbours})
+    string_ids = {string: i for i, string in enumerate(strings)}
+    
+    # Image word -> neighbours
+    neighbors_indptr = np.cumsum([0] + [len(n) for n in neighbours]).astype(np.int32)
+    neighbors = np.array([string_ids[name] for n in neighbours for name, _ in n], dtype=np.int32)
+    relations = np.array([relation for n in neighbours for _, relation in n], dtype=np.int8)
+    
+    # Neighbour -> image words, closest relation first, then in the order of `words`
+    image_of_edge = np.repeat(np.arange(len(words), dtype=np.int32), np.diff(neighbors_indptr))
+    order = np.lexsort((image_of_edge, relations, neighbors))
+    images = image_of_edge[order]
+    images_indptr = np.concatenate(([0], np.cumsum(np.bincount(neighbors, minlength=len(strings))))).astype(np.int32)
+    
+    graph_dir = Path(graph_dir)
+    graph_dir.mkdir(exist_ok=True)
+    arrays = {
+        # Fixed-width UTF-8 bytes in sorted order, so that a word is found by binary search
+        'strings': np.array([string.encode('utf-8') for string in strings]),
+        'image_ids': np.array([string_ids[word] for word in words], dtype=np.int32),
+        'neighbors_indptr': neighbors_indptr,
+        'neighbors': neighbors,
+        'relations': relations,
+        'images_indptr': images_indptr,
+        'images': images,
+    }
+    for name, array in arrays.items():
+        np.save(graph_dir / f"{name}.npy", array)
+    return arrays
+
+def synset_contexts(words):
+    # Each WordNet synset of a vocabulary word, with its neighbours, definition and examples, is one "document"
+    vocabulary = VocabularyIndex(words)
+    seen = set()
+    for word in words:
+        for synset in wn.synsets(word):
+            if synset.name() in seen:
+                continue
+            seen.add(synset.name())
+            related = [synset] + synset.hypernyms() + synset.hyponyms()
+            text = ' '.join(lemma.name() for s in related for lemma in s.lemmas())
+            text += ' ' + synset.definition() + ' ' + ' '.join(synset.examples())
+            tokens = re.split(r"[^a-z]+", text.lower().replace('_', ' '))
+            context = {vocabulary.resolve(token) for token in tokens if token}
+            context.discard(None)
+            if len(context) > 1:
+                yield context
+
+def build_word_model(words, top_k=64):
+    # Positive pointwise mutual information between vocabulary words, from their co-occurrence in WordNet synsets
+    words = [word.strip().lower() for word in words]
+    index = {word: i for i, word in enumerate(words)}
+    rows, cols = [], []
+    doc_freq = np.zeros(len(words))
+    n_docs = 0
+    for context in synset_contexts(words):
+        ids = np.array([index[word] for word in context])
+        doc_freq[ids] += 1
+        n_docs += 1
+        pairs_rows, pairs_cols = np.meshgrid(ids, ids, indexing='ij')
+        mask = pairs_rows != pairs_cols
+        rows.append(pairs_rows[mask])
+        cols.append(pairs_cols[mask])
+    
+    counts = sparse.coo_matrix((np.ones(sum(len(r) for r in rows)), (np.concatenate(rows), np.concatenate(cols))),
+                               shape=(len(words), len(words))).tocsr()
+    counts.sum_duplicates()
+    
+    # PMI(a, b) = log(p(a, b) / (p(a) p(b)))
+    coo = counts.tocoo()
+    pmi = np.log(coo.data * n_docs / (doc_freq[coo.row] * doc_freq[coo.col]))
+    keep = pmi > 0
+    matrix = sparse.csr_matrix((pmi[keep], (coo.row[keep], coo.col[keep])), shape=counts.shape)
+    
+    # Keep only the strongest associations of each word, so the model stays small and a prediction stays fast
+    for i in range(matrix.shape[0]):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        if end - start > top_k:
+            row = matrix.data[start:end]
+            row[row < np.partition(row, -top_k)[-top_k]] = 0
+    matrix.eliminate_zeros()
+    
+    # Word frequency on the Zipf scale (0 to about 8) as the prior for words without associations
+    prior = np.array([zipf_frequency(word, 'en') for word in words], dtype=np.float32)
+    return words, matrix.astype(np.float32), prior
+
+def save_word_model(words, matrix, prior, filename=Path("word_model/word_model.npz")):
+    filename = Path(filename)
+    filename.parent.mkdir(exist_ok=True)
+    np.savez_compressed(filename, words=np.array(words), data=matrix.data, indices=matrix.indices,
+                        indptr=matrix.indptr, shape=np.array(matrix.shape), prior=prior)
+
 if __name__ == "__main__":
     remove_stopwords_option = True  # Set this to False if you don't want to remove stopwords
     most_common_words = get_most_common_words(remove_stopwords=remove_stopwords_option)
@@ -54,3 +172,17 @@ if __name__ == "__main__":
     save_words_with_synonyms_to_csv(most_common_words)
     print(f"Saved {len(most_common_words)} common words to 'common_words.csv'")
     print(f"Saved words with synonyms to 'words_synonyms.csv'")
+
+    build_word_model_option = True  # Set this to False to skip building the model of LocalPredictor.py
+    if build_word_model_option:
+        from strings import words
+        model_words, matrix, prior = build_word_model(words)
+        save_word_model(model_words, matrix, prior)
+        print(f"Saved word model with {matrix.nnz} associations between {len(model_words)} words to 'word_model/word_model.npz'")
+
+    build_word_graph_option = True  # Set this to False to skip building the synonym graph of WordGraph.py
+    if build_word_graph_option:
+        from strings import words
+        graph = build_word_graph(words)
+        print(f"Saved word graph with {len(graph['neighbors'])} edges between {len(graph['image_ids'])} words "
+              f"and {len(graph['strings'])} strings to 'word_graph'")
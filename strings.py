@@ -13,6 +13,29 @@ Transcription of the audio resulted in an error or no text.
 
 react_template='You are given an input text representing a conversation between two or more people. Predict 50 important words that are likely to be used in this conversation. Give the results as a list of words separated by commas. You have access to the following tools:\n\n{tools}\n\nUse the following format:\n\nConversation: the input conversation for which you must find 50 important words\nThought: you should always think about what to do\nAction: the action to take, should be one of [{tool_names}]\nAction Input: the input to the action\nObservation: the result of the action\n... (this Thought/Action/Action Input/Observation can repeat N times)\nThought: I now know the final answer\nFinal Answer: 50 important words\n\nBegin!\n\nConversation: {input}\nThought:{agent_scratchpad}'
 
+direct_template = """You are an expert at the English language. You are given an input text representing a conversation between two or more people. Predict 50 important words that are likely to be used in this conversation, including words that have not been said yet.
+
+Respond with only a JSON object in this format, and no other text:
+{{"words": ["word1", "word2", "word3"]}}
+
+Conversation: {input}
+
+JSON:"""
+
+# Cues that a conversation is about current events, which need the search tool of the ReAct agent.
+# Only words that are rare in everyday talk: 'today', 'lost', 'game' or 'prices' are not news.
+news_keywords = ['the news', 'headline', 'headlines', 'breaking news', 'election', 'elections', 'campaign',
+                 'voters', 'president', 'prime minister', 'government', 'senator', 'congress', 'parliament',
+                 'supreme court', 'legislation', 'war', 'ceasefire', 'troops', 'military', 'hurricane',
+                 'earthquake', 'wildfire', 'tornado', 'tsunami', 'scandal', 'stock market', 'stocks', 'inflation',
+                 'interest rates', 'recession', 'economy', 'championship', 'tournament', 'world cup', 'super bowl',
+                 'olympics', 'playoffs']
+
+# The images on the grid before the first prediction of a session
+grid_words = ['hospital', 'fire', 'officer', 'emergency', 'doctor', 'nurse', 'help', 'heart', 'breath', 'medicine',
+              'child', 'dog', 'cat', 'food', 'money', 'bank', 'computer', 'phone', 'car', 'word',
+              'key', 'newspaper', 'people', 'time']
+
 words=['one',
 'get',
 'new',